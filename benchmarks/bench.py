@@ -0,0 +1,317 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# 用法（在仓库根目录运行）：
+#   python -m benchmarks.bench                                  运行全部用例
+#   python -m benchmarks.bench --codes 200 --bars 5000 -k analyze  只运行名称包含 analyze 的用例
+#   python -m benchmarks.bench --save benchmarks/baseline.json   保存为基准
+#   python -m benchmarks.bench --baseline benchmarks/baseline.json  与基准比较，变慢超过阈值时返回非零
+
+from benchmarks.synthetic import synthetic_frame, synthetic_universe
+from get_data import indicators
+from get_data.indicators import build_features
+from get_data.panel import analyze_panel, load_panel
+from get_data.predict_buy_revnue import StockStrategySimulator
+from get_data.resample import DerivedBarStore, resample_bars
+from get_data.result_cache import ResultCache
+from predict.monte_carlo import simulate_profit
+from predict.profit_cal import scenario_surface
+
+
+class Environment(NamedTuple):
+    store: DerivedBarStore
+    cache: ResultCache
+    codes: list
+    start_date: str
+    end_date: str
+    frame: pd.DataFrame  # 单只股票的日线，分析方法的用例都用它
+    features: pd.DataFrame
+    grid: int  # 收益网格每个维度的取值个数
+    paths: int  # 蒙特卡洛路径数
+
+
+class Measurement(NamedTuple):
+    name: str
+    items: int
+    unit: str
+    best: float  # 单次运行的最短时间（秒）
+    median: float
+    peak_mb: float  # tracemalloc 统计的单次运行内存峰值
+
+    def throughput(self):
+        return self.items / self.median if self.median > 0 else float('inf')
+
+
+CASES = {}
+
+
+def case(name, unit):
+    # 注册用例：setup(env) 返回 (单次运行的函数, 单次运行处理的数量)
+    def register(setup):
+        CASES[name] = (setup, unit)
+        return setup
+    return register
+
+
+def _quiet(run):
+    # 屏蔽分析方法和 get_stock_data 的打印，打印本身单独有 report 用例
+    def quiet():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return run()
+    return quiet
+
+
+@case('store.load', 'bars')
+def _store_load(env):
+    def run():
+        for code in env.codes:
+            env.store.load(code, 'daily', env.start_date, env.end_date)
+    return run, len(env.codes) * len(env.frame)
+
+
+@case('store.load_weekly', 'bars')
+def _store_load_weekly(env):
+    # 周线由日线聚合，内存中已有聚合结果
+    def run():
+        for code in env.codes:
+            env.store.load(code, 'weekly', env.start_date, env.end_date)
+    return run, len(env.codes) * len(env.frame)
+
+
+@case('resample.weekly', 'bars')
+def _resample_weekly(env):
+    dates = env.frame.index.to_numpy(dtype='datetime64[D]')
+    bars = env.frame[['open', 'high', 'low', 'close']].to_numpy()
+    return lambda: resample_bars(dates, bars, 'weekly'), len(dates)
+
+
+@case('get_stock_data', 'bars')
+def _get_stock_data(env):
+    def run():
+        for code in env.codes:
+            StockStrategySimulator.get_stock_data(code, 'daily', env.start_date, env.end_date)
+    return _quiet(run), len(env.codes) * len(env.frame)
+
+
+@case('build_features', 'bars')
+def _build_features(env):
+    return lambda: build_features(env.frame), len(env.frame)
+
+
+def _analyzer_case(name, analyze):
+    @case(f'analyze.{name}', 'bars')
+    def setup(env):
+        return _quiet(lambda: analyze(env.frame, env.features)), len(env.frame)
+    return setup
+
+
+_analyzer_case('macd_kdj', lambda frame, features: StockStrategySimulator.analyze_stock_data_macd_kdj(
+    frame, stock_name='', m=5, features=features))
+_analyzer_case('trend_break', lambda frame, features: StockStrategySimulator.analyze_trend_break(
+    frame, stock_name='', features=features))
+_analyzer_case('trend_start', lambda frame, features: StockStrategySimulator.analyze_trend_start(
+    frame, x=5, m=5, features=features))
+_analyzer_case('divergence_top', lambda frame, features: StockStrategySimulator.analyze_macd_divergence_top(
+    frame, m=5, features=features))
+_analyzer_case('divergence_bottom', lambda frame, features: StockStrategySimulator.analyze_macd_divergence_bottom(
+    frame, m=5, features=features))
+
+
+@case('should_follow.cold', 'codes')
+def _should_follow_cold(env):
+    # 端到端：读取本地存储 + 指标 + 全部分析方法，不使用任何缓存
+    def run():
+        StockStrategySimulator.result_cache = None
+        indicators._feature_cache.clear()
+        for code in env.codes:
+            StockStrategySimulator.analyze_should_follow(code, 5, code, 'daily', env.start_date, env.end_date)
+    return _quiet(run), len(env.codes)
+
+
+@case('should_follow.cached', 'codes')
+def _should_follow_cached(env):
+    # 端到端，分析结果全部命中磁盘缓存
+    StockStrategySimulator.result_cache = env.cache
+
+    def run():
+        StockStrategySimulator.result_cache = env.cache
+        for code in env.codes:
+            StockStrategySimulator.analyze_should_follow(code, 5, code, 'daily', env.start_date, env.end_date)
+    run = _quiet(run)
+    run()
+    return run, len(env.codes)
+
+
+@case('should_follow.report', 'codes')
+def _should_follow_report(env):
+    # 缓存命中后只剩打印报告，衡量输出本身的开销
+    def run():
+        StockStrategySimulator.result_cache = env.cache
+        for code in env.codes:
+            StockStrategySimulator.analyze_should_follow(code, 5, code, 'daily', env.start_date, env.end_date,
+                                                         report=True)
+    run = _quiet(run)
+    run()
+    return run, len(env.codes)
+
+
+@case('panel.analyze', 'codes')
+def _panel_analyze(env):
+    def run():
+        panel = load_panel(env.store, env.codes, 'daily', env.start_date, env.end_date)
+        analyze_panel(panel, m=5)
+    return run, len(env.codes)
+
+
+@case('profit.surface', 'scenarios')
+def _profit_surface(env):
+    axes = {
+        'down_payment': [800000],
+        'first_pay_percentage': np.linspace(0.2, 0.5, env.grid),
+        'interest_rate': np.linspace(3.0, 5.0, env.grid),
+        'loan_term': [30],
+        'investment_years': [5, 10],
+        'expected_growth_rate': np.linspace(-20, 20, env.grid),
+        'rent_yield': [0.014],
+        'zhuangxiu_cost': [5],
+    }
+    return lambda: scenario_surface(**axes), 2 * env.grid ** 3
+
+
+@case('profit.monte_carlo', 'paths')
+def _profit_monte_carlo(env):
+    return lambda: simulate_profit(800000, 0.3, 3.75, 30, 5, 5, 0.014, n_paths=env.paths, seed=0), env.paths
+
+
+def measure(name, run, items, unit, repeat, min_time=0.2):
+    # 先运行一次预热，再重复 repeat 轮取最短和中位数；单轮太短时一轮内多运行几次
+    start = time.perf_counter()
+    run()
+    once = time.perf_counter() - start
+    number = max(1, int(min_time / once)) if once > 0 else 1
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        timings.append((time.perf_counter() - start) / number)
+
+    # 内存单独测一次，tracemalloc 会拖慢运行，不能和计时放在一起
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return Measurement(name, items, unit, min(timings), statistics.median(timings), peak / 1024 / 1024)
+
+
+def to_frame(measurements):
+    return pd.DataFrame([{
+        'case': result.name,
+        'median_ms': result.median * 1000,
+        'best_ms': result.best * 1000,
+        'throughput': result.throughput(),
+        'unit': f"{result.unit}/s",
+        'peak_mb': result.peak_mb,
+    } for result in measurements])
+
+
+def save(measurements, path, settings):
+    data = {
+        'settings': settings,
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                    'platform': platform.platform()},
+        'results': {result.name: result._asdict() for result in measurements},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def compare(measurements, path, settings, threshold):
+    # 按中位数和基准比较，ratio > threshold 记为变慢，< 1 / threshold 记为变快
+    with open(path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline['settings'] != settings:
+        print(f"Warning: baseline settings {baseline['settings']} differ from the current run {settings}")
+    rows = []
+    for result in measurements:
+        before = baseline['results'].get(result.name)
+        if before is None:
+            continue
+        ratio = result.median / before['median'] if before['median'] > 0 else float('inf')
+        status = 'slower' if ratio > threshold else 'faster' if ratio < 1 / threshold else ''
+        rows.append({'case': result.name, 'baseline_ms': before['median'] * 1000, 'median_ms': result.median * 1000,
+                     'ratio': ratio, 'peak_mb': result.peak_mb, 'baseline_peak_mb': before['peak_mb'],
+                     'status': status})
+    return pd.DataFrame(rows, columns=['case', 'baseline_ms', 'median_ms', 'ratio', 'peak_mb', 'baseline_peak_mb',
+                                       'status'])
+
+
+def prepare(root, n_codes, n_bars, grid, paths, seed):
+    store = DerivedBarStore(os.path.join(root, 'bars'))
+    cache = ResultCache(os.path.join(root, 'results.sqlite'))
+    codes, end_date = synthetic_universe(store, n_codes, n_bars, seed)
+    frame = synthetic_frame(n_bars, seed, stock_code=codes[0])
+    StockStrategySimulator.bar_store = store
+    return Environment(store, cache, codes, str(frame.index[0].date()), end_date, frame, build_features(frame),
+                       grid, paths)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks for the data loading, analysis and profit hot paths')
+    parser.add_argument('--codes', type=int, default=50, help='number of synthetic stocks')
+    parser.add_argument('--bars', type=int, default=5000, help='daily bars per stock')
+    parser.add_argument('--grid', type=int, default=100, help='values per axis of the profit surface')
+    parser.add_argument('--paths', type=int, default=200_000, help='Monte Carlo paths')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-k', '--filter', default='', help='only run cases whose name contains this text')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against a JSON file written by --save')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown ratio reported as a regression')
+    args = parser.parse_args(argv)
+
+    settings = {'codes': args.codes, 'bars': args.bars, 'grid': args.grid, 'paths': args.paths, 'seed': args.seed}
+    names = [name for name in CASES if args.filter in name]
+    cache_before = StockStrategySimulator.result_cache
+    store_before = StockStrategySimulator.bar_store
+    measurements = []
+    with tempfile.TemporaryDirectory() as root:
+        try:
+            env = prepare(root, args.codes, args.bars, args.grid, args.paths, args.seed)
+            for name in names:
+                setup, unit = CASES[name]
+                run, items = setup(env)
+                measurements.append(measure(name, run, items, unit, args.repeat))
+                print(f"{name}: {measurements[-1].median * 1000:.3f} ms", file=sys.stderr)
+        finally:
+            StockStrategySimulator.result_cache = cache_before
+            StockStrategySimulator.bar_store = store_before
+
+    print(to_frame(measurements).to_string(index=False, float_format=lambda value: f"{value:,.3f}"))
+    if args.save:
+        save(measurements, args.save, settings)
+    if args.baseline:
+        comparison = compare(measurements, args.baseline, settings, args.threshold)
+        print(comparison.to_string(index=False, float_format=lambda value: f"{value:,.3f}"))
+        if (comparison['status'] == 'slower').any():
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from get_data.bar_store import BAR_FIELDS
+
+START_DATE = '2000-01-03'
+
+
+def synthetic_bars(n_bars, seed=0, start_date=START_DATE, start_price=10.0, volatility=0.02):
+    # 随机游走的日线：交易日取工作日，收盘价为几何随机游走，开盘价在前收盘附近跳空，
+    # 最高 / 最低在开盘、收盘的范围外各加一段随机影线。同一个 seed 生成的数据完全相同
+    rng = np.random.default_rng(seed)
+    dates = np.busday_offset(np.datetime64(start_date, 'D'), np.arange(n_bars), roll='forward')
+    close = start_price * np.exp(np.cumsum(rng.normal(0, volatility, n_bars)))
+    previous = np.r_[start_price, close[:-1]]
+    open_ = previous * np.exp(rng.normal(0, volatility / 4, n_bars))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, volatility / 2, n_bars)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, volatility / 2, n_bars)))
+    bars = np.column_stack([open_, high, low, close]).round(2)
+    return dates, bars
+
+
+def synthetic_frame(n_bars, seed=0, stock_code='sh.600000', **kwargs):
+    # 与 BarStore.load 返回的格式相同
+    dates, bars = synthetic_bars(n_bars, seed, **kwargs)
+    result = pd.DataFrame(bars, index=pd.DatetimeIndex(dates, name='date'), columns=BAR_FIELDS)
+    result.insert(0, 'code', stock_code)
+    return result
+
+
+def synthetic_codes(n_codes):
+    return [f"sh.{600000 + index}" if index % 2 == 0 else f"sz.{index:06d}" for index in range(n_codes)]
+
+
+def synthetic_universe(store, n_codes, n_bars, seed=0):
+    # 把 n_codes 只股票的日线写入 store（每只股票的种子不同），返回代码列表和最后一个交易日
+    codes = synthetic_codes(n_codes)
+    last = None
+    for index, code in enumerate(codes):
+        dates, bars = synthetic_bars(n_bars, seed + index)
+        store.write(code, 'daily', dates, bars, dates[0], dates[-1])
+        last = dates[-1]
+    return codes, str(last)
@@ -0,0 +1,5 @@
+import sys
+
+from get_data.cli import main
+
+sys.exit(main())
@@ -0,0 +1,235 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from get_data.indicators import DEFAULT_MACD, DEFAULT_STOCH
+from get_data.panel import bar_aligned, load_panel, signal_matrices, to_calendar
+
+DEFAULT_ENTRY = ('golden_cross', 'divergence_bottom')
+DEFAULT_EXIT = ('trend_break', 'divergence_top')
+
+
+class CostModel(NamedTuple):
+    commission: float = 0.00025  # 佣金费率，买卖双向
+    min_commission: float = 5.0  # 单笔最低佣金
+    stamp_duty: float = 0.0005  # 印花税，只在卖出时收取
+    transfer_fee: float = 0.00001  # 过户费，买卖双向
+    lot_size: int = 100  # A 股一手 100 股
+
+
+class BacktestResult(NamedTuple):
+    equity: pd.Series  # 组合净值（元）
+    drawdown: pd.Series  # 相对历史最高净值的回撤
+    positions: pd.DataFrame  # 每个代码的持仓股数
+    code_equity: pd.DataFrame  # 每个代码子账户的净值
+    trades: pd.DataFrame
+    summary: pd.Series
+
+
+def _costs(value, cost_model, selling):
+    fee = np.where(value > 0, np.maximum(value * cost_model.commission, cost_model.min_commission), 0)
+    fee = fee + value * cost_model.transfer_fee
+    if selling:
+        fee = fee + value * cost_model.stamp_duty
+    return fee
+
+
+def _trades(index, codes, shares, prices, costs):
+    rows, columns = np.nonzero(shares)
+    return pd.DataFrame({
+        'date': index[rows],
+        'code': np.asarray(codes, dtype=object)[columns],
+        'shares': shares[rows, columns],
+        'price': prices[rows, columns],
+        'cost': costs[rows, columns],
+    })
+
+
+def simulate(dates, codes, opens, closes, entry, exit_, cash=1_000_000, cost_model=CostModel(), factors=None):
+    # 信号在第 t 根 K 线收盘后确认，第 t+1 根 K 线开盘价成交，不使用未来数据。
+    # 资金平均分给每个代码作为独立子账户，按时间逐根推进，每一步对所有代码做向量运算。
+    # 当天买入的股票当天不能卖出（T+1），停牌（开盘价缺失）时挂单顺延到复牌。
+    # opens / closes 应为不复权价格（手数、最低佣金和印花税都按真实成交价计算）；factors 为对应的后复权因子矩阵，
+    # 持仓经过除权除息日时按因子的变化把分红、送转折算成现金记入子账户，为 None 时不处理除权除息。
+    n_dates, n_codes = closes.shape
+    sleeve_cash = np.full(n_codes, cash / max(n_codes, 1), dtype=np.float64)
+    shares = np.zeros(n_codes, dtype=np.int64)
+    bought_on = np.full(n_codes, -1)
+    pending_buy = np.zeros(n_codes, dtype=bool)
+    pending_sell = np.zeros(n_codes, dtype=bool)
+    last_close = np.full(n_codes, np.nan)
+    if factors is not None:
+        ratios = factors / np.vstack([factors[:1], factors[:-1]])
+    pending_ratio = np.ones(n_codes)
+    corporate_actions = 0.0
+
+    positions = np.zeros((n_dates, n_codes), dtype=np.int64)
+    code_equity = np.zeros((n_dates, n_codes))
+    # 卖出和买入分开记录：停牌后顺延的卖单和新的买单可能在同一根 K 线成交
+    sell_shares = np.zeros((n_dates, n_codes), dtype=np.int64)
+    sell_prices = np.full((n_dates, n_codes), np.nan)
+    sell_costs = np.zeros((n_dates, n_codes))
+    buy_shares = np.zeros((n_dates, n_codes), dtype=np.int64)
+    buy_prices = np.full((n_dates, n_codes), np.nan)
+    buy_costs = np.zeros((n_dates, n_codes))
+
+    for t in range(n_dates):
+        price = opens[t]
+        tradable = ~np.isnan(price)
+
+        if factors is not None:
+            # 除权除息日停牌时顺延到下一根有价格的 K 线
+            pending_ratio *= ratios[t]
+            reference = np.where(tradable, price, closes[t])
+            settle = (pending_ratio != 1) & ~np.isnan(reference)
+            credit = np.where(settle & (shares > 0), shares * np.nan_to_num(reference) * (pending_ratio - 1), 0)
+            sleeve_cash += credit
+            corporate_actions += credit.sum()
+            pending_ratio = np.where(settle, 1, pending_ratio)
+
+        sell = pending_sell & tradable & (shares > 0) & (bought_on < t)
+        if sell.any():
+            value = np.where(sell, shares * np.nan_to_num(price), 0)
+            fee = np.where(sell, _costs(value, cost_model, selling=True), 0)
+            sleeve_cash += value - fee
+            sell_shares[t] = np.where(sell, -shares, 0)
+            sell_prices[t] = np.where(sell, price, np.nan)
+            sell_costs[t] = fee
+            shares = np.where(sell, 0, shares)
+            pending_sell &= ~sell
+
+        buy = pending_buy & tradable & (shares == 0)
+        if buy.any():
+            unit_price = np.nan_to_num(price) * (1 + cost_model.commission + cost_model.transfer_fee)
+            lots = np.where(buy & (unit_price > 0),
+                            np.floor(sleeve_cash / np.where(unit_price > 0, unit_price, 1) / cost_model.lot_size), 0)
+            quantity = (lots * cost_model.lot_size).astype(np.int64)
+            value = quantity * np.nan_to_num(price)
+            fee = _costs(value, cost_model, selling=False)
+            affordable = (quantity > 0) & (value + fee <= sleeve_cash)
+            quantity = np.where(affordable, quantity, 0)
+            fee = np.where(affordable, fee, 0)
+            sleeve_cash -= quantity * np.nan_to_num(price) + fee
+            shares = shares + quantity
+            bought_on = np.where(affordable, t, bought_on)
+            buy_shares[t] = quantity
+            buy_prices[t] = np.where(affordable, price, np.nan)
+            buy_costs[t] = fee
+            pending_buy &= ~buy
+
+        last_close = np.where(np.isnan(closes[t]), last_close, closes[t])
+        positions[t] = shares
+        code_equity[t] = sleeve_cash + shares * np.nan_to_num(last_close)
+
+        # 收盘后根据信号决定下一根 K 线的委托；还有卖单没成交（停牌顺延）时出现的买入信号也挂单，
+        # 复牌那根 K 线先卖出再用卖出所得买入
+        pending_sell |= exit_[t] & (shares > 0)
+        pending_buy = (pending_buy | (entry[t] & ((shares == 0) | pending_sell))) & ~exit_[t]
+
+    index = pd.DatetimeIndex(dates, name='date')
+    equity = pd.Series(code_equity.sum(axis=1), index=index, name='equity')
+    drawdown = equity / equity.cummax() - 1
+
+    # 同一根 K 线上先卖后买
+    trades = pd.concat([_trades(index, codes, sell_shares, sell_prices, sell_costs),
+                        _trades(index, codes, buy_shares, buy_prices, buy_costs)], ignore_index=True)
+    trades = trades.sort_values('date', kind='stable').reset_index(drop=True)
+    traded_value = (-sell_shares * np.nan_to_num(sell_prices)).sum() + (buy_shares * np.nan_to_num(buy_prices)).sum()
+    years = max((dates[-1] - dates[0]).astype('timedelta64[D]').astype(int) / 365.25, 1 / 365.25) \
+        if n_dates else np.nan
+    total_return = equity.iloc[-1] / cash - 1 if n_dates else np.nan
+    summary = pd.Series({
+        'total_return': total_return,
+        'annual_return': (1 + total_return) ** (1 / years) - 1 if n_dates else np.nan,
+        'max_drawdown': drawdown.min() if n_dates else np.nan,
+        # 换手率：成交额 / 平均净值，按年折算
+        'turnover': traded_value / equity.mean() / years if n_dates else np.nan,
+        'trades': len(trades),
+        'costs': sell_costs.sum() + buy_costs.sum(),
+        'corporate_actions': corporate_actions,
+    })
+    return BacktestResult(equity, drawdown,
+                          pd.DataFrame(positions, index=index, columns=codes),
+                          pd.DataFrame(code_equity, index=index, columns=codes),
+                          trades, summary)
+
+
+def sync_unadjusted(store, stock_codes, interval='daily', start_date='2000-01-01', end_date=None):
+    # 把不复权 K 线拉取进单独的存储（不要和前复权的 bar_store 共用目录），返回拉取失败的代码。
+    # 不复权价格不会因为除权除息回溯变化，只需补齐缺失的区间
+    from get_data.initial import ADJUST_NONE, interval_to_frequency
+    from get_data.predict_buy_revnue import StockStrategySimulator
+
+    interval = store.source_interval(interval)
+    end_date = StockStrategySimulator.last_complete_day(end_date or pd.Timestamp.today())
+    failed = {}
+    for code in stock_codes:
+        try:
+            for fetch_start, fetch_end in store.missing_ranges(code, interval, start_date, end_date):
+                dates, bars = StockStrategySimulator.query_k_data(code, interval_to_frequency[interval],
+                                                                  str(fetch_start), str(fetch_end), ADJUST_NONE)
+                store.merge(code, interval, dates, bars, fetch_start, fetch_end)
+        except Exception as e:
+            failed[code] = str(e)
+    return failed
+
+
+def load_adjust_factors(stock_codes, session=None):
+    # 每个代码的除权除息日和后复权因子：{code: (dates, factors)}
+    from get_data.session import default_session
+
+    session = session or default_session()
+    result = {}
+    for code, frame in zip(stock_codes, session.query_many('query_adjust_factor',
+                                                           [{'code': code} for code in stock_codes])):
+        dates = pd.to_datetime(frame['dividOperateDate']).to_numpy(dtype='datetime64[D]')
+        factors = pd.to_numeric(frame['backAdjustFactor'], errors='coerce').to_numpy(dtype=np.float64)
+        order = np.argsort(dates, kind='stable')
+        result[code] = (dates[order], factors[order])
+    return result
+
+
+def factor_matrix(dates, stock_codes, adjust_factors):
+    # 展开成 (日期 × 代码) 的后复权因子矩阵，第一次除权除息之前为 1
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    result = np.ones((len(dates), len(stock_codes)))
+    for column, code in enumerate(stock_codes):
+        event_dates, factors = adjust_factors.get(code, (np.array([], dtype='datetime64[D]'), np.array([])))
+        rows = np.searchsorted(event_dates, dates, side='right')
+        result[:, column] = np.r_[1.0, factors][rows]
+    return result
+
+
+def _aligned(panel, dates, values):
+    # 把 panel 的矩阵按日期对齐到 dates，没有 K 线的日期为 NaN
+    rows = np.minimum(np.searchsorted(panel.dates, dates), max(len(panel.dates) - 1, 0))
+    result = np.full((len(dates), values.shape[1]), np.nan)
+    if len(panel.dates):
+        match = panel.dates[rows] == dates
+        result[match] = values[rows[match]]
+    return result
+
+
+def backtest(store, execution_store, stock_codes, interval='daily', start_date=None, end_date=None,
+             adjust_factors=None, entry_signals=DEFAULT_ENTRY, exit_signals=DEFAULT_EXIT, cash=1_000_000,
+             cost_model=CostModel(), x=5, macd=DEFAULT_MACD, stoch=DEFAULT_STOCH):
+    # 用 analyze_should_follow 的同一套信号做交易回测：entry_signals 中任一信号出现时买入，
+    # exit_signals 中任一信号出现时卖出，信号名见 panel.signal_matrices。
+    # store 为前复权价格，只用来计算信号；成交按 execution_store 中的不复权价格（见 sync_unadjusted），
+    # adjust_factors 为 load_adjust_factors 的结果，给出时处理持仓期间的分红送转
+    panel = load_panel(store, stock_codes, interval, start_date, end_date)
+    _, (high, low, close) = bar_aligned(panel)
+    signals = signal_matrices(high, low, close, x, macd, stoch)
+    entry = np.zeros(panel.close.shape, dtype=bool)
+    exit_ = np.zeros(panel.close.shape, dtype=bool)
+    for name in entry_signals:
+        entry |= to_calendar(panel, signals[name])
+    for name in exit_signals:
+        exit_ |= to_calendar(panel, signals[name])
+
+    execution = load_panel(execution_store, stock_codes, interval, start_date, end_date)
+    opens = _aligned(execution, panel.dates, execution.open)
+    closes = _aligned(execution, panel.dates, execution.close)
+    factors = None if adjust_factors is None else factor_matrix(panel.dates, panel.codes, adjust_factors)
+    return simulate(panel.dates, panel.codes, opens, closes, entry, exit_, cash, cost_model, factors)
@@ -0,0 +1,199 @@
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from get_data.config import data_path
+
+BAR_FIELDS = ['open', 'high', 'low', 'close']
+ONE_DAY = np.timedelta64(1, 'D')
+INDEX_FILE = 'index.sqlite'
+INDEX_COLUMNS = ['code', 'interval', 'start', 'end', 'rows']
+
+
+def to_day(date):
+    return np.datetime64(pd.Timestamp(date).date(), 'D')
+
+
+# 按 (股票代码, 周期) 持久化 K 线的列式存储
+# 每个 (code, interval) 一个目录：dates.npy 为升序 datetime64[D] 日期索引，bars.npy 为 (n, 4) 的 OHLC 矩阵，
+# meta.json 记录已从数据源拉取过的日期覆盖区间（可能比首尾 K 线更宽，比如周末或停牌）。
+# 读取时以内存映射方式打开，用二分查找截取子区间，不做文本解析。
+# 根目录下的 index.sqlite 是所有对象的索引（以 (code, interval) 为主键），覆盖区间的查询只走索引，
+# 不需要列目录或打开各个 meta.json；meta.json 仍随数据一起写入，索引丢失时可以用 rebuild_index 重建。
+class BarStore:
+    def __init__(self, root=None):
+        self.root = root or data_path('bars')
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # 数据库连接不能跨进程使用，传给子进程时只带根目录
+        return {'root': self.root}
+
+    def __setstate__(self, state):
+        self.__init__(state['root'])
+
+    def _dir(self, stock_code, interval):
+        return os.path.join(self.root, f"{stock_code}_{interval}")
+
+    def source_interval(self, interval):
+        # 需要从数据源拉取的周期，本地聚合的存储（见 resample.DerivedBarStore）会返回 'daily'
+        return interval
+
+    def _index(self):
+        # 每个线程各自连接，fork 出来的子进程重新建立连接
+        if getattr(self._local, 'pid', None) != os.getpid():
+            os.makedirs(self.root, exist_ok=True)
+            path = os.path.join(self.root, INDEX_FILE)
+            created = not os.path.exists(path)
+            self._local.connection = sqlite3.connect(path, timeout=30)
+            self._local.pid = os.getpid()
+            self._local.connection.execute(
+                'CREATE TABLE IF NOT EXISTS bars (code TEXT NOT NULL, interval TEXT NOT NULL, start TEXT NOT NULL, '
+                '"end" TEXT NOT NULL, rows INTEGER NOT NULL, PRIMARY KEY (code, interval))')
+            self._local.connection.commit()
+            if created:
+                # 没有索引的旧数据目录，第一次打开时从 meta.json 建立索引
+                self.rebuild_index()
+        return self._local.connection
+
+    def rebuild_index(self):
+        entries = []
+        for name in os.listdir(self.root):
+            meta_path = os.path.join(self.root, name, 'meta.json')
+            if os.path.exists(meta_path):
+                with open(meta_path, encoding='utf-8') as f:
+                    meta = json.load(f)
+                entries.append(tuple(meta[column] for column in INDEX_COLUMNS))
+        connection = self._index()
+        with connection:
+            connection.execute('DELETE FROM bars')
+            connection.executemany('INSERT INTO bars VALUES (?, ?, ?, ?, ?)', entries)
+        return len(entries)
+
+    def entries(self, interval=None):
+        # 索引中的全部对象，列为 code, interval, start, end, rows
+        query = 'SELECT code, interval, start, "end", rows FROM bars'
+        if interval is None:
+            rows = self._index().execute(query).fetchall()
+        else:
+            rows = self._index().execute(query + ' WHERE interval = ?', (interval,)).fetchall()
+        return pd.DataFrame(rows, columns=INDEX_COLUMNS)
+
+    def read_meta(self, stock_code, interval):
+        row = self._index().execute('SELECT code, interval, start, "end", rows FROM bars WHERE code = ? AND interval = ?',
+                                    (stock_code, interval)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(INDEX_COLUMNS, row))
+
+    def coverage(self, stock_code, interval):
+        meta = self.read_meta(stock_code, interval)
+        if meta is None:
+            return None
+        return to_day(meta['start']), to_day(meta['end'])
+
+    def load_arrays(self, stock_code, interval, start_date=None, end_date=None):
+        path = self._dir(stock_code, interval)
+        dates = np.load(os.path.join(path, 'dates.npy'), mmap_mode='r')
+        bars = np.load(os.path.join(path, 'bars.npy'), mmap_mode='r')
+        lo = 0 if start_date is None else np.searchsorted(dates, to_day(start_date), side='left')
+        hi = len(dates) if end_date is None else np.searchsorted(dates, to_day(end_date), side='right')
+        return np.array(dates[lo:hi]), np.array(bars[lo:hi])
+
+    def load(self, stock_code, interval, start_date=None, end_date=None):
+        dates, bars = self.load_arrays(stock_code, interval, start_date, end_date)
+        result = pd.DataFrame(bars, index=pd.DatetimeIndex(dates, name='date'), columns=BAR_FIELDS)
+        result.insert(0, 'code', stock_code)
+        return result
+
+    def last_bar(self, stock_code, interval):
+        path = self._dir(stock_code, interval)
+        if self.coverage(stock_code, interval) is None:
+            return None
+        dates = np.load(os.path.join(path, 'dates.npy'), mmap_mode='r')
+        if len(dates) == 0:
+            return None
+        bars = np.load(os.path.join(path, 'bars.npy'), mmap_mode='r')
+        return dates[-1], np.array(bars[-1])
+
+    def first_bar(self, stock_code, interval):
+        path = self._dir(stock_code, interval)
+        if self.coverage(stock_code, interval) is None:
+            return None
+        dates = np.load(os.path.join(path, 'dates.npy'), mmap_mode='r')
+        if len(dates) == 0:
+            return None
+        bars = np.load(os.path.join(path, 'bars.npy'), mmap_mode='r')
+        return dates[0], np.array(bars[0])
+
+    def append(self, stock_code, interval, dates, bars, end):
+        # 追加最后一根已存 K 线之后的新数据，覆盖区间延长到 end
+        covered = self.coverage(stock_code, interval)
+        old_dates, old_bars = self.load_arrays(stock_code, interval)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        bars = np.asarray(bars, dtype=np.float64).reshape(len(dates), len(BAR_FIELDS))
+        newer = dates > old_dates[-1] if len(old_dates) else np.ones(len(dates), dtype=bool)
+        self.write(stock_code, interval,
+                   np.concatenate([old_dates, dates[newer]]),
+                   np.concatenate([old_bars, bars[newer]]),
+                   covered[0], max(to_day(end), covered[1]))
+        return int(newer.sum())
+
+    def write(self, stock_code, interval, dates, bars, start, end):
+        path = self._dir(stock_code, interval)
+        os.makedirs(path, exist_ok=True)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        bars = np.asarray(bars, dtype=np.float64).reshape(len(dates), len(BAR_FIELDS))
+        # 先写临时文件再替换，避免中断后留下不完整的数据
+        for name, array in (('dates', dates), ('bars', bars)):
+            tmp_path = os.path.join(path, f'{name}.tmp.npy')
+            np.save(tmp_path, array)
+            os.replace(tmp_path, os.path.join(path, f'{name}.npy'))
+        meta = {
+            'code': stock_code,
+            'interval': interval,
+            'start': str(to_day(start)),
+            'end': str(to_day(end)),
+            'rows': int(len(dates)),
+        }
+        tmp_path = os.path.join(path, 'meta.tmp.json')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(path, 'meta.json'))
+        connection = self._index()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO bars VALUES (?, ?, ?, ?, ?)',
+                               tuple(meta[column] for column in INDEX_COLUMNS))
+
+    def merge(self, stock_code, interval, dates, bars, start, end):
+        # 把新拉取的 [start, end] 区间合并进已有数据，同一日期以新数据为准
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        bars = np.asarray(bars, dtype=np.float64).reshape(len(dates), len(BAR_FIELDS))
+        covered = self.coverage(stock_code, interval)
+        if covered is not None:
+            old_dates, old_bars = self.load_arrays(stock_code, interval)
+            keep = ~np.isin(old_dates, dates)
+            dates = np.concatenate([old_dates[keep], dates])
+            bars = np.concatenate([old_bars[keep], bars])
+            start = min(to_day(start), covered[0])
+            end = max(to_day(end), covered[1])
+        order = np.argsort(dates, kind='stable')
+        self.write(stock_code, interval, dates[order], bars[order], start, end)
+
+    def missing_ranges(self, stock_code, interval, start_date, end_date):
+        # 返回为覆盖 [start_date, end_date] 还需要拉取的日期区间，保证覆盖区间始终连续
+        start, end = to_day(start_date), to_day(end_date)
+        covered = self.coverage(stock_code, interval)
+        if covered is None:
+            ranges = [(start, end)]
+        else:
+            ranges = []
+            if start < covered[0]:
+                ranges.append((start, covered[0] - ONE_DAY))
+            if end > covered[1]:
+                ranges.append((covered[1] + ONE_DAY, end))
+        return [(lo, hi) for lo, hi in ranges if lo <= hi]
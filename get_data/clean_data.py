@@ -1,52 +1,114 @@
 import os
 import re
+from collections import defaultdict
 
+import numpy as np
+import pandas as pd
 
-def remove_subset_files(directory):
-    files = os.listdir(directory)
-    file_dict = {}
+from get_data.bar_store import BarStore, BAR_FIELDS, ONE_DAY, to_day
+from get_data.config import data_path
+from get_data.resample import DERIVED_INTERVALS
 
-    # 构建字典，以股票代码和数据类型为键，值为包含起始日期的文件列表
-    for file_name in files:
-        print(file_name)
-        # 使用正则表达式从文件名中提取股票代码、数据类型和起始日期
-        pattern = r'(\w+)\.(\d+)\_(\w+)\_(\d{4}\-\d{2}\-\d{2})\_(\d{4}\-\d{2}\-\d{2})\.csv'
-        match = re.match(pattern, file_name)
+# 旧版 get_stock_data 写出的缓存文件名：{stock_code}_{interval}_{start_date}_{end_date}.csv
+CSV_PATTERN = re.compile(r'^([a-z]{2}\.\w+)_(\w+)_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})\.csv$')
+
+
+def _csv_coverage(path, start, end):
+    # 文件名里的 end 可能晚于文件写出的时间，实际只覆盖到写文件前一天
+    written = np.datetime64(pd.Timestamp(os.path.getmtime(path), unit='s').date(), 'D')
+    return start, max(min(end, written - ONE_DAY), start)
+
+
+def _read_csv(path):
+    data = pd.read_csv(path, index_col='date', parse_dates=True)
+    bars = data[BAR_FIELDS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    return data.index.to_numpy(dtype='datetime64[D]'), bars
+
+
+def _consistent_run(pieces, anchor):
+    # 旧的 CSV 是下载当时的前复权价格，不同时间下载的文件在中间发生过除权除息时价格尺度不同，
+    # 不能直接拼接。从 anchor（已有存储，或没有存储时结束最晚、也就是最新的文件）开始，
+    # 反复并入与当前区间重叠或相接、并且在共同日期上 K 线一致的文件（与 append_tail 的重叠校验相同）；
+    # 没有共同日期可以校验、或者对不上的文件不并入。返回并入后的日期、K 线、覆盖区间和并入的文件
+    dates, bars, start, end = anchor
+    joined = []
+    remaining = list(pieces)
+    changed = True
+    while changed:
+        changed = False
+        for piece in list(remaining):
+            piece_start, piece_end, _, piece_dates, piece_bars = piece
+            if piece_start > end + ONE_DAY or piece_end < start - ONE_DAY:
+                continue
+            _, ours, theirs = np.intersect1d(dates, piece_dates, return_indices=True)
+            if len(ours) == 0 or not np.allclose(bars[ours], piece_bars[theirs], equal_nan=True):
+                continue
+            new = ~np.isin(piece_dates, dates)
+            dates = np.concatenate([dates, piece_dates[new]])
+            bars = np.concatenate([bars, piece_bars[new]])
+            order = np.argsort(dates, kind='stable')
+            dates, bars = dates[order], bars[order]
+            start, end = min(start, piece_start), max(end, piece_end)
+            joined.append(piece)
+            remaining.remove(piece)
+            changed = True
+    return dates, bars, start, end, joined
+
+
+def compact_csv_cache(directory, store):
+    # 把旧的 CSV 缓存按真实覆盖区间合并进 BarStore，每个 (code, interval) 合并成一个对象，
+    # 合并成功的 CSV 删除；与存储不相连、或复权价格对不上（见 _consistent_run）的文件保留原文件，
+    # 留给下次合并或者重新下载。
+    # 周线、月线现在由日线在本地聚合（见 resample.DerivedBarStore），存储里的周线 / 月线对象没有人读，
+    # 这些 CSV 不合并也不删除，原样留在磁盘上
+    if not os.path.isdir(directory):
+        return {'merged': 0, 'kept': 0, 'objects': 0}
+
+    file_dict = defaultdict(list)
+    merged = kept = objects = 0
+    for file_name in os.listdir(directory):
+        match = CSV_PATTERN.match(file_name)
         if match:
-            stock_code = match.group(1)
-            data_type = match.group(2)
-            start_date = match.group(3)
-            file_info = (start_date, file_name)
-            key = (stock_code, data_type)
-            if key in file_dict:
-                file_dict[key].append(file_info)
-            else:
-                file_dict[key] = [file_info]
-
-    # 删除时间范围属于子集的重叠文件
-    files_before_deletion = sum([len(file_list) for file_list in file_dict.values()])
-    files_deleted = 0
-
-    for key, file_list in file_dict.items():
-        if len(file_list) > 1:
-            sorted_files = sorted(file_list, key=lambda x: x[0])  # 按起始日期排序
-            files_to_delete = []
-            for i in range(len(sorted_files) - 1):
-                curr_file = sorted_files[i]
-                next_file = sorted_files[i + 1]
-                if curr_file[0] <= next_file[0]:
-                    files_to_delete.append(next_file[1])
-            for file_to_delete in files_to_delete:
-                file_path = os.path.join(directory, file_to_delete)
-                print(f"删除文件: {file_path}")
-                os.remove(file_path)  # 如果确定要删除文件，取消注释此行
-                files_deleted += 1
-
-    files_after_deletion = files_before_deletion - files_deleted
-    print(f"删除前的文件数量: {files_before_deletion}")
-    print(f"删除后的文件数量: {files_after_deletion}")
-
-
-# 指定目录进行操作
-directory_path = '../data/stock'
-remove_subset_files(directory_path)
+            stock_code, interval, start_date, end_date = match.groups()
+            if interval in DERIVED_INTERVALS:
+                kept += 1
+                continue
+            start, end = _csv_coverage(os.path.join(directory, file_name), to_day(start_date), to_day(end_date))
+            file_dict[(stock_code, interval)].append((start, end, file_name))
+
+    for (stock_code, interval), ranges in file_dict.items():
+        pieces = [(start, end, file_name, *_read_csv(os.path.join(directory, file_name)))
+                  for start, end, file_name in ranges]
+        covered = store.coverage(stock_code, interval)
+        if covered is not None:
+            anchor = (*store.load_arrays(stock_code, interval), *covered)
+        else:
+            newest = max(pieces, key=lambda piece: piece[1])
+            pieces.remove(newest)
+            anchor = (newest[3], newest[4], newest[0], newest[1])
+        dates, bars, run_start, run_end, joined = _consistent_run(pieces, anchor)
+        if covered is None:
+            joined.append(newest)
+        if not joined:
+            kept += len(ranges)
+            continue
+        if covered is not None:
+            # 已在存储覆盖区间内的日期以存储为准
+            outside = (dates < covered[0]) | (dates > covered[1])
+            dates, bars = dates[outside], bars[outside]
+        store.merge(stock_code, interval, dates, bars, run_start, run_end)
+        for _, _, file_name, _, _ in joined:
+            os.remove(os.path.join(directory, file_name))
+        merged += len(joined)
+        kept += len(ranges) - len(joined)
+        objects += 1
+
+    print(f"合并的文件数量: {merged}，合并成 {objects} 个存储对象")
+    print(f"保留的文件数量: {kept}")
+    return {'merged': merged, 'kept': kept, 'objects': objects}
+
+
+if __name__ == '__main__':
+    # 指定目录进行操作
+    directory_path = data_path('stock')
+    compact_csv_cache(directory_path, BarStore(data_path('bars')))
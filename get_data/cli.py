@@ -0,0 +1,146 @@
+import argparse
+import datetime
+import sys
+
+from get_data import profiling
+from get_data.config import data_dir, data_path, set_data_dir
+
+# 命令行入口：python -m get_data <命令> ...，安装后也可以直接用 fintech <命令> ...
+# 各个命令用到的模块（pandas、talib、baostock 等）在命令执行时才导入，--help 和参数检查不需要加载它们
+
+
+def _simulator(args):
+    from get_data.predict_buy_revnue import StockStrategySimulator
+    if args.data_dir:
+        StockStrategySimulator.configure(args.data_dir)
+    return StockStrategySimulator
+
+
+def scan(args):
+    _simulator(args)
+    from get_data.predict_buy_revnue import scan_universe
+    result = scan_universe(args.codes or None, args.interval, args.start, args.end, m=args.m, rate=args.rate,
+                           max_workers=args.workers, verbose=args.verbose, panel=args.panel)
+    print(result.to_string())
+
+
+def analyze(args):
+    simulator = _simulator(args)
+    name = simulator.security_master.name(args.code, args.code)
+    decisions = simulator.analyze_timeframes(args.code, args.m, name, args.intervals, args.start, args.end,
+                                             report=True)
+    for interval, decision in decisions.items():
+        print(f"{interval}: {decision.should_buy} {decision.expectation:.4f}")
+
+
+def fetch(args):
+    _simulator(args)
+    from get_data.predict_buy_revnue import fetch_universe
+    failed = fetch_universe(args.codes, args.interval, args.start, args.end, args.rate)
+    for code, error in failed.items():
+        print(f"{code}: {error}")
+    return 1 if failed else 0
+
+
+def securities(args):
+    # 只用到证券主表，不需要导入分析模块
+    from get_data.security_master import SecurityMaster
+    master = SecurityMaster()
+    if args.refresh or len(master) == 0:
+        print(master.refresh(day=args.day))
+    frame = master.to_frame()
+    print(frame.to_string() if args.all else frame.head(20).to_string())
+    print(f"{len(frame)} securities")
+
+
+def fundamentals(args):
+    from get_data.fundamentals import DATASETS, FundamentalStore, load_fundamentals
+    from get_data.security_master import SecurityMaster
+    master = SecurityMaster()
+    if args.codes:
+        codes = args.codes
+    else:
+        if len(master) == 0:
+            master.refresh()
+        codes = master.universe()
+    failed = load_fundamentals(codes, args.start_year, args.end_year, args.datasets or tuple(DATASETS),
+                               FundamentalStore())
+    for (dataset, code, year, quarter), error in failed.items():
+        print(f"{dataset} {code} {year}Q{quarter}: {error}")
+    return 1 if failed else 0
+
+
+def compact_csv(args):
+    from get_data.bar_store import BarStore
+    from get_data.clean_data import compact_csv_cache
+    compact_csv_cache(args.directory or data_path('stock'), BarStore(data_path('bars')))
+
+
+def build_parser():
+    today = datetime.date.today().isoformat()
+    parser = argparse.ArgumentParser(prog='fintech', description='Stock data fetching and signal analysis')
+    parser.add_argument('--data-dir', help=f'local data directory (default: {data_dir()})')
+    parser.add_argument('--profile', action='store_true', help='print per-stage timings when the command finishes')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def history(command):
+        command.add_argument('--interval', default='daily', choices=['daily', 'weekly', 'monthly'])
+        command.add_argument('--start', default='2000-01-01')
+        command.add_argument('--end', default=today)
+        command.add_argument('--rate', type=float, default=5.0, help='data source requests per second')
+
+    command = commands.add_parser('scan', help='rank stocks by expected return (default: the whole listed universe)')
+    command.add_argument('codes', nargs='*')
+    history(command)
+    command.add_argument('-m', type=int, default=5)
+    command.add_argument('--workers', type=int)
+    command.add_argument('--panel', action='store_true', help='analyze stocks in aligned blocks')
+    command.add_argument('--verbose', action='store_true', help='print the full report for every stock')
+    command.set_defaults(run=scan)
+
+    command = commands.add_parser('analyze', help='print the full report for one stock on several intervals')
+    command.add_argument('code')
+    command.add_argument('--intervals', nargs='+', default=['daily', 'weekly', 'monthly'])
+    command.add_argument('--start', default='2000-01-01')
+    command.add_argument('--end', default=today)
+    command.add_argument('-m', type=int, default=5)
+    command.set_defaults(run=analyze)
+
+    command = commands.add_parser('fetch', help='download missing bars into the local store')
+    command.add_argument('codes', nargs='+')
+    history(command)
+    command.set_defaults(run=fetch)
+
+    command = commands.add_parser('securities', help='show or refresh the security master')
+    command.add_argument('--refresh', action='store_true')
+    command.add_argument('--day', help='listing day used by --refresh (default: today)')
+    command.add_argument('--all', action='store_true')
+    command.set_defaults(run=securities)
+
+    command = commands.add_parser('fundamentals', help='download quarterly profit, growth and operation data')
+    command.add_argument('codes', nargs='*')
+    command.add_argument('--start-year', type=int, default=datetime.date.today().year - 1)
+    command.add_argument('--end-year', type=int, default=datetime.date.today().year)
+    command.add_argument('--datasets', nargs='+', choices=['profit', 'growth', 'operation'])
+    command.set_defaults(run=fundamentals)
+
+    command = commands.add_parser('compact-csv', help='merge the legacy CSV cache into the bar store')
+    command.add_argument('directory', nargs='?')
+    command.set_defaults(run=compact_csv)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.data_dir:
+        set_data_dir(args.data_dir)
+    if args.profile:
+        profiling.enable()
+    status = args.run(args)
+    if args.profile:
+        print(profiling.report().to_string())
+    return status or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import os
+
+# 本地数据目录：从源码目录运行（包括 pip install -e 的可编辑安装）时默认是仓库根目录下的 data，
+# 即以前在 get_data 目录下运行时的 ../data；普通 pip install 装进 site-packages 后默认是用户目录下的 ~/.fintech，
+# 不往 site-packages 里写数据。可以用环境变量 FINTECH_DATA_DIR 或命令行的 --data-dir 修改，与当前工作目录无关
+DATA_DIR_ENV = 'FINTECH_DATA_DIR'
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_DATA_DIR = os.path.join(os.path.expanduser('~'), '.fintech')
+
+
+def default_data_dir(root=PACKAGE_ROOT):
+    # 包所在目录下有 pyproject.toml 说明是源码目录
+    if os.path.isfile(os.path.join(root, 'pyproject.toml')):
+        return os.path.join(root, 'data')
+    return USER_DATA_DIR
+
+
+DEFAULT_DATA_DIR = default_data_dir()
+
+
+def data_dir():
+    return os.environ.get(DATA_DIR_ENV) or DEFAULT_DATA_DIR
+
+
+def data_path(*parts):
+    return os.path.join(data_dir(), *parts)
+
+
+def set_data_dir(path):
+    # 写进环境变量，spawn 方式启动的子进程也使用同一个目录
+    os.environ[DATA_DIR_ENV] = os.path.abspath(path)
@@ -0,0 +1,206 @@
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from get_data.session import NOT_LOGGED_IN
+
+NETWORK_ERROR = '10002007'  # 模拟的网络错误码
+BAD_CODE = '10004011'  # 模拟的证券代码格式错误（不可重试）
+CODE_PATTERN = re.compile(r'^(sh|sz)\.\d{6}$')
+
+PROFIT_FIELDS = ['code', 'pubDate', 'statDate', 'roeAvg', 'npMargin', 'gpMargin', 'netProfit', 'epsTTM',
+                 'MBRevenue', 'totalShare', 'liqaShare']
+GROWTH_FIELDS = ['code', 'pubDate', 'statDate', 'YOYEquity', 'YOYAsset', 'YOYNI', 'YOYEPSBasic', 'YOYPNI']
+OPERATION_FIELDS = ['code', 'pubDate', 'statDate', 'NRTurnRatio', 'NRTurnDays', 'INVTurnRatio', 'INVTurnDays',
+                    'CATurnRatio', 'AssetTurnRatio']
+
+
+class FakeResultSet:
+    def __init__(self, fields, rows, error_code='0', error_msg='success'):
+        self.fields = fields
+        self.error_code = error_code
+        self.error_msg = error_msg
+        self._rows = rows
+        self._index = -1
+
+    def next(self):
+        self._index += 1
+        return self._index < len(self._rows)
+
+    def get_row_data(self):
+        return self._rows[self._index]
+
+
+class FakeLogin:
+    def __init__(self, error_code='0', error_msg='success'):
+        self.error_code = error_code
+        self.error_msg = error_msg
+
+
+# 离线替身：接口和返回结构与 baostock 模块一致，数据按代码确定性生成（随机游走的日线，周线、月线由日线聚合，
+# 按周、月最后一个交易日标记日期），用于在没有网络时测试会话层和各个拉取流程。
+# fail_next 可以让接下来的若干次查询返回网络错误，expire() 模拟会话过期，latency 模拟每次查询的网络延迟。
+# ex_dividend 模拟除权除息：series 为后复权价格，不复权价格从除权日起乘以 ratio，前复权价格整体随之变化。
+class FakeBaostock:
+    def __init__(self, codes=None, n_codes=40, start_date='1999-01-01', end_date='2030-12-31', latency=0.0):
+        if codes is None:
+            codes = [f'sh.{600000 + i}' for i in range(n_codes // 2)] + \
+                    [f'sz.{i + 1:06d}' for i in range(n_codes - n_codes // 2)]
+        self.codes = list(codes)
+        self.calendar = pd.bdate_range(start_date, end_date)
+        self.latency = latency
+        self.calls = []
+        self.logins = 0
+        self.logged_in = False
+        self._failures = 0
+        self._series = {}
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def _rng(self, code, salt=''):
+        return np.random.default_rng(zlib.crc32(f'{code}{salt}'.encode()))
+
+    def ipo_date(self, code):
+        offset = int(self._rng(code, 'ipo').integers(0, len(self.calendar) // 2))
+        return self.calendar[offset]
+
+    def series(self, code):
+        with self._lock:
+            if code not in self._series:
+                dates = self.calendar[self.calendar >= self.ipo_date(code)]
+                rng = self._rng(code)
+                close = 10 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(dates))))
+                open_ = close * np.exp(rng.normal(0, 0.005, len(dates)))
+                high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, len(dates))))
+                low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, len(dates))))
+                volume = rng.integers(1_000_000, 50_000_000, len(dates)).astype(np.float64)
+                self._series[code] = pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close,
+                                                   'volume': volume}, index=dates)
+            return self._series[code]
+
+    # 测试辅助
+    def fail_next(self, n=1):
+        self._failures += n
+
+    def expire(self):
+        self.logged_in = False
+
+    def ex_dividend(self, code, day, ratio):
+        # 除权日 day 起不复权价格变为原来的 ratio 倍（ratio < 1，比如每股派息 0.5 元、股价 10 元时为 0.95）
+        with self._lock:
+            self._events.setdefault(code, []).append((pd.Timestamp(day), float(ratio)))
+            self._events[code].sort()
+
+    def _adjustment(self, code, dates, adjustflag):
+        # 相对 series（后复权）的价格倍数：1 后复权，2 前复权，3 不复权
+        scale = np.ones(len(dates))
+        if adjustflag == '1':
+            return scale
+        for day, ratio in self._events.get(code, []):
+            if adjustflag == '2':
+                scale *= ratio
+            else:
+                scale[dates >= day] *= ratio
+        return scale
+
+    def login(self, user_id='anonymous', password='123456', options=0):
+        self.logins += 1
+        self.logged_in = True
+        return FakeLogin()
+
+    def logout(self, user_id='anonymous'):
+        self.logged_in = False
+        return FakeLogin()
+
+    def _result(self, method, kwargs, fields, make_rows):
+        with self._lock:
+            self.calls.append((method, kwargs))
+            failed = self._failures > 0
+            self._failures -= failed
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.logged_in:
+            return FakeResultSet(fields, [], NOT_LOGGED_IN, '用户未登录')
+        if failed:
+            return FakeResultSet(fields, [], NETWORK_ERROR, '网络接收错误')
+        if kwargs.get('code') and not CODE_PATTERN.match(kwargs['code']):
+            return FakeResultSet(fields, [], BAD_CODE, '证券代码格式错误')
+        return FakeResultSet(fields, make_rows())
+
+    def query_history_k_data(self, code, fields, start_date=None, end_date=None, frequency='d', adjustflag='3'):
+        fields = fields.split(',')
+
+        def make_rows():
+            data = self.series(code).loc[start_date:end_date].copy()
+            scale = self._adjustment(code, data.index, str(adjustflag))
+            for column in ('open', 'high', 'low', 'close'):
+                data[column] *= scale
+            if frequency in ('w', 'm'):
+                period = data.index.to_period('W-FRI' if frequency == 'w' else 'M')
+                groups = data.groupby(period)
+                data = groups.agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'})
+                data.index = groups.apply(lambda group: group.index[-1]).to_numpy()
+            columns = {'date': [day.strftime('%Y-%m-%d') for day in data.index], 'code': [code] * len(data)}
+            for field in fields:
+                if field in data:
+                    columns[field] = [f'{value:.4f}' for value in data[field]]
+            return [list(row) for row in zip(*[columns[field] for field in fields])]
+
+        return self._result('query_history_k_data', dict(code=code, start_date=start_date, end_date=end_date,
+                                                         frequency=frequency, adjustflag=adjustflag), fields, make_rows)
+
+    def query_adjust_factor(self, code, start_date=None, end_date=None):
+        fields = ['code', 'dividOperateDate', 'foreAdjustFactor', 'backAdjustFactor', 'adjustFactor']
+
+        def make_rows():
+            events = self._events.get(code, [])
+            total = np.prod([ratio for _, ratio in events])
+            rows, applied = [], 1.0
+            for day, ratio in events:
+                applied *= ratio
+                if (start_date is None or day >= pd.Timestamp(start_date)) and \
+                        (end_date is None or day <= pd.Timestamp(end_date)):
+                    rows.append([code, day.strftime('%Y-%m-%d'), f'{applied / total:.6f}', f'{1 / applied:.6f}',
+                                 f'{1 / applied:.6f}'])
+            return rows
+
+        return self._result('query_adjust_factor', dict(code=code, start_date=start_date, end_date=end_date),
+                            fields, make_rows)
+
+    def query_all_stock(self, day=None):
+        day = pd.Timestamp(day or self.calendar[-1])
+        return self._result('query_all_stock', dict(day=day), ['code', 'tradeStatus', 'code_name'],
+                            lambda: [[code, '1', f'股票{code[3:]}'] for code in self.codes
+                                     if self.ipo_date(code) <= day])
+
+    def query_stock_basic(self, code='', code_name=''):
+        fields = ['code', 'code_name', 'ipoDate', 'outDate', 'type', 'status']
+        codes = [code] if code else self.codes
+        return self._result('query_stock_basic', dict(code=code), fields,
+                            lambda: [[item, f'股票{item[3:]}', self.ipo_date(item).strftime('%Y-%m-%d'), '', '1', '1']
+                                     for item in codes if item in self.codes])
+
+    def _quarterly(self, method, code, year, quarter, fields):
+        def make_rows():
+            stat_date = pd.Period(year=int(year), quarter=int(quarter), freq='Q').end_time.normalize()
+            if code not in self.codes or stat_date < self.ipo_date(code) or stat_date > self.calendar[-1]:
+                return []
+            rng = self._rng(code, f'{method}{year}{quarter}')
+            values = [f'{value:.6f}' for value in rng.normal(0.1, 0.05, len(fields) - 3)]
+            pub_date = stat_date + pd.Timedelta(days=30)
+            return [[code, pub_date.strftime('%Y-%m-%d'), stat_date.strftime('%Y-%m-%d')] + values]
+
+        return self._result(method, dict(code=code, year=year, quarter=quarter), fields, make_rows)
+
+    def query_profit_data(self, code, year=None, quarter=None):
+        return self._quarterly('query_profit_data', code, year, quarter, PROFIT_FIELDS)
+
+    def query_growth_data(self, code, year=None, quarter=None):
+        return self._quarterly('query_growth_data', code, year, quarter, GROWTH_FIELDS)
+
+    def query_operation_data(self, code, year=None, quarter=None):
+        return self._quarterly('query_operation_data', code, year, quarter, OPERATION_FIELDS)
@@ -0,0 +1,45 @@
+import numpy as np
+
+# 各分析方法共用的信号后收益计算：
+# 1. 收益只看信号出现之后的 horizon 根 K 线（t 收盘到 t + horizon 收盘），不混入信号之前的走势；
+# 2. 收益按复利计算：对数价格是对数收益率的累加和，两点相减即得区间收益，一次差分 O(n) 得到所有起点；
+# 3. 同一段行情里连续满足条件的 K 线只按不重叠的方式采样，一个事件的持有期内不再记新的事件。
+# 支持一维序列，也支持 (K 线 × 代码) 的二维矩阵（按列计算）。
+
+
+def log_prices(close):
+    close = np.asarray(close, dtype=np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.log(np.where(close > 0, close, np.nan))
+
+
+def forward_returns(close, horizon, log_close=None):
+    # 第 t 根 K 线收盘买入、持有 horizon 根 K 线后的复利收益（%），还没走完持有期的为 NaN
+    if log_close is None:
+        log_close = log_prices(close)
+    result = np.full(log_close.shape, np.nan)
+    if 0 < horizon < len(log_close):
+        result[:-horizon] = np.expm1(log_close[horizon:] - log_close[:-horizon]) * 100
+    return result
+
+
+def non_overlapping(mask, horizon):
+    # 贪心地保留互不重叠的事件：保留一个事件后，它的持有期内出现的事件全部跳过
+    mask = np.asarray(mask, dtype=bool)
+    if mask.ndim == 2:
+        kept = np.zeros(mask.shape, dtype=bool)
+        for column in range(mask.shape[1]):
+            kept[:, column] = non_overlapping(mask[:, column], horizon)
+        return kept
+    kept = np.zeros(mask.shape, dtype=bool)
+    next_free = 0
+    for index in np.flatnonzero(mask):
+        if index >= next_free:
+            kept[index] = True
+            next_free = index + max(horizon, 1)
+    return kept
+
+
+def event_mask(mask, forward, horizon):
+    # 只统计已经走完持有期的事件，并去掉重叠的事件
+    return non_overlapping(np.asarray(mask, dtype=bool) & ~np.isnan(forward), horizon)
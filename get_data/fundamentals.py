@@ -0,0 +1,165 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from get_data.config import data_path
+from get_data.rate_limit import RateLimiter
+from get_data.session import default_session
+
+# 数据集名称 -> (baostock 查询方法, 数值列)
+DATASETS = {
+    'profit': ('query_profit_data',
+               ['roeAvg', 'npMargin', 'gpMargin', 'netProfit', 'epsTTM', 'MBRevenue', 'totalShare', 'liqaShare']),
+    'growth': ('query_growth_data', ['YOYEquity', 'YOYAsset', 'YOYNI', 'YOYEPSBasic', 'YOYPNI']),
+    'operation': ('query_operation_data',
+                  ['NRTurnRatio', 'NRTurnDays', 'INVTurnRatio', 'INVTurnDays', 'CATurnRatio', 'AssetTurnRatio']),
+}
+KEY_COLUMNS = ['code', 'year', 'quarter']
+DATE_COLUMNS = ['pubDate', 'statDate']
+# 财报披露截止时间（季度结束后的月数）：一季报 4 月底，半年报 8 月底，三季报 10 月底，年报次年 4 月底
+REPORT_LAG_MONTHS = {1: 1, 2: 2, 3: 1, 4: 4}
+
+
+def report_deadline(year, quarter):
+    quarter_end = pd.Period(year=year, quarter=quarter, freq='Q').end_time.normalize()
+    return quarter_end + pd.offsets.MonthEnd(REPORT_LAG_MONTHS[quarter])
+
+
+def quarters(start_year, end_year, today=None):
+    # [start_year, end_year] 中已经结束的季度
+    today = pd.Timestamp(today or pd.Timestamp.today()).normalize()
+    return [(year, quarter) for year in range(start_year, end_year + 1) for quarter in range(1, 5)
+            if pd.Period(year=year, quarter=quarter, freq='Q').end_time.normalize() < today]
+
+
+def _typed(frame, numeric_columns):
+    # baostock 返回的都是字符串，按列转成固定类型
+    result = pd.DataFrame({
+        'code': frame['code'].astype(str).to_numpy(dtype='U12'),
+        'year': frame['year'].to_numpy(dtype=np.int16),
+        'quarter': frame['quarter'].to_numpy(dtype=np.int8),
+    })
+    for column in DATE_COLUMNS:
+        result[column] = pd.to_datetime(frame[column], errors='coerce').to_numpy(dtype='datetime64[D]')
+    for column in numeric_columns:
+        result[column] = pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+    return result
+
+
+# 财务数据的列式存储：每个数据集一个 {dataset}.npz，每列一个定长类型的数组，以 (code, year, quarter) 为键；
+# checked_* 数组记录已经查询过的键（包括没有数据的季度，比如上市前），再次拉取时跳过。
+class FundamentalStore:
+    def __init__(self, root=None):
+        self.root = root or data_path('fundamentals')
+
+    def _path(self, dataset):
+        return os.path.join(self.root, f'{dataset}.npz')
+
+    def _read(self, dataset):
+        path = self._path(dataset)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+
+    def load(self, dataset, stock_codes=None, start_year=None, end_year=None):
+        numeric_columns = DATASETS[dataset][1]
+        data = self._read(dataset)
+        columns = KEY_COLUMNS + DATE_COLUMNS + numeric_columns
+        if data is None:
+            return _typed(pd.DataFrame(columns=columns), numeric_columns)
+        table = pd.DataFrame({column: data[column] for column in columns})
+        mask = np.ones(len(table), dtype=bool)
+        if stock_codes is not None:
+            mask &= np.isin(table['code'].to_numpy(), list(stock_codes))
+        if start_year is not None:
+            mask &= table['year'].to_numpy() >= start_year
+        if end_year is not None:
+            mask &= table['year'].to_numpy() <= end_year
+        return table[mask].reset_index(drop=True)
+
+    def checked(self, dataset):
+        data = self._read(dataset)
+        if data is None:
+            return set()
+        return set(zip(data['checked_code'].tolist(), data['checked_year'].tolist(), data['checked_quarter'].tolist()))
+
+    def merge(self, dataset, table, checked_keys):
+        # 新数据与已有数据合并，同一键以新数据为准；先写临时文件再替换
+        table = pd.concat([self.load(dataset), table], ignore_index=True)
+        table = table.drop_duplicates(KEY_COLUMNS, keep='last').sort_values(KEY_COLUMNS)
+        checked = sorted(self.checked(dataset) | set(checked_keys))
+        arrays = {column: table[column].to_numpy() for column in table.columns}
+        arrays['code'] = arrays['code'].astype('U12')
+        arrays['checked_code'] = np.array([key[0] for key in checked], dtype='U12')
+        arrays['checked_year'] = np.array([key[1] for key in checked], dtype=np.int16)
+        arrays['checked_quarter'] = np.array([key[2] for key in checked], dtype=np.int8)
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f'{dataset}.tmp.npz')
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, self._path(dataset))
+
+
+def _flush(store, dataset, frames, periods, done):
+    # 整批拼接后一次性补上 year / quarter 列，避免逐个查询结果修改 DataFrame
+    numeric_columns = DATASETS[dataset][1]
+    columns = KEY_COLUMNS + DATE_COLUMNS + numeric_columns
+    table = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    periods = np.array(periods, dtype=np.int16).reshape(-1, 2)
+    table['year'], table['quarter'] = periods[:, 0], periods[:, 1]
+    store.merge(dataset, _typed(table, numeric_columns), done)
+
+
+def load_fundamentals(stock_codes, start_year, end_year, datasets=tuple(DATASETS), store=None, session=None,
+                      rate=5.0, checkpoint=1000):
+    # 批量拉取 stock_codes 在 [start_year, end_year] 各季度的财务数据，已经查询过的季度跳过。
+    # 查询通过会话的工作队列执行并限流，每 checkpoint 个查询落盘一次，中断后可以接着拉取。
+    # 返回拉取失败的 {(dataset, code, year, quarter): 错误信息}
+    store = store or FundamentalStore()
+    session = session or default_session()
+    limiter = RateLimiter(rate)
+    today = pd.Timestamp.today().normalize()
+    failed = {}
+
+    for dataset in datasets:
+        method, numeric_columns = DATASETS[dataset]
+        checked = store.checked(dataset)
+        tasks = [(code, year, quarter) for code in stock_codes for year, quarter in quarters(start_year, end_year)
+                 if (code, year, quarter) not in checked]
+
+        def fetch(task):
+            code, year, quarter = task
+            limiter.wait()
+            try:
+                return session.query(method, code=code, year=year, quarter=quarter), None
+            except Exception as e:
+                return None, str(e)
+
+        frames, periods, done = [], [], []
+        for task, (frame, error) in zip(tasks, session.imap(fetch, tasks)):
+            if error is not None:
+                failed[(dataset,) + task] = error
+                continue
+            code, year, quarter = task
+            if len(frame):
+                frames.append(frame)
+                periods += [(year, quarter)] * len(frame)
+            # 没有数据的季度只有过了披露截止时间才记为已查询，还没披露的下次再查
+            if len(frame) or report_deadline(year, quarter) < today:
+                done.append(task)
+            if len(done) >= checkpoint:
+                _flush(store, dataset, frames, periods, done)
+                frames, periods, done = [], [], []
+        if done:
+            _flush(store, dataset, frames, periods, done)
+    return failed
+
+
+def as_of(table, stock_code, dates):
+    # 把某个代码的财务数据按披露日期对齐到 K 线日期：每个日期只使用当时已经披露的最新一期，不引入未来数据
+    rows = table[table['code'] == stock_code].dropna(subset=['pubDate']).sort_values('pubDate')
+    left = pd.DataFrame({'date': pd.DatetimeIndex(dates).astype('datetime64[ns]')})
+    right = rows.drop(columns=['code']).assign(pubDate=rows['pubDate'].astype('datetime64[ns]'))
+    result = pd.merge_asof(left, right, left_on='date', right_on='pubDate', direction='backward')
+    return result.set_index('date')
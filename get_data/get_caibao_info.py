@@ -1,32 +1,19 @@
 # 获取股票代码名称信息
-import baostock as bs
-import pandas as pd
-from tqdm import tqdm
-lg = bs.login()
-rs = bs.query_all_stock(day="2024-03-25")
-data_list = []
-while (rs.error_code == '0') & rs.next():
-    data_list.append(rs.get_row_data())
-result = pd.DataFrame(data_list, columns=rs.fields)
-result
-code_ = list(result["code"])
-lg = bs.login()
-data_list = []
-for i in tqdm(code_):
-    rs = bs.query_stock_basic(code=i)
-    while (rs.error_code == '0') & rs.next():
-        data_list.append(rs.get_row_data())
+from get_data.fundamentals import FundamentalStore, load_fundamentals
+from get_data.security_master import SecurityMaster
+from get_data.session import default_session
 
-result2 = pd.DataFrame(data_list, columns=rs.fields)
-print(result2.head())
+if __name__ == '__main__':
+    session = default_session()
+    # 证券主表：第一次一次性拉取全部证券资料，之后只更新新增、改名和退市的代码
+    master = SecurityMaster()
+    print(master.refresh(session, day="2024-03-25"))
+    result2 = master.to_frame()
+    print(result2.head())
+    code_ = master.universe(listed_before="2024-03-25")
 
-# 盈利能力
-lg = bs.login()
-
-profit_list = []
-rs_profit = bs.query_profit_data(code="sh.600938", year=2023,
-                                 quarter=4  # 此处还是季度：可选1 2 3 4
-                                 )
-while (rs_profit.error_code == '0') & rs_profit.next():
-    profit_list.append(rs_profit.get_row_data())
-result_profit = pd.DataFrame(profit_list, columns=rs_profit.fields)
+    # 盈利能力、成长能力、营运能力：批量拉取进本地列式存储，已拉取过的季度跳过
+    store = FundamentalStore()
+    failed = load_fundamentals(code_, 2023, 2023, store=store, session=session)
+    result_profit = store.load('profit', ["sh.600938"], 2023, 2023)
+    print(result_profit[result_profit['quarter'] == 4])
@@ -0,0 +1,131 @@
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from get_data.forward_returns import forward_returns, log_prices
+from get_data.result_cache import data_fingerprint
+
+DEFAULT_MACD = (12, 26, 9)
+DEFAULT_STOCH = (9, 3, 3)
+DEFAULT_MA_WINDOWS = (5, 10)
+
+_feature_cache = OrderedDict()
+FEATURE_CACHE_SIZE = 64
+_derived_series = {}
+
+
+class FeatureParts:
+    # 一个序列的指标分量，各自按自己的参数缓存：EMA 按周期，talib MACD / STOCH 按各自的三个参数，均线按窗口。
+    # 参数搜索里不同 (MACD, KDJ) 参数的指标表都从同一份分量组装，只改了 KDJ 参数时不会重算 MACD，反之亦然；
+    # log_close 和均线、未来收益这些派生序列（见 _derived）也在这些指标表之间共用
+    def __init__(self, stock_data):
+        self.index = stock_data.index
+        self.close = pd.to_numeric(stock_data['close'], errors='coerce')
+        self.high = pd.to_numeric(stock_data['high'], errors='coerce')
+        self.low = pd.to_numeric(stock_data['low'], errors='coerce')
+        self.log_close = log_prices(self.close.to_numpy())
+        self.derived = {}
+        self._cache = {}
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def macd(self, fast, slow, signal):
+        # talib 用到时才导入
+        import talib
+        return self._memo(('macd', fast, slow, signal), lambda: talib.MACD(
+            self.close, fastperiod=fast, slowperiod=slow, signalperiod=signal))
+
+    def stoch(self, fastk, slowk, slowd):
+        import talib
+        return self._memo(('stoch', fastk, slowk, slowd), lambda: talib.STOCH(
+            self.high, self.low, self.close, fastk_period=fastk, slowk_period=slowk, slowd_period=slowd))
+
+    def ema(self, span):
+        return self._memo(('ema', span), lambda: self.close.ewm(span=span, adjust=False).mean())
+
+    def moving_average(self, window):
+        return self._memo(('ma', window), lambda: self.close.rolling(window=window).mean())
+
+
+def build_features(stock_data, macd=DEFAULT_MACD, stoch=DEFAULT_STOCH, ma_windows=DEFAULT_MA_WINDOWS, parts=None):
+    # 各个分析方法共用的指标，每个序列只算一次。给出 parts 时从其中缓存的分量组装，
+    # 同一序列不同参数的指标表共用分量和派生序列
+    if parts is None:
+        parts = FeatureParts(stock_data)
+    columns = {'close': parts.close, 'high': parts.high, 'low': parts.low, 'log_close': parts.log_close}
+
+    # talib 版本的 MACD / KDJ（金叉判断用）
+    fast, slow, signal = macd
+    columns['macd'], columns['macdsignal'], columns['macdhist'] = parts.macd(fast, slow, signal)
+    columns['k'], columns['d'] = parts.stoch(*stoch)
+    columns['j'] = 3 * columns['k'] - 2 * columns['d']
+
+    # pandas ewm 版本的 MACD（背离判断用）
+    columns[f'ema{fast}'] = parts.ema(fast)
+    columns[f'ema{slow}'] = parts.ema(slow)
+    columns['macd_ewm'] = columns[f'ema{fast}'] - columns[f'ema{slow}']
+
+    for window in ma_windows:
+        columns[f'ma{window}'] = parts.moving_average(window)
+    # 一次构造整张表，比逐列插入快得多（参数搜索里每组参数都要组装一次）
+    features = pd.DataFrame({name: np.asarray(values) for name, values in columns.items()}, index=parts.index)
+    _share_derived(features, parts.derived)
+    return features
+
+
+def get_features(stock_data, key=None, macd=DEFAULT_MACD, stoch=DEFAULT_STOCH, ma_windows=DEFAULT_MA_WINDOWS,
+                 fingerprint=None):
+    # 以 (key, 参数, K 线内容摘要) 为键缓存指标，key 一般为 (stock_code, interval)。
+    # 摘要覆盖全部日期和 OHLC：除权除息后重新下载的前复权历史首尾不变、中间整体缩放，也会重新计算。
+    # 调用方已经算过 data_fingerprint 时直接传进来
+    if key is None or len(stock_data) == 0:
+        return build_features(stock_data, macd, stoch, ma_windows)
+    if fingerprint is None:
+        fingerprint = data_fingerprint(stock_data)
+    cache_key = (key, tuple(macd), tuple(stoch), tuple(ma_windows), fingerprint)
+    features = _feature_cache.get(cache_key)
+    if features is None:
+        features = build_features(stock_data, macd, stoch, ma_windows)
+        _feature_cache[cache_key] = features
+        while len(_feature_cache) > FEATURE_CACHE_SIZE:
+            _feature_cache.popitem(last=False)
+    else:
+        _feature_cache.move_to_end(cache_key)
+    return features
+
+
+def _share_derived(features, derived):
+    # 指标表被回收时对应的字典一起释放；同一份 FeatureParts 组装的指标表共用一个字典
+    _derived_series[id(features)] = derived
+    weakref.finalize(features, _derived_series.pop, id(features), None)
+    return derived
+
+
+def _derived(features, kind, window, compute):
+    # 均线、未来收益等派生序列按 (类型, 窗口) 放在每个指标表各自的字典里，不写回指标表：
+    # get_features 缓存的指标表被很多次调用共用，写回会让它随窗口参数的增多不断变宽。
+    # 这些序列只依赖收盘价，同一个序列不同参数的指标表可以共用
+    derived = _derived_series.get(id(features))
+    if derived is None:
+        derived = _share_derived(features, {})
+    if (kind, window) not in derived:
+        derived[(kind, window)] = compute()
+    return derived[(kind, window)]
+
+
+def moving_average(features, window):
+    column = f'ma{window}'
+    if column in features:
+        return features[column]
+    return _derived(features, 'ma', window, lambda: features['close'].rolling(window=window).mean())
+
+
+def future_returns(features, window):
+    # 信号后 window 根 K 线的复利收益（%），不同分析方法的相同窗口共用一份
+    return _derived(features, 'forward', window, lambda: pd.Series(
+        forward_returns(None, window, log_close=features['log_close'].to_numpy()), index=features.index))
@@ -17,4 +17,15 @@ interval_to_str = {
     "daily": "日",
     "weekly": "周",
     "monthly": "月"
-}
\ No newline at end of file
+}
+
+interval_to_frequency = {
+    "daily": "d",
+    "weekly": "w",
+    "monthly": "m"
+}
+
+# baostock 复权方式：信号用前复权价格，回测成交用不复权价格
+ADJUST_BACKWARD = '1'
+ADJUST_FORWARD = '2'
+ADJUST_NONE = '3'
@@ -0,0 +1,190 @@
+import warnings
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from get_data.bar_store import BAR_FIELDS
+from get_data.forward_returns import event_mask, forward_returns, log_prices
+from get_data.indicators import DEFAULT_MACD, DEFAULT_STOCH
+
+SIGNALS = ['golden_cross', 'trend_break', 'trend_start', 'divergence_top', 'divergence_bottom']
+
+
+class PricePanel(NamedTuple):
+    dates: np.ndarray  # 所有代码 K 线日期的并集
+    codes: list
+    present: np.ndarray  # (dates, codes)，该代码在该日期是否有 K 线
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    errors: dict  # 读取失败的代码和错误信息，这些代码的列全部为空
+
+
+def load_panel(store, stock_codes, interval='daily', start_date=None, end_date=None):
+    # 某个代码读取失败（比如还没有拉取）时只影响这一列，错误记在 errors 中，整块其它代码照常计算
+    loaded, errors = [], {}
+    for code in stock_codes:
+        try:
+            loaded.append(store.load_arrays(code, interval, start_date, end_date))
+        except Exception as e:
+            errors[code] = str(e)
+            loaded.append((np.array([], dtype='datetime64[D]'), np.empty((0, len(BAR_FIELDS)))))
+    dates = np.unique(np.concatenate([code_dates for code_dates, _ in loaded])) if loaded \
+        else np.array([], dtype='datetime64[D]')
+    shape = (len(dates), len(stock_codes))
+    present = np.zeros(shape, dtype=bool)
+    matrices = {field: np.full(shape, np.nan) for field in BAR_FIELDS}
+    for column, (code_dates, bars) in enumerate(loaded):
+        rows = np.searchsorted(dates, code_dates)
+        present[rows, column] = True
+        for field in matrices:
+            matrices[field][rows, column] = bars[:, BAR_FIELDS.index(field)]
+    return PricePanel(dates, list(stock_codes), present, errors=errors, **matrices)
+
+
+def bar_aligned(panel):
+    # 按各代码自己的 K 线序号右对齐（最后一行都是各自最新的 K 线），停牌造成的空位被压缩掉，
+    # 这样滚动窗口、shift 都和逐个代码计算时完全一致，缺失只出现在各列开头
+    order = np.argsort(panel.present, axis=0, kind='stable')
+    filled = np.take_along_axis(panel.present, order, axis=0)
+    aligned = []
+    for matrix in (panel.high, panel.low, panel.close):
+        values = np.take_along_axis(matrix, order, axis=0)
+        values[~filled] = np.nan
+        aligned.append(values)
+    return filled, aligned
+
+
+def _talib_columns(func, inputs, n_outputs, **params):
+    # talib 只接受一维数组，逐列调用（C 实现，开销很小），会自动跳过列首的缺失值
+    outputs = [np.full(inputs[0].shape, np.nan) for _ in range(n_outputs)]
+    for column in range(inputs[0].shape[1]):
+        series = [np.ascontiguousarray(values[:, column]) for values in inputs]
+        if np.isnan(series[-1]).all():
+            continue
+        result = func(*series, **params)
+        for output, values in zip(outputs, result):
+            output[:, column] = values
+    return outputs
+
+
+def _summarize(values, mask, signal):
+    # 对应 signal_stats.summarize，对每一列同时计算
+    count = mask.sum(axis=0)
+    valid = mask & ~np.isnan(values)
+    valid_count = valid.sum(axis=0)
+    masked = np.where(valid, values, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        probability = np.where(count != 0, (valid & (values > 0)).sum(axis=0) / count * 100, 0.0)
+        mean = np.where(valid_count != 0, np.where(valid, values, 0).sum(axis=0) / valid_count, np.nan)
+        median = np.nanmedian(masked, axis=0)
+        max_gain = np.nanmax(masked, axis=0)
+        max_loss = np.nanmin(masked, axis=0)
+    return {'signal': signal, 'probability': probability, 'mean': mean, 'median': median,
+            'max_gain': max_gain, 'max_loss': max_loss, 'count': count}
+
+
+def _shifted(values, periods=1):
+    result = np.full(values.shape, np.nan)
+    if periods > 0:
+        result[periods:] = values[:-periods]
+    else:
+        result[:periods] = values[-periods:]
+    return result
+
+
+def signal_matrices(high, low, close, x=5, macd=DEFAULT_MACD, stoch=DEFAULT_STOCH):
+    # 在按 K 线序号对齐的矩阵上计算各个信号的布尔矩阵
+    import talib
+
+    close_frame = pd.DataFrame(close)
+    signals = {}
+
+    macd_line, macd_signal, _ = _talib_columns(talib.MACD, [close], 3, fastperiod=macd[0], slowperiod=macd[1],
+                                               signalperiod=macd[2])
+    k, d = _talib_columns(talib.STOCH, [high, low, close], 2, fastk_period=stoch[0], slowk_period=stoch[1],
+                          slowd_period=stoch[2])
+    signals['golden_cross'] = ((macd_line > macd_signal) & (_shifted(macd_line) < _shifted(macd_signal))) | \
+                              ((k > d) & (_shifted(k) < _shifted(d)))
+
+    for window in (5, 10):
+        signals[f'below_ma{window}'] = close < close_frame.rolling(window=window).mean().to_numpy()
+        # 连续 5 根 K 线收在均线下方才算跌破上升趋势
+        signals[f'trend_break_ma{window}'] = \
+            pd.DataFrame(signals[f'below_ma{window}']).rolling(window=5).sum().to_numpy() == 5
+    signals['trend_break'] = signals['trend_break_ma5'] | signals['trend_break_ma10']
+    signals['trend_start'] = close > close_frame.rolling(window=x).mean().to_numpy()
+
+    ema_fast = close_frame.ewm(span=macd[0], adjust=False).mean().to_numpy()
+    ema_slow = close_frame.ewm(span=macd[1], adjust=False).mean().to_numpy()
+    macd_ewm = ema_fast - ema_slow
+    signals['divergence_top'] = (_shifted(macd_ewm) > macd_ewm) & (_shifted(macd_ewm) > _shifted(macd_ewm, 2))
+    signals['divergence_bottom'] = (_shifted(macd_ewm) < macd_ewm) & (_shifted(macd_ewm) < _shifted(macd_ewm, 2))
+    return signals
+
+
+def to_calendar(panel, aligned_values, fill=False):
+    # bar_aligned 的逆变换：把按 K 线序号对齐的矩阵放回日历日期的位置
+    order = np.argsort(panel.present, axis=0, kind='stable')
+    filled = np.take_along_axis(panel.present, order, axis=0)
+    result = np.full(aligned_values.shape, fill, dtype=aligned_values.dtype)
+    rows, columns = np.nonzero(filled)
+    result[order[rows, columns], columns] = aligned_values[rows, columns]
+    return result
+
+
+def analyze_panel(panel, m=5, x=5, days=10, macd=DEFAULT_MACD, stoch=DEFAULT_STOCH):
+    # 与 StockStrategySimulator.analyze_stock_frame 的结果逐代码一致，但一次处理整个面板
+    filled, (high, low, close) = bar_aligned(panel)
+    log_close = log_prices(close)
+    signals = signal_matrices(high, low, close, x, macd, stoch)
+
+    def events_stats(mask, horizon, signal):
+        returns = forward_returns(None, horizon, log_close=log_close)
+        return _summarize(returns, event_mask(mask, returns, horizon), signal)
+
+    def last_row(values):
+        return values[-1] if len(values) else np.zeros(values.shape[1], dtype=bool)
+
+    stats = {}
+
+    # Golden cross, compounded returns over the next m bars
+    golden_cross = signals['golden_cross']
+    stats['golden_cross'] = events_stats(golden_cross, m, last_row(golden_cross))
+
+    # Trend break below MA5 / MA10, compounded returns for the next `days` bars
+    trend_break = {}
+    for window in (5, 10):
+        trend_break[window] = events_stats(signals[f'below_ma{window}'], days,
+                                           last_row(signals[f'trend_break_ma{window}']))
+    stats['trend_break'] = {
+        'signal': trend_break[5]['signal'] | trend_break[10]['signal'],
+        'probability': (trend_break[10]['probability'] + trend_break[5]['probability']) / 2,
+        'mean': (trend_break[10]['mean'] + trend_break[5]['mean']) / 2,
+    }
+
+    # Trend start above MA x, compounded returns over the next m bars
+    above = signals['trend_start']
+    stats['trend_start'] = events_stats(above, m, last_row(above))
+
+    # MACD divergences, compounded returns for the next m bars
+    top, bottom = signals['divergence_top'], signals['divergence_bottom']
+    stats['divergence_top'] = events_stats(top, m, top.any(axis=0))
+    stats['divergence_bottom'] = events_stats(bottom, m, bottom.any(axis=0))
+
+    result = pd.DataFrame(index=pd.Index(panel.codes, name='code'))
+    expectation = np.zeros(len(panel.codes))
+    for name in SIGNALS:
+        signal_stats = stats[name]
+        result[f'{name}_signal'] = signal_stats['signal']
+        result[f'{name}_probability'] = signal_stats['probability']
+        result[f'{name}_mean'] = signal_stats['mean']
+        expectation = expectation + np.where(signal_stats['signal'],
+                                             signal_stats['probability'] * signal_stats['mean'], 0)
+    result['expectation'] = expectation / 100
+    result['should_buy'] = np.where(result['expectation'] < 0, '否', '是')
+    result['bars'] = filled.sum(axis=0)
+    return result
@@ -1,372 +1,442 @@
-import os
-import time
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
-import baostock as bs
-import talib
 
-from get_data.clean_data import remove_subset_files
-from initial import stock_code_to_company, interval_to_str
+from get_data.bar_store import BAR_FIELDS, ONE_DAY, to_day
+from get_data.config import data_path, set_data_dir
+from get_data.forward_returns import event_mask
+from get_data.indicators import build_features, future_returns, get_features, moving_average
+from get_data.profiling import stage
+from get_data import profiling
+from get_data.rate_limit import RateLimiter
+from get_data.report import render_decision, render_divergence_bottom, render_divergence_top, render_macd_kdj, \
+    render_trend_break, render_trend_start
+from get_data.resample import DerivedBarStore
+from get_data.result_cache import ResultCache, data_fingerprint
+from get_data.security_master import SecurityMaster
+from get_data.session import default_session
+from get_data.signal_stats import FollowDecision, TrendBreakStats, summarize
+from get_data.initial import ADJUST_FORWARD, stock_code_to_company, interval_to_frequency
 
 
 class StockStrategySimulator:
+    # 只拉取和存储日线，周线、月线在本地由日线聚合
+    # 只是记下路径，不访问磁盘或网络；数据目录见 get_data.config，运行时可以用 configure 切换
+    bar_store = DerivedBarStore(data_path('bars'))
+    session = default_session()
+    security_master = SecurityMaster(data_path('security_master.npz'))
+    # 分析结果缓存，设为 None 可以关闭
+    result_cache = ResultCache(data_path('results.sqlite'))
+
     @staticmethod
-    def get_stock_data(stock_code, interval='daily', start_date='2000-01-01', end_date='2024-03-24'):
-        # Check if stock data is available locally
-        csv_path = f"../data/stock/{stock_code}_{interval}_{start_date}_{end_date}.csv"
-        if os.path.exists(csv_path):
-            # Load data from CSV if it exists and the time range is correct
-            existing_data = pd.read_csv(csv_path, index_col='date', parse_dates=True)
-            existing_start_date = existing_data.index[0].date().isoformat()
-            existing_end_date = existing_data.index[-1].date().isoformat()
-            print(f"{existing_start_date}, {existing_end_date}")
-            if existing_start_date <= start_date and existing_end_date >= end_date:
-                result = existing_data.loc[start_date:end_date]
-                print("Using local CSV file.")
-                return result
-
-        # Login to the system
-        lg = bs.login()
-
-        # Get historical K-line data
-        if interval == 'daily':
-            frequency = "d"
-        elif interval == 'weekly':
-            frequency = "w"
-        elif interval == 'monthly':
-            frequency = "m"
-        else:
-            print("Invalid interval parameter.")
-            return
+    def configure(data_dir):
+        # 切换数据目录，本地存储、证券主表和分析结果缓存都换到新目录下
+        set_data_dir(data_dir)
+        StockStrategySimulator.bar_store = DerivedBarStore(data_path('bars'))
+        StockStrategySimulator.security_master = SecurityMaster(data_path('security_master.npz'))
+        if StockStrategySimulator.result_cache is not None:
+            StockStrategySimulator.result_cache = ResultCache(data_path('results.sqlite'))
 
+    @staticmethod
+    def query_k_data(stock_code, frequency, start_date, end_date, adjustflag=ADJUST_FORWARD):
         fields = "date,code,open,high,low,close"
-        rs = bs.query_history_k_data(stock_code, fields,
-                                     start_date, end_date,
-                                     frequency=frequency, adjustflag="2")
+        with stage('fetch.query'):
+            result = StockStrategySimulator.session.query('query_history_k_data', code=stock_code, fields=fields,
+                                                          start_date=start_date, end_date=end_date,
+                                                          frequency=frequency, adjustflag=adjustflag)
+        dates = pd.to_datetime(result['date']).values.astype('datetime64[D]')
+        bars = result[BAR_FIELDS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        return dates, bars
 
-        data_list = []
-        while (rs.error_code == '0') & rs.next():
-            data_list.append(rs.get_row_data())
-        result = pd.DataFrame(data_list, columns=rs.fields)
-        result.index = pd.to_datetime(result.date)
+    @staticmethod
+    def last_complete_day(end_date):
+        # 当天的 K 线收盘后才会入库，覆盖区间最多记到昨天，避免漏掉今天的数据
+        return min(to_day(end_date), to_day(pd.Timestamp.today()) - ONE_DAY).item().isoformat()
 
-        # Logout from the system
-        bs.logout()
+    @staticmethod
+    def append_tail(stock_code, interval='daily', end_date=None, start_date='2000-01-01'):
+        # 增量拉取：从最后一根已存 K 线开始请求（多请求一根用来校验重叠），只追加更新的 K 线。
+        # 前复权价格在除权除息后会整体变化，重叠 K 线对不上时重新下载整个覆盖区间。
+        store = StockStrategySimulator.bar_store
+        # 周线、月线由日线聚合时只拉取日线
+        interval = store.source_interval(interval)
+        frequency = interval_to_frequency[interval]
+        end_date = StockStrategySimulator.last_complete_day(end_date or pd.Timestamp.today())
+        covered = store.coverage(stock_code, interval)
+        last = store.last_bar(stock_code, interval)
+        if covered is None or last is None:
+            start = start_date if covered is None else str(covered[0])
+            dates, bars = StockStrategySimulator.query_k_data(stock_code, frequency, start, end_date)
+            store.write(stock_code, interval, dates, bars, start, end_date)
+            return len(dates)
+        if to_day(end_date) <= covered[1]:
+            return 0
+
+        last_date, last_values = last
+        dates, bars = StockStrategySimulator.query_k_data(stock_code, frequency, str(last_date), end_date)
+        overlap = np.flatnonzero(dates == last_date)
+        if len(overlap) == 0 or not np.allclose(bars[overlap[0]], last_values, equal_nan=True):
+            print(f"{stock_code} {interval} 复权价格已变化，重新下载全部数据")
+            dates, bars = StockStrategySimulator.query_k_data(stock_code, frequency, str(covered[0]), end_date)
+            store.write(stock_code, interval, dates, bars, covered[0], end_date)
+            return len(dates)
+        return store.append(stock_code, interval, dates, bars, end_date)
 
-        # Save data to CSV for future use
-        result.to_csv(csv_path)
+    @staticmethod
+    def refresh_stock_data(stock_codes, interval='daily', end_date=None):
+        # 每晚的增量刷新任务：共用一个会话，逐个代码只拉取新 K 线
+        def refresh(stock_code):
+            try:
+                return StockStrategySimulator.append_tail(stock_code, interval, end_date)
+            except Exception as e:
+                print(f"{stock_code}:{e}")
+
+        new_bars = StockStrategySimulator.session.map(refresh, stock_codes)
+        return {code: count for code, count in zip(stock_codes, new_bars) if count is not None}
 
-        return result
+    @staticmethod
+    def sync_stock_data(stock_code, interval='daily', start_date='2000-01-01', end_date='2024-03-24'):
+        # 把 [start_date, end_date] 中本地还没有的部分拉取进本地存储，返回是否访问了数据源。
+        end_date = StockStrategySimulator.last_complete_day(end_date)
+        store = StockStrategySimulator.bar_store
+        interval = store.source_interval(interval)
+        covered = store.coverage(stock_code, interval)
+        missing = store.missing_ranges(stock_code, interval, start_date, end_date)
+        # Newest first so that a re-adjusted history is detected before older bars are prepended
+        for fetch_start, fetch_end in reversed(missing):
+            if covered is not None and fetch_start > covered[1]:
+                StockStrategySimulator.append_tail(stock_code, interval, str(fetch_end))
+            elif covered is not None and fetch_end < covered[0]:
+                StockStrategySimulator.prepend_head(stock_code, interval, fetch_start)
+            else:
+                dates, bars = StockStrategySimulator.query_k_data(
+                    stock_code, interval_to_frequency[interval], str(fetch_start), str(fetch_end))
+                store.merge(stock_code, interval, dates, bars, fetch_start, fetch_end)
+        return len(missing) > 0
 
     @staticmethod
-    def analyze_stock_data_macd_kdj(stock_data, stock_name, m=5, interval=''):
-        # Convert object columns to numeric
-        stock_data = stock_data.apply(pd.to_numeric, errors='ignore')
+    def prepend_head(stock_code, interval, start_date):
+        # 向前补齐 start_date 之前缺的历史：多请求到第一根已存 K 线用来校验重叠（同 append_tail），
+        # 重叠 K 线对不上说明已存的前复权价格过期了，重新下载 [start_date, 覆盖区间结束] 整段
+        store = StockStrategySimulator.bar_store
+        frequency = interval_to_frequency[interval]
+        covered = store.coverage(stock_code, interval)
+        first = store.first_bar(stock_code, interval)
+        if first is None:
+            end = covered[0] - ONE_DAY
+            dates, bars = StockStrategySimulator.query_k_data(stock_code, frequency, str(start_date), str(end))
+            store.merge(stock_code, interval, dates, bars, start_date, end)
+            return len(dates)
+
+        first_date, first_values = first
+        dates, bars = StockStrategySimulator.query_k_data(stock_code, frequency, str(start_date), str(first_date))
+        overlap = np.flatnonzero(dates == first_date)
+        if len(overlap) == 0 or not np.allclose(bars[overlap[0]], first_values, equal_nan=True):
+            print(f"{stock_code} {interval} 复权价格已变化，重新下载全部数据")
+            dates, bars = StockStrategySimulator.query_k_data(stock_code, frequency, str(start_date), str(covered[1]))
+            store.write(stock_code, interval, dates, bars, start_date, covered[1])
+            return len(dates)
+        older = dates < first_date
+        store.merge(stock_code, interval, dates[older], bars[older], start_date, covered[0] - ONE_DAY)
+        return int(older.sum())
+
+    @staticmethod
+    def get_stock_data(stock_code, interval='daily', start_date='2000-01-01', end_date='2024-03-24'):
+        if interval not in interval_to_frequency:
+            print("Invalid interval parameter.")
+            return
 
-        # Calculate MACD indicator
-        stock_data['macd'], stock_data['macdsignal'], stock_data['macdhist'] = \
-            talib.MACD(stock_data['close'], fastperiod=12, slowperiod=26, signalperiod=9)
+        end_date = StockStrategySimulator.last_complete_day(end_date)
+        store = StockStrategySimulator.bar_store
+        if store.missing_ranges(stock_code, interval, start_date, end_date):
+            # Only fetch the ranges that are not stored locally yet
+            with stage('fetch'):
+                StockStrategySimulator.sync_stock_data(stock_code, interval, start_date, end_date)
+        else:
+            print("Using local bar store.")
 
-        # Calculate KDJ indicator
-        stock_data['k'], stock_data['d'] = \
-            talib.STOCH(stock_data['high'], stock_data['low'], stock_data['close'],
-                        fastk_period=9, slowk_period=3, slowd_period=3)
+        with stage('load'):
+            return store.load(stock_code, interval, start_date, end_date)
 
-        stock_data['j'] = 3 * stock_data['k'] - 2 * stock_data['d']
+    @staticmethod
+    def analyze_stock_data_macd_kdj(stock_data, stock_name, m=5, interval='', features=None, report=False):
+        if features is None:
+            features = build_features(stock_data)
 
         # Determine golden cross
-        stock_data['macd_golden_cross'] = (stock_data['macd'] > stock_data['macdsignal']) & \
-                                          (stock_data['macd'].shift(1) < stock_data['macdsignal'].shift(1))
-        stock_data['kdj_golden_cross'] = (stock_data['k'] > stock_data['d']) & \
-                                         (stock_data['k'].shift(1) < stock_data['d'].shift(1))
+        macd_golden_cross = (features['macd'] > features['macdsignal']) & \
+                            (features['macd'].shift(1) < features['macdsignal'].shift(1))
+        kdj_golden_cross = (features['k'] > features['d']) & \
+                           (features['k'].shift(1) < features['d'].shift(1))
+        golden_cross = (macd_golden_cross | kdj_golden_cross).to_numpy()
+
+        # Compounded returns over the m bars after each golden cross
+        returns_m_days = future_returns(features, m).to_numpy()
+        events = event_mask(golden_cross, returns_m_days, m)
+        stats = summarize(returns_m_days[events], golden_cross[-1])
+        if report:
+            render_macd_kdj(stats, stock_name)
+        return stats
 
-        # Calculate returns
-        stock_data['returns'] = stock_data['close'].pct_change() * 100
+    @staticmethod
+    def analyze_trend_break(stock_data, stock_name, days=10, interval='daily', features=None, report=False):
+        if features is None:
+            features = build_features(stock_data)
+        close = features['close']
 
-        # Calculate cumulative returns for the next 5 and 10 days after golden cross
-        stock_data[f'returns_cumulative_{m}_days'] = stock_data['returns'].rolling(m).sum()
+        # Determine if the stock has broken the upward trend for x-day average
+        trend_break_5 = close < moving_average(features, 5)
+        trend_break_10 = close < moving_average(features, 10)
 
-        # Output
-        is_golden_cross = stock_data['macd_golden_cross'].iloc[-1] or stock_data['kdj_golden_cross'].iloc[-1]
-        golden_cross_returns_m_days = stock_data[stock_data['macd_golden_cross'] | stock_data['kdj_golden_cross']][
-            f'returns_cumulative_{m}_days']
+        # A break counts as current when the close stayed below the average for the last 5 bars
+        is_5_trend_break = trend_break_5.iloc[-5:].sum() == 5
+        is_10_trend_break = trend_break_10.iloc[-5:].sum() == 5
 
-        positive_returns_5_days = golden_cross_returns_m_days[
-            ~golden_cross_returns_m_days.isna() & (golden_cross_returns_m_days > 0)]
+        # Compounded returns for the next X days after trend break
+        returns_next_X_days = future_returns(features, days).to_numpy()
+        events_5 = event_mask(trend_break_5.to_numpy(), returns_next_X_days, days)
+        events_10 = event_mask(trend_break_10.to_numpy(), returns_next_X_days, days)
 
-        total_trades = len(golden_cross_returns_m_days)
-        if total_trades > 0:
-            positive_probability_5_days = len(positive_returns_5_days) / total_trades * 100
-        else:
-            positive_probability_5_days = 0
-        max_gain_m_days = golden_cross_returns_m_days.max()
-        max_loss_m_days = golden_cross_returns_m_days.min()
-        median_return_m_days = golden_cross_returns_m_days.median()
-
-        print()
-        print(f"{stock_name}当前是否金叉：{is_golden_cross}")
-        print("金叉后的收益情况：")
-        # print(golden_cross_returns)
-        print("收益概率：{:.2f}%".format(positive_probability_5_days))
-        print("数学期望（平均收益）：{:.2f}%".format(golden_cross_returns_m_days.mean()))
-        print("最大收益：{:.2f}%".format(max_gain_m_days))
-        print("最大亏损：{:.2f}%".format(max_loss_m_days))
-        print("中位数收益：{:.2f}%".format(median_return_m_days))
-        return is_golden_cross, positive_probability_5_days, golden_cross_returns_m_days.mean()
+        stats = TrendBreakStats(summarize(returns_next_X_days[events_5], is_5_trend_break),
+                                summarize(returns_next_X_days[events_10], is_10_trend_break))
+        if report:
+            render_trend_break(stats, stock_name, days, interval)
+        return stats
 
     @staticmethod
-    def analyze_trend_break(stock_data, stock_name, days=10, interval='daily'):
-        # Convert 'close' column to numeric
-        stock_data['close'] = pd.to_numeric(stock_data['close'], errors='coerce')
+    def analyze_trend_start(stock_data, x=5, m=10, stock_name='', interval='daily', features=None, report=False):
+        if features is None:
+            features = build_features(stock_data)
 
-        # Calculate x-day moving average
-        stock_data['x_5_day_avg'] = stock_data['close'].rolling(window=5).mean()
-        stock_data['x_10_day_avg'] = stock_data['close'].rolling(window=10).mean()
+        # Determine if the stock is above the x-day average
+        trend_start = (features['close'] > moving_average(features, x)).to_numpy()
 
-        # Determine if the stock has broken the upward trend for x-day average
-        stock_data['5_trend_break'] = stock_data['close'] < stock_data['x_5_day_avg']
-        stock_data['10_trend_break'] = stock_data['close'] < stock_data['x_10_day_avg']
-
-        # Calculate consecutive days above x-day average
-        stock_data['consecutive_days_5_day'] = stock_data['5_trend_break'].rolling(window=5).sum()
-        stock_data['consecutive_days_10_day'] = stock_data['10_trend_break'].rolling(window=5).sum()
-
-        # Calculate returns after trend break
-        stock_data['returns_after_break'] = stock_data['close'].pct_change() * 100
-
-        # Calculate returns for the next X days after trend break for 10-day average
-        stock_data['returns_next_X_days_10_day'] = stock_data['returns_after_break'].rolling(window=days).sum().shift(
-            -days)
-
-        # Calculate returns for the next X days after trend break for 5-day average
-        stock_data['returns_next_X_days_5_day'] = stock_data['returns_after_break'].rolling(window=days).sum().shift(
-            -days)
-
-        # Output
-        is_5_trend_break = stock_data['consecutive_days_5_day'].iloc[-1] == 5
-        is_10_trend_break = stock_data['consecutive_days_10_day'].iloc[-1] == 5
-
-        trend_break_X_day_returns_10_day = stock_data[stock_data['10_trend_break']]['returns_next_X_days_10_day']
-        trend_break_X_day_returns_5_day = stock_data[stock_data['5_trend_break']]['returns_next_X_days_5_day']
-
-        positive_probability_5_day = len(trend_break_X_day_returns_5_day[trend_break_X_day_returns_5_day > 0]) / len(
-            trend_break_X_day_returns_5_day) * 100 if len(trend_break_X_day_returns_5_day) != 0 else 0
-        positive_probability_10_day = len(trend_break_X_day_returns_10_day[trend_break_X_day_returns_10_day > 0]) / len(
-            trend_break_X_day_returns_10_day) * 100 if len(trend_break_X_day_returns_10_day) != 0 else 0
-
-        average_return_5_day = trend_break_X_day_returns_5_day.mean()
-        average_return_10_day = trend_break_X_day_returns_10_day.mean()
-
-        max_gain_X_day_5_day = trend_break_X_day_returns_5_day.max()
-        max_gain_X_day_10_day = trend_break_X_day_returns_10_day.max()
-        max_loss_X_day_5_day = trend_break_X_day_returns_5_day.min()
-        max_loss_X_day_10_day = trend_break_X_day_returns_10_day.min()
-        median_return_X_day_5_day = trend_break_X_day_returns_5_day.median()
-        median_return_X_day_10_day = trend_break_X_day_returns_10_day.median()
-
-        print()
-        print(f"{stock_name}当前是否跌破上升趋势：")
-        print(f"MA5：{is_5_trend_break}, MA10：{is_10_trend_break}")
-        print(f"跌破MA5线后的{days}{interval_to_str[interval]}收益情况：")
-        # print(trend_break_X_day_returns_5_day)
-        print("收益概率（跌破MA5线）：{:.2f}%".format(positive_probability_5_day))
-        print("数学期望（平均收益，跌破MA5线）：{:.2f}%".format(average_return_5_day))
-        print("最大收益（跌破MA5线，{}{}后）：{:.2f}%".format(days, interval_to_str[interval], max_gain_X_day_5_day))
-        print("最大亏损（跌破MA5线，{}{}后）：{:.2f}%".format(days, interval_to_str[interval], max_loss_X_day_5_day))
-        print("中位数收益（跌破MA5线，{}{}后）：{:.2f}%".format(days, interval_to_str[interval], median_return_X_day_5_day))
-        print()
-        print(f"{stock_name}跌破MA10线后的{days}{interval_to_str[interval]}收益情况：")
-        # print(trend_break_X_day_returns_10_day)
-        print("收益概率（跌破MA10线）：{:.2f}%".format(positive_probability_10_day))
-        print("数学期望（平均收益，跌破MA10线）：{:.2f}%".format(average_return_10_day))
-        print("最大收益（跌破MA10线，{}{}后）：{:.2f}%".format(days, interval_to_str[interval], max_gain_X_day_10_day))
-        print("最大亏损（跌破MA10线，{}{}后）：{:.2f}%".format(days, interval_to_str[interval], max_loss_X_day_10_day))
-        print("中位数收益（跌破MA10线，{}{}后）：{:.2f}%".format(days, interval_to_str[interval], median_return_X_day_10_day))
-        print()
-        return is_5_trend_break, is_10_trend_break, (positive_probability_10_day + positive_probability_5_day) / 2, (
-                    average_return_10_day + average_return_5_day) / 2
+        # Compounded returns over the m bars after closing above the average
+        returns_m_days = future_returns(features, m).to_numpy()
+        events = event_mask(trend_start, returns_m_days, m)
+        stats = summarize(returns_m_days[events], trend_start[-1])
+        if report:
+            render_trend_start(stats, stock_name, x, m, interval)
+        return stats
 
     @staticmethod
-    def analyze_trend_start(stock_data, x=5, m=10, stock_name='', interval='daily'):
-        # Convert 'close' column to numeric
-        stock_data['close'] = pd.to_numeric(stock_data['close'], errors='coerce')
-
-        # Calculate x-day moving average
-        stock_data['x_day_avg'] = stock_data['close'].rolling(window=x).mean()
+    def macd_divergence(stock_data, m=5, features=None, top=True):
+        if features is None:
+            features = build_features(stock_data)
+        macd = features['macd_ewm']
+
+        # Find MACD top (local maximum) or bottom (local minimum) divergences
+        if top:
+            is_divergence = (macd.shift(1) > macd) & (macd.shift(1) > macd.shift(2))
+        else:
+            is_divergence = (macd.shift(1) < macd) & (macd.shift(1) < macd.shift(2))
+        is_divergence = is_divergence.to_numpy()
 
-        # Determine if the stock has broken the upward trend for x-day average
-        stock_data['trend_start'] = stock_data['close'] > stock_data['x_day_avg']
-
-        # Calculate returns after first breaking the x-day average
-        stock_data['returns_after_start'] = stock_data['close'].pct_change() * 100
-        stock_data['returns_m_days_after_start'] = stock_data['returns_after_start'].rolling(m).sum()
-
-        # Output
-        is_trend_start = stock_data['trend_start'].iloc[-1]
-        returns_m_days_after_break = stock_data[stock_data['trend_start']]['returns_m_days_after_start']
-        positive_returns = returns_m_days_after_break[returns_m_days_after_break > 0]
-        positive_probability = len(positive_returns) / len(returns_m_days_after_break) * 100 if len(
-            returns_m_days_after_break) != 0 else 0
-        average_return = returns_m_days_after_break.mean()
-        max_gain = returns_m_days_after_break.max()
-        max_loss = returns_m_days_after_break.min()
-        median_return = returns_m_days_after_break.median()
-
-        print()
-        print("股票名称：{}".format(stock_name))
-        print("站上 MA{} 后的 {} {}收益情况：".format(x, m, interval_to_str[interval]))
-        # print(returns_m_days_after_break)
-        print("收益概率：{:.2f}%".format(positive_probability))
-        print("数学期望（平均收益）：{:.2f}%".format(average_return))
-        print("最大收益：{:.2f}%".format(max_gain))
-        print("最大亏损：{:.2f}%".format(max_loss))
-        print("中位数收益：{:.2f}%".format(median_return))
-        return is_trend_start, positive_probability, average_return
+        # Compounded returns for the m bars after the divergence
+        returns_m_days = future_returns(features, m).to_numpy()
+        events = event_mask(is_divergence, returns_m_days, m)
+        # 当前背离类型取最近一次同类背离，所以只要出现过背离就算当前信号
+        return summarize(returns_m_days[events], is_divergence.any())
 
     @staticmethod
-    def analyze_macd_divergence_top(stock_data, m=5, stock_name='', interval='daily'):
-        # Calculate MACD
-        stock_data['ema12'] = stock_data['close'].ewm(span=12, adjust=False).mean()
-        stock_data['ema26'] = stock_data['close'].ewm(span=26, adjust=False).mean()
-        stock_data['macd'] = stock_data['ema12'] - stock_data['ema26']
-
-        # Find MACD top divergences
-        stock_data['macd_divergence'] = np.where(
-            (stock_data['macd'].shift(1) > stock_data['macd']) & (
-                    stock_data['macd'].shift(1) > stock_data['macd'].shift(2)),
-            '顶背离',
-            ''
-        )
-
-        # Calculate returns after MACD top divergence
-        stock_data['returns_after_divergence'] = stock_data['close'].pct_change() * 100
-        stock_data['cumulative_returns_after_divergence'] = stock_data['returns_after_divergence'].rolling(m).sum()
-        stock_data['cumulative_returns_m_days_after_divergence'] = stock_data[
-            'cumulative_returns_after_divergence'].shift(-m)
-
-        # Output
-        macd_divergences = stock_data[stock_data['macd_divergence'] != '']
-        macd_divergence_type = macd_divergences['macd_divergence'].iloc[-1]
-        returns_m_days_after_divergence = macd_divergences['cumulative_returns_m_days_after_divergence']
-        positive_returns = returns_m_days_after_divergence[returns_m_days_after_divergence > 0]
-        positive_probability = len(positive_returns) / len(returns_m_days_after_divergence) * 100 if len(
-            returns_m_days_after_divergence) != 0 else 0
-        average_return = returns_m_days_after_divergence.mean()
-        max_gain = returns_m_days_after_divergence.max()
-        max_loss = returns_m_days_after_divergence.min()
-        median_return = returns_m_days_after_divergence.median()
-
-        print()
-        print("股票名称：{}".format(stock_name))
-        print("当前是否顶背离：{}".format(macd_divergence_type == '顶背离'))
-        print("MACD顶背离后的 {} {}收益情况：".format(m, interval_to_str[interval]))
-        # print(returns_m_days_after_divergence)
-        print("当前MACD背离类型：{}".format(macd_divergence_type))
-        print("收益概率：{:.2f}%".format(positive_probability))
-        print("数学期望（平均收益）：{:.2f}%".format(average_return))
-        print("最大收益：{:.2f}%".format(max_gain))
-        print("最大亏损：{:.2f}%".format(max_loss))
-        print("中位数收益：{:.2f}%".format(median_return))
-        return macd_divergence_type == '顶背离', positive_probability, average_return
+    def analyze_macd_divergence_top(stock_data, m=5, stock_name='', interval='daily', features=None, report=False):
+        stats = StockStrategySimulator.macd_divergence(stock_data, m, features, top=True)
+        if report:
+            render_divergence_top(stats, stock_name, m, interval)
+        return stats
 
     @staticmethod
-    def analyze_macd_divergence_bottom(stock_data, m=5, stock_name='', interval='daily'):
-        # Calculate MACD
-        stock_data['ema12'] = stock_data['close'].ewm(span=12, adjust=False).mean()
-        stock_data['ema26'] = stock_data['close'].ewm(span=26, adjust=False).mean()
-        stock_data['macd'] = stock_data['ema12'] - stock_data['ema26']
-
-        # Find MACD bottom divergences
-        stock_data['macd_divergence'] = np.where(
-            (stock_data['macd'].shift(1) < stock_data['macd']) & (
-                    stock_data['macd'].shift(1) < stock_data['macd'].shift(2)),
-            '底背离',
-            ''
-        )
-
-        # Calculate returns after MACD bottom divergence
-        stock_data['returns_after_divergence'] = stock_data['close'].pct_change() * 100
-        stock_data['cumulative_returns_after_divergence'] = stock_data['returns_after_divergence'].rolling(m).sum()
-        stock_data['cumulative_returns_m_days_after_divergence'] = stock_data[
-            'cumulative_returns_after_divergence'].shift(-m)
-
-        # Output
-        macd_divergences = stock_data[stock_data['macd_divergence'] != '']
-        macd_divergence_type = macd_divergences['macd_divergence'].iloc[-1]
-        cumulative_returns_m_days_after_divergence = macd_divergences['cumulative_returns_m_days_after_divergence']
-        positive_returns = cumulative_returns_m_days_after_divergence[cumulative_returns_m_days_after_divergence > 0]
-        positive_probability = len(positive_returns) / len(cumulative_returns_m_days_after_divergence) * 100 if len(
-            cumulative_returns_m_days_after_divergence) != 0 else 0
-        average_return = cumulative_returns_m_days_after_divergence.mean()
-        max_gain = cumulative_returns_m_days_after_divergence.max()
-        max_loss = cumulative_returns_m_days_after_divergence.min()
-        median_return = cumulative_returns_m_days_after_divergence.median()
-
-        print()
-        print("股票名称：{}".format(stock_name))
-        print("MACD底背离后的 {} {}收益情况：".format(m, interval_to_str[interval]))
-        # print(cumulative_returns_m_days_after_divergence)
-        print("当前MACD背离类型：{}".format(macd_divergence_type))
-        print("是否底背离：{}".format(macd_divergence_type == '底背离'))
-        print("收益概率：{:.2f}%".format(positive_probability))
-        print("数学期望（平均收益）：{:.2f}%".format(average_return))
-        print("最大收益：{:.2f}%".format(max_gain))
-        print("最大亏损：{:.2f}%".format(max_loss))
-        print("中位数收益：{:.2f}%".format(median_return))
-        return macd_divergence_type == '底背离', positive_probability, average_return
+    def analyze_macd_divergence_bottom(stock_data, m=5, stock_name='', interval='daily', features=None, report=False):
+        stats = StockStrategySimulator.macd_divergence(stock_data, m, features, top=False)
+        if report:
+            render_divergence_bottom(stats, stock_name, m, interval)
+        return stats
+
     @staticmethod
-    def analyze_should_follow(stock_code, m=5, stock_name='', interval_type='daily', start_date='2000-01-01', end_date='2024-03-25'):
+    def analyze_should_follow(stock_code, m=5, stock_name='', interval_type='daily', start_date='2000-01-01', end_date='2024-03-25',
+                              report=False):
         stock_data = StockStrategySimulator.get_stock_data(stock_code, interval=interval_type, start_date=start_date, end_date=end_date)
-        results = []
-        is_golden_across, prob, eval = StockStrategySimulator.analyze_stock_data_macd_kdj(stock_data, stock_name=stock_name, interval=interval_type)
-        if is_golden_across:
-            results.append((prob, eval))
-        is_5_trend_break, is_10_trend_break, prob, eval = StockStrategySimulator.analyze_trend_break(stock_data, stock_name=stock_name, interval=interval_type)
-        if is_5_trend_break or is_10_trend_break:
-            results.append((prob, eval))
-        is_trend_start, prob, eval = StockStrategySimulator.analyze_trend_start(stock_data, x=5, m=m, stock_name=stock_name, interval=interval_type)
-        if is_trend_start:
-            results.append((prob, eval))
-        is_top_diver, prob, eval = StockStrategySimulator.analyze_macd_divergence_top(stock_data, m=m, stock_name=stock_name, interval=interval_type)
-        if is_top_diver:
-            results.append((prob, eval))
-        is_bottom_diver, prob, eval = StockStrategySimulator.analyze_macd_divergence_bottom(stock_data, m=m, stock_name=stock_name, interval=interval_type)
-        if is_bottom_diver:
-            results.append((prob, eval))
-        expectation = sum(prob * eval for prob, eval in results)
-        expectation /= 100
-        should_buy = '是'
-        if expectation < 0:
-            should_buy = '否'
-        print(f"预期10{interval_to_str[interval_type]}后收益：{expectation:.2f}%，{interval_to_str[interval_type]}级别判断是否应该买入：{should_buy}")
-        return should_buy, expectation, interval_type
-
-# 指定目录进行操作
-directory_path = '../data/stock'
-remove_subset_files(directory_path)
-
-# stock_code = "sh.600418"
-# interval_type = 'daily'
-interval_type = 'monthly'
-
-start_date = '2000-01-01'
-# start_date = '2018-01-01'
-end_date = '2024-04-05'
-
-stock_code_code_list = ['sh.600418', 'sh.600733', 'sh.600863', 'sh.600938', 'sh.601127', 'sz.000333', 'sz.000628', 'sz.301236', 'sz.300570', 'sz.000737', 'sh.601600', 'sz.002714', 'hk.0700']
-# stock_data = StockStrategySimulator.get_stock_data(stock_code, interval=interval_type, start_date='2023-01-01', end_date='2024-03-24')
-# StockStrategySimulator.analyze_stock_data_macd_kdj(stock_data)
-# StockStrategySimulator.analyze_trend_break(stock_data)
-# StockStrategySimulator.analyze_trend_start(stock_data, x=5, stock_name=stock_code)
-# StockStrategySimulator.analyze_macd_divergence_top(stock_data, m=5, stock_name=stock_code)
-# StockStrategySimulator.analyze_macd_divergence_bottom(stock_data, m=5, stock_name=stock_code)
-for stock_code in stock_code_code_list:
+        return StockStrategySimulator.analyze_stock_frame(stock_data, m=m, stock_name=stock_name, interval_type=interval_type,
+                                                          cache_key=(stock_code, interval_type), report=report)
+
+    @staticmethod
+    def analyze_timeframes(stock_code, m=5, stock_name='', intervals=('daily', 'weekly', 'monthly'),
+                           start_date='2000-01-01', end_date='2024-03-25', report=False):
+        # 多周期分析：所有周期共用一份日线，只需要拉取一次
+        return {interval: StockStrategySimulator.analyze_should_follow(stock_code, m, stock_name, interval,
+                                                                       start_date, end_date, report)
+                for interval in intervals}
+
+    @staticmethod
+    def analyze_stock_frame(stock_data, m=5, stock_name='', interval_type='daily', cache_key=None, report=False):
+        # 共用指标每个序列只算一次，各分析方法直接读取对应的列。
+        # 给出 cache_key（一般为 (stock_code, interval)）时，整体结果和各个分析方法的结果都按
+        # (K 线内容, 参数, 代码版本) 缓存在磁盘上，K 线没有变化时重复运行只需查缓存
+        cache = StockStrategySimulator.result_cache if cache_key is not None else None
+        with stage('cache.fingerprint'):
+            fingerprint = data_fingerprint(stock_data) if cache_key is not None else None
+        features = []
+
+        def lazy_features():
+            if not features:
+                with stage('features'):
+                    features.append(get_features(stock_data, key=cache_key, fingerprint=fingerprint))
+            return features[0]
+
+        def cached(kind, params, compute):
+            # 计时只包含实际计算（缓存未命中）的部分，指标计算计入第一个用到它的分析方法
+            def timed():
+                with stage(f'analyze.{kind}'):
+                    return compute()
+
+            if cache is None:
+                return timed()
+            with stage('cache'):
+                return cache.cached(kind, cache_key, fingerprint, params, timed)
+
+        def compute_decision():
+            signals = {
+                'golden_cross': cached('macd_kdj', {'m': m}, lambda: StockStrategySimulator.analyze_stock_data_macd_kdj(
+                    stock_data, stock_name=stock_name, m=m, interval=interval_type, features=lazy_features())),
+                'trend_break': cached('trend_break', {'days': 10}, lambda: StockStrategySimulator.analyze_trend_break(
+                    stock_data, stock_name=stock_name, interval=interval_type, features=lazy_features())),
+                'trend_start': cached('trend_start', {'x': 5, 'm': m}, lambda: StockStrategySimulator.analyze_trend_start(
+                    stock_data, x=5, m=m, stock_name=stock_name, interval=interval_type, features=lazy_features())),
+                'divergence_top': cached('divergence_top', {'m': m},
+                                         lambda: StockStrategySimulator.analyze_macd_divergence_top(
+                                             stock_data, m=m, stock_name=stock_name, interval=interval_type,
+                                             features=lazy_features())),
+                'divergence_bottom': cached('divergence_bottom', {'m': m},
+                                            lambda: StockStrategySimulator.analyze_macd_divergence_bottom(
+                                                stock_data, m=m, stock_name=stock_name, interval=interval_type,
+                                                features=lazy_features())),
+            }
+            expectation = sum(stats.probability * stats.mean for stats in signals.values() if stats.signal)
+            expectation /= 100
+            should_buy = '是'
+            if expectation < 0:
+                should_buy = '否'
+            return FollowDecision(should_buy, expectation, interval_type, signals)
+
+        decision = cached('should_follow', {'m': m, 'interval': interval_type}, compute_decision)
+        if report:
+            with stage('render'):
+                signals = decision.signals
+                render_macd_kdj(signals['golden_cross'], stock_name)
+                render_trend_break(signals['trend_break'], stock_name, 10, interval_type)
+                render_trend_start(signals['trend_start'], stock_name, 5, m, interval_type)
+                render_divergence_top(signals['divergence_top'], stock_name, m, interval_type)
+                render_divergence_bottom(signals['divergence_bottom'], stock_name, m, interval_type)
+                render_decision(decision)
+        return decision
+
+def _scan_one(task):
+    # 进程池中执行的分析任务：直接从本地存储读取（内存映射），不访问数据源
+    stock_code, stock_name, interval, start_date, end_date, m, verbose = task
+    row = {'code': stock_code, 'name': stock_name, 'should_buy': None, 'expectation': np.nan, 'error': ''}
+    if profiling.enabled():
+        # fork 出来的子进程会带着主进程已有的统计，先清空
+        profiling.reset()
     try:
-        stock_name = str(stock_code)
-        if stock_code in stock_code_to_company:
-            stock_name = stock_code_to_company[stock_code]
-        StockStrategySimulator.analyze_should_follow(stock_code, 5, stock_name, interval_type, start_date, end_date)
-        time.sleep(5)
+        end_date = StockStrategySimulator.last_complete_day(end_date)
+        with stage('load'):
+            stock_data = StockStrategySimulator.bar_store.load(stock_code, interval, start_date, end_date)
+        decision = StockStrategySimulator.analyze_stock_frame(stock_data, m, stock_name, interval,
+                                                              cache_key=(stock_code, interval), report=verbose)
+        row['should_buy'], row['expectation'] = decision.should_buy, decision.expectation
     except Exception as e:
-        print(f"{stock_name}:{e}")
\ No newline at end of file
+        row['error'] = str(e)
+    if profiling.enabled():
+        # 子进程中的阶段统计随结果带回主进程
+        row['timings'] = profiling.take()
+    return row
+
+
+def fetch_universe(stock_codes, interval='daily', start_date='2000-01-01', end_date='2024-03-25', rate=5.0):
+    # 拉取本地缺失的数据：通过共用会话的工作队列执行，用限流器控制请求频率，返回拉取失败的代码
+    limiter = RateLimiter(rate)
+    store = StockStrategySimulator.bar_store
+    fetch_end = StockStrategySimulator.last_complete_day(end_date)
+    to_fetch = [code for code in stock_codes if store.missing_ranges(code, interval, start_date, fetch_end)]
+
+    def fetch(stock_code):
+        limiter.wait()
+        try:
+            StockStrategySimulator.sync_stock_data(stock_code, interval, start_date, fetch_end)
+        except Exception as e:
+            return str(e)
+
+    errors = StockStrategySimulator.session.map(fetch, to_fetch)
+    return {code: error for code, error in zip(to_fetch, errors) if error is not None}
+
+
+def scan_universe(stock_codes=None, interval='daily', start_date='2000-01-01', end_date='2024-03-25', m=5,
+                  rate=5.0, max_workers=None, stock_names=None, verbose=False, panel=False, panel_chunk=500):
+    # stock_codes 为空时扫描证券主表中 end_date 前已上市、仍在上市的全部股票；名称优先取证券主表
+    master = StockStrategySimulator.security_master
+    if stock_codes is None:
+        if len(master) == 0:
+            master.refresh(StockStrategySimulator.session)
+        stock_codes = master.universe(listed_before=end_date)
+    stock_names = stock_names or {**stock_code_to_company, **master.names()}
+
+    # 第一阶段：拉取数据
+    with stage('scan.fetch'):
+        failed = fetch_universe(stock_codes, interval, start_date, end_date, rate)
+    codes = [code for code in stock_codes if code not in failed]
+
+    # 第二阶段：指标和统计计算
+    if panel:
+        # 面板模式：按块把多个代码对齐成 (日期 × 代码) 矩阵，一次算完整块
+        from get_data.panel import analyze_panel, load_panel
+
+        end = StockStrategySimulator.last_complete_day(end_date)
+        rows = []
+        for chunk_start in range(0, len(codes), panel_chunk):
+            with stage('load'):
+                chunk = load_panel(StockStrategySimulator.bar_store, codes[chunk_start:chunk_start + panel_chunk],
+                                   interval, start_date, end)
+            with stage('analyze.panel'):
+                chunk_result = analyze_panel(chunk, m=m)
+            rows += [{'code': code, 'name': str(stock_names.get(code, code)), 'should_buy': should_buy,
+                      'expectation': expectation, 'error': ''}
+                     if code not in chunk.errors else
+                     {'code': code, 'name': str(stock_names.get(code, code)), 'should_buy': None,
+                      'expectation': np.nan, 'error': chunk.errors[code]}
+                     for code, should_buy, expectation in zip(chunk_result.index, chunk_result['should_buy'],
+                                                              chunk_result['expectation'])]
+    else:
+        # CPU 密集型的逐代码计算分发到进程池
+        tasks = [(code, str(stock_names.get(code, code)), interval, start_date, end_date, m, verbose) for code in codes]
+        with stage('scan.analyze'), ProcessPoolExecutor(max_workers=max_workers) as executor:
+            rows = list(executor.map(_scan_one, tasks, chunksize=max(1, len(tasks) // 64)))
+        for row in rows:
+            profiling.merge(row.pop('timings', {}))
+    rows += [{'code': code, 'name': str(stock_names.get(code, code)), 'should_buy': None,
+              'expectation': np.nan, 'error': error} for code, error in failed.items()]
+
+    result = pd.DataFrame(rows, columns=['code', 'name', 'should_buy', 'expectation', 'error'])
+    result['interval'] = interval
+    return result.sort_values('expectation', ascending=False, na_position='last').reset_index(drop=True)
+
+if __name__ == '__main__':
+    # stock_code = "sh.600418"
+    # interval_type = 'daily'
+    interval_type = 'monthly'
+
+    start_date = '2000-01-01'
+    # start_date = '2018-01-01'
+    end_date = '2024-04-05'
+
+    stock_code_code_list = ['sh.600418', 'sh.600733', 'sh.600863', 'sh.600938', 'sh.601127', 'sz.000333', 'sz.000628', 'sz.301236', 'sz.300570', 'sz.000737', 'sh.601600', 'sz.002714', 'hk.0700']
+    # stock_data = StockStrategySimulator.get_stock_data(stock_code, interval=interval_type, start_date='2023-01-01', end_date='2024-03-24')
+    # StockStrategySimulator.analyze_stock_data_macd_kdj(stock_data)
+    # StockStrategySimulator.analyze_trend_break(stock_data)
+    # StockStrategySimulator.analyze_trend_start(stock_data, x=5, stock_name=stock_code)
+    # StockStrategySimulator.analyze_macd_divergence_top(stock_data, m=5, stock_name=stock_code)
+    # StockStrategySimulator.analyze_macd_divergence_bottom(stock_data, m=5, stock_name=stock_code)
+    scan_result = scan_universe(stock_code_code_list, interval_type, start_date, end_date, m=5)
+    print(scan_result.to_string())
+    if profiling.enabled():
+        print(profiling.report().to_string())
@@ -0,0 +1,77 @@
+import os
+import time
+from collections import defaultdict
+
+# 按阶段统计耗时的埋点，默认关闭；设置环境变量 FINTECH_PROFILE=1 或调用 enable() 打开。
+# 关闭时 stage() 返回一个共用的空上下文，几乎没有开销，可以留在生产扫描的代码路径里。
+# 嵌套阶段的时间同时计入外层阶段。
+_enabled = os.environ.get('FINTECH_PROFILE') == '1'
+_stats = defaultdict(lambda: [0, 0.0])
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record = _stats[self.name]
+        record[0] += 1
+        record[1] += time.perf_counter() - self.start
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+    # 通过环境变量传给 spawn 方式启动的子进程
+    os.environ['FINTECH_PROFILE'] = '1' if flag else '0'
+
+
+def enabled():
+    return _enabled
+
+
+def stage(name):
+    return _Stage(name) if _enabled else _NULL_STAGE
+
+
+def reset():
+    _stats.clear()
+
+
+def take():
+    # 取出并清空当前进程的统计（进程池中的任务用它把统计带回主进程）
+    snapshot = {name: tuple(record) for name, record in _stats.items()}
+    _stats.clear()
+    return snapshot
+
+
+def merge(snapshot):
+    for name, (calls, seconds) in snapshot.items():
+        record = _stats[name]
+        record[0] += calls
+        record[1] += seconds
+
+
+def report():
+    import pandas as pd
+
+    rows = [(name, calls, seconds, seconds / calls * 1000 if calls else 0.0)
+            for name, (calls, seconds) in _stats.items()]
+    result = pd.DataFrame(rows, columns=['stage', 'calls', 'seconds', 'mean_ms'])
+    return result.sort_values('seconds', ascending=False).reset_index(drop=True)
@@ -0,0 +1,28 @@
+import threading
+import time
+
+
+# 令牌桶限流：平均每秒最多 rate 次请求，允许 burst 次突发
+# baostock 没有公开具体限额，默认值偏保守，批量任务可以按实际情况调高
+class RateLimiter:
+    def __init__(self, rate=5.0, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                time.sleep(delay)
+                self._last = time.monotonic()
+                self._tokens = 0.0
+            else:
+                self._tokens -= 1
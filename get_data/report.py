@@ -0,0 +1,78 @@
+from get_data.initial import interval_to_str
+
+
+# 控制台输出层：分析方法只返回统计结果，需要打印时再调用这里的函数
+
+
+def render_macd_kdj(stats, stock_name):
+    print()
+    print(f"{stock_name}当前是否金叉：{stats.signal}")
+    print("金叉后的收益情况：")
+    print("收益概率：{:.2f}%".format(stats.probability))
+    print("数学期望（平均收益）：{:.2f}%".format(stats.mean))
+    print("最大收益：{:.2f}%".format(stats.max_gain))
+    print("最大亏损：{:.2f}%".format(stats.max_loss))
+    print("中位数收益：{:.2f}%".format(stats.median))
+
+
+def render_trend_break(stats, stock_name, days=10, interval='daily'):
+    unit = interval_to_str[interval]
+    print()
+    print(f"{stock_name}当前是否跌破上升趋势：")
+    print(f"MA5：{stats.ma5.signal}, MA10：{stats.ma10.signal}")
+    for window, window_stats in ((5, stats.ma5), (10, stats.ma10)):
+        if window == 5:
+            print(f"跌破MA5线后的{days}{unit}收益情况：")
+        else:
+            print()
+            print(f"{stock_name}跌破MA10线后的{days}{unit}收益情况：")
+        print("收益概率（跌破MA{}线）：{:.2f}%".format(window, window_stats.probability))
+        print("数学期望（平均收益，跌破MA{}线）：{:.2f}%".format(window, window_stats.mean))
+        print("最大收益（跌破MA{}线，{}{}后）：{:.2f}%".format(window, days, unit, window_stats.max_gain))
+        print("最大亏损（跌破MA{}线，{}{}后）：{:.2f}%".format(window, days, unit, window_stats.max_loss))
+        print("中位数收益（跌破MA{}线，{}{}后）：{:.2f}%".format(window, days, unit, window_stats.median))
+    print()
+
+
+def render_trend_start(stats, stock_name, x=5, m=10, interval='daily'):
+    print()
+    print("股票名称：{}".format(stock_name))
+    print("站上 MA{} 后的 {} {}收益情况：".format(x, m, interval_to_str[interval]))
+    print("收益概率：{:.2f}%".format(stats.probability))
+    print("数学期望（平均收益）：{:.2f}%".format(stats.mean))
+    print("最大收益：{:.2f}%".format(stats.max_gain))
+    print("最大亏损：{:.2f}%".format(stats.max_loss))
+    print("中位数收益：{:.2f}%".format(stats.median))
+
+
+def render_divergence_top(stats, stock_name, m=5, interval='daily'):
+    divergence_type = '顶背离' if stats.signal else ''
+    print()
+    print("股票名称：{}".format(stock_name))
+    print("当前是否顶背离：{}".format(stats.signal))
+    print("MACD顶背离后的 {} {}收益情况：".format(m, interval_to_str[interval]))
+    print("当前MACD背离类型：{}".format(divergence_type))
+    print("收益概率：{:.2f}%".format(stats.probability))
+    print("数学期望（平均收益）：{:.2f}%".format(stats.mean))
+    print("最大收益：{:.2f}%".format(stats.max_gain))
+    print("最大亏损：{:.2f}%".format(stats.max_loss))
+    print("中位数收益：{:.2f}%".format(stats.median))
+
+
+def render_divergence_bottom(stats, stock_name, m=5, interval='daily'):
+    divergence_type = '底背离' if stats.signal else ''
+    print()
+    print("股票名称：{}".format(stock_name))
+    print("MACD底背离后的 {} {}收益情况：".format(m, interval_to_str[interval]))
+    print("当前MACD背离类型：{}".format(divergence_type))
+    print("是否底背离：{}".format(stats.signal))
+    print("收益概率：{:.2f}%".format(stats.probability))
+    print("数学期望（平均收益）：{:.2f}%".format(stats.mean))
+    print("最大收益：{:.2f}%".format(stats.max_gain))
+    print("最大亏损：{:.2f}%".format(stats.max_loss))
+    print("中位数收益：{:.2f}%".format(stats.median))
+
+
+def render_decision(decision):
+    unit = interval_to_str[decision.interval]
+    print(f"预期10{unit}后收益：{decision.expectation:.2f}%，{unit}级别判断是否应该买入：{decision.should_buy}")
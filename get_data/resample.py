@@ -0,0 +1,119 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from get_data.bar_store import BarStore, BAR_FIELDS, to_day
+
+DERIVED_INTERVALS = ('weekly', 'monthly')
+DERIVED_CACHE_SIZE = 256
+
+
+def period_keys(dates, interval):
+    # 每根日线所属的周期编号：周线按周一开始的自然周（1970-01-01 是周四），月线按自然月
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    if interval == 'weekly':
+        return (dates.astype(np.int64) + 3) // 7
+    if interval == 'monthly':
+        return dates.astype('datetime64[M]').astype(np.int64)
+    raise ValueError(f"Invalid interval parameter: {interval}")
+
+
+def period_last_weekday(key, interval):
+    # 周期编号对应的最后一个工作日：周线是该周的周五，月线是该月最后一个工作日
+    if interval == 'weekly':
+        return np.datetime64(int(key) * 7 + 1, 'D')
+    if interval == 'monthly':
+        last = (np.datetime64(int(key) + 1, 'M').astype('datetime64[D]') - 1)
+        return np.busday_offset(last, 0, roll='backward')
+    raise ValueError(f"Invalid interval parameter: {interval}")
+
+
+def resample_bars(dates, bars, interval, complete_through=None):
+    # 日线聚合成周线 / 月线，与 baostock 的约定一致：日期取该周期最后一个交易日，
+    # 开盘取第一根日线的开盘价，收盘取最后一根的收盘价，最高 / 最低取周期内的极值。
+    # 给出 complete_through（日线实际覆盖到的日期）时，最后一个周期如果还没走完（覆盖不到它的最后一个工作日），
+    # 聚合出来的只是半根 K 线，与 baostock 一样不返回
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    bars = np.asarray(bars, dtype=np.float64).reshape(len(dates), len(BAR_FIELDS))
+    if len(dates) and complete_through is not None:
+        last_key = period_keys(dates[-1:], interval)[0]
+        if to_day(complete_through) < period_last_weekday(last_key, interval):
+            keep = np.searchsorted(period_keys(dates, interval), last_key, side='left')
+            dates, bars = dates[:keep], bars[:keep]
+    if len(dates) == 0:
+        return dates, bars
+    keys = period_keys(dates, interval)
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(dates)] - 1
+    result = np.empty((len(starts), len(BAR_FIELDS)))
+    result[:, 0] = bars[starts, 0]
+    result[:, 1] = np.fmax.reduceat(bars[:, 1], starts)
+    result[:, 2] = np.fmin.reduceat(bars[:, 2], starts)
+    result[:, 3] = bars[ends, 3]
+    return dates[ends], result
+
+
+# 只从数据源拉取日线，周线、月线在本地由日线聚合。
+# 聚合一只股票的全部日线不到一毫秒，比从磁盘读取聚合结果还快，所以聚合结果只缓存在内存中（LRU），
+# 并记录生成时日线的版本（覆盖区间、行数、文件修改时间和大小），日线被追加或重写后下次读取时自动重新聚合。
+# 对外接口与 BarStore 相同，覆盖区间和缺失区间都以日线为准；日线覆盖区间还没走完的最后一周 / 一月不生成 K 线。
+class DerivedBarStore(BarStore):
+    def __init__(self, root=None, cache_size=DERIVED_CACHE_SIZE):
+        super().__init__(root)
+        self.cache_size = cache_size
+        self._derived = OrderedDict()
+
+    def __getstate__(self):
+        return {'root': self.root, 'cache_size': self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(state['root'], state['cache_size'])
+
+    def source_interval(self, interval):
+        return 'daily' if interval in DERIVED_INTERVALS else interval
+
+    def coverage(self, stock_code, interval):
+        return super().coverage(stock_code, self.source_interval(interval))
+
+    def _source_version(self, stock_code):
+        meta = self.read_meta(stock_code, 'daily')
+        if meta is None:
+            return None
+        stat = os.stat(os.path.join(self._dir(stock_code, 'daily'), 'bars.npy'))
+        return meta['start'], meta['end'], meta['rows'], stat.st_mtime_ns, stat.st_size
+
+    def derived_arrays(self, stock_code, interval):
+        version = self._source_version(stock_code)
+        if version is None:
+            raise FileNotFoundError(f"{stock_code} daily bars are not stored")
+        key = (stock_code, interval)
+        cached = self._derived.get(key)
+        if cached is not None and cached[0] == version:
+            self._derived.move_to_end(key)
+            return cached[1], cached[2]
+
+        dates, bars = resample_bars(*super().load_arrays(stock_code, 'daily'), interval, complete_through=version[1])
+        self._derived[key] = (version, dates, bars)
+        self._derived.move_to_end(key)
+        while len(self._derived) > self.cache_size:
+            self._derived.popitem(last=False)
+        return dates, bars
+
+    def load_arrays(self, stock_code, interval, start_date=None, end_date=None):
+        if interval not in DERIVED_INTERVALS:
+            return super().load_arrays(stock_code, interval, start_date, end_date)
+        dates, bars = self.derived_arrays(stock_code, interval)
+        lo = 0 if start_date is None else np.searchsorted(dates, to_day(start_date), side='left')
+        hi = len(dates) if end_date is None else np.searchsorted(dates, to_day(end_date), side='right')
+        return dates[lo:hi].copy(), bars[lo:hi].copy()
+
+    def last_bar(self, stock_code, interval):
+        if interval not in DERIVED_INTERVALS:
+            return super().last_bar(stock_code, interval)
+        if self.coverage(stock_code, interval) is None:
+            return None
+        dates, bars = self.derived_arrays(stock_code, interval)
+        if len(dates) == 0:
+            return None
+        return dates[-1], bars[-1].copy()
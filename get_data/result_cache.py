@@ -0,0 +1,131 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from get_data.bar_store import BAR_FIELDS
+from get_data.config import data_path
+
+# 参与计算结果的源文件，任何一个改动后旧的缓存结果自动失效
+CODE_FILES = ['predict_buy_revnue.py', 'indicators.py', 'forward_returns.py', 'signal_stats.py']
+EVICT_EVERY = 100  # 每写入这么多条检查一次容量
+
+_code_version = None
+
+
+def code_version():
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.blake2b(digest_size=16)
+        directory = os.path.dirname(os.path.abspath(__file__))
+        for name in CODE_FILES:
+            with open(os.path.join(directory, name), 'rb') as f:
+                digest.update(f.read())
+        _code_version = digest.hexdigest()
+    return _code_version
+
+
+def data_fingerprint(stock_data):
+    # K 线内容的摘要：最后一根 K 线日期 + 日期和 OHLC 的哈希，复权价格整体变化时也能发现
+    if len(stock_data) == 0:
+        return 'empty'
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(stock_data.index.to_numpy(dtype='datetime64[D]')).tobytes())
+    digest.update(np.ascontiguousarray(stock_data[BAR_FIELDS].to_numpy(dtype=np.float64)).tobytes())
+    return f"{stock_data.index[-1].date().isoformat()}:{digest.hexdigest()}"
+
+
+# 分析结果的磁盘缓存：键为 (分析类型, 代码, 周期, 最后一根 K 线日期 + 数据摘要, 参数, 代码版本) 的哈希，
+# 值为 pickle 后的统计结果，存放在 SQLite 中。超过 max_bytes 或 max_entries 时按最近访问时间淘汰。
+class ResultCache:
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024, max_entries=200_000):
+        self.path = path or data_path('results.sqlite')
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._puts = 0
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_bytes': self.max_bytes, 'max_entries': self.max_entries}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _db(self):
+        # 每个线程各自连接，fork 出来的子进程重新建立连接
+        if getattr(self._local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            # 缓存丢了可以重算，不需要每次提交都落盘
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            connection.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                               'size INTEGER NOT NULL, accessed REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+            connection.commit()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    @staticmethod
+    def key(kind, cache_key, fingerprint, params):
+        parts = (kind, tuple(cache_key), fingerprint, tuple(sorted(params.items())), code_version())
+        return hashlib.blake2b(repr(parts).encode(), digest_size=20).hexdigest()
+
+    def get(self, key):
+        # 命中时返回 (True, 结果)，否则返回 (False, None)
+        connection = self._db()
+        row = connection.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return False, None
+        with connection:
+            connection.execute('UPDATE results SET accessed = ? WHERE key = ?', (time.time(), key))
+        self.hits += 1
+        return True, pickle.loads(row[0])
+
+    def put(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        connection = self._db()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (key, blob, len(blob), time.time()))
+        self._puts += 1
+        if self._puts % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        # 按最近访问时间从旧到新删除，直到总大小和条数都在限制以内
+        connection = self._db()
+        total, count = connection.execute('SELECT COALESCE(SUM(size), 0), COUNT(*) FROM results').fetchone()
+        if total <= self.max_bytes and count <= self.max_entries:
+            return 0
+        removed = []
+        for key, size in connection.execute('SELECT key, size FROM results ORDER BY accessed'):
+            if total <= self.max_bytes and count - len(removed) <= self.max_entries:
+                break
+            removed.append((key,))
+            total -= size
+        with connection:
+            connection.executemany('DELETE FROM results WHERE key = ?', removed)
+        return len(removed)
+
+    def cached(self, kind, cache_key, fingerprint, params, compute):
+        key = self.key(kind, cache_key, fingerprint, params)
+        hit, value = self.get(key)
+        if not hit:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        connection = self._db()
+        with connection:
+            connection.execute('DELETE FROM results')
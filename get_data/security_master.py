@@ -0,0 +1,155 @@
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from get_data.config import data_path
+from get_data.session import default_session
+
+# baostock 证券类型：1 股票，2 指数，3 其它，4 可转债，5 ETF；上市状态：1 上市，0 退市
+STOCK = 1
+LISTED = 1
+BULK_THRESHOLD = 200  # 需要更新的代码超过这个数量时，直接一次拉取全部证券资料
+
+
+class Security(NamedTuple):
+    code: str
+    name: str
+    ipo_date: np.datetime64
+    out_date: np.datetime64  # 未退市为 NaT
+    type: int
+    status: int
+
+
+def _day(value):
+    return np.datetime64(value, 'D')
+
+
+def _typed(basic):
+    # query_stock_basic 的返回（全部为字符串）转成定长类型的列
+    import pandas as pd
+
+    return pd.DataFrame({
+        'code': basic['code'].astype(str).to_numpy(dtype='U12'),
+        'name': basic['code_name'].astype(str).to_numpy(dtype='U32'),
+        'ipo_date': pd.to_datetime(basic['ipoDate'], errors='coerce').to_numpy(dtype='datetime64[D]'),
+        'out_date': pd.to_datetime(basic['outDate'], errors='coerce').to_numpy(dtype='datetime64[D]'),
+        'type': pd.to_numeric(basic['type'], errors='coerce').fillna(0).to_numpy(dtype=np.int8),
+        'status': pd.to_numeric(basic['status'], errors='coerce').fillna(0).to_numpy(dtype=np.int8),
+    })
+
+
+# 证券主表：由 query_all_stock / query_stock_basic 构建并持久化（npz 列式存储），
+# 加载后以代码为键放进字典，按代码查名称、上市日期等都是 O(1)。
+# refresh 只对新增、改名、从交易列表消失的代码重新查询资料，差异太大（比如第一次构建）时一次拉取全部证券资料。
+class SecurityMaster:
+    def __init__(self, path=None):
+        self.path = path or data_path('security_master.npz')
+        self._securities = None
+
+    @property
+    def securities(self):
+        if self._securities is None:
+            self._securities = {}
+            if os.path.exists(self.path):
+                with np.load(self.path) as data:
+                    columns = [data[field] for field in Security._fields]
+                for row in zip(*columns):
+                    security = Security(str(row[0]), str(row[1]), row[2], row[3], int(row[4]), int(row[5]))
+                    self._securities[security.code] = security
+        return self._securities
+
+    def __len__(self):
+        return len(self.securities)
+
+    def __contains__(self, stock_code):
+        return stock_code in self.securities
+
+    def get(self, stock_code):
+        return self.securities.get(stock_code)
+
+    def name(self, stock_code, default=None):
+        security = self.securities.get(stock_code)
+        return security.name if security is not None else default
+
+    def names(self):
+        return {code: security.name for code, security in self.securities.items()}
+
+    def universe(self, types=(STOCK,), listed_only=True, listed_before=None):
+        # 按类型、上市状态、上市日期筛选代码
+        listed_before = None if listed_before is None else _day(listed_before)
+        return [code for code, security in self.securities.items()
+                if security.type in types
+                and (not listed_only or security.status == LISTED)
+                and (listed_before is None or security.ipo_date <= listed_before)]
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(list(self.securities.values()), columns=Security._fields)
+
+    def _write(self, frame):
+        frame = frame.sort_values('code').reset_index(drop=True)
+        arrays = {
+            'code': frame['code'].to_numpy(dtype='U12'),
+            'name': frame['name'].to_numpy(dtype='U32'),
+            'ipo_date': frame['ipo_date'].to_numpy(dtype='datetime64[D]'),
+            'out_date': frame['out_date'].to_numpy(dtype='datetime64[D]'),
+            'type': frame['type'].to_numpy(dtype=np.int8),
+            'status': frame['status'].to_numpy(dtype=np.int8),
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path[:-len('.npz')] + '.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, self.path)
+        self._securities = None
+
+    def refresh(self, session=None, day=None, bulk_threshold=BULK_THRESHOLD):
+        # 返回 {'added': [...], 'changed': [...], 'removed': [...]}，没有变化时不写文件
+        import pandas as pd
+
+        session = session or default_session()
+        day = pd.Timestamp(day or pd.Timestamp.today()).normalize()
+        # 非交易日 query_all_stock 返回空表，往前找最近的交易日
+        listing = pd.DataFrame()
+        for offset in range(15):
+            listing = session.query('query_all_stock', day=(day - pd.Timedelta(days=offset)).strftime('%Y-%m-%d'))
+            if len(listing):
+                break
+        listed_names = dict(zip(listing['code'], listing['code_name'])) if len(listing) else {}
+
+        securities = self.securities
+        to_query = {code for code, name in listed_names.items()
+                    if code not in securities or securities[code].name != name}
+        to_query |= {code for code, security in securities.items()
+                     if security.status == LISTED and code not in listed_names}
+        if not to_query and securities:
+            return {'added': [], 'changed': [], 'removed': []}
+
+        if len(to_query) > bulk_threshold or not securities:
+            # 不带代码的 query_stock_basic 一次返回全部证券
+            basic = session.query('query_stock_basic')
+        else:
+            frames = list(session.query_many('query_stock_basic', [{'code': code} for code in sorted(to_query)]))
+            basic = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if len(basic) == 0:
+            return {'added': [], 'changed': [], 'removed': []}
+        fresh = _typed(basic)
+
+        merged = pd.concat([self.to_frame(), fresh], ignore_index=True) if securities else fresh
+        merged = merged.drop_duplicates('code', keep='last')
+        added, changed, removed = [], [], []
+        for row in fresh.itertuples(index=False):
+            previous = securities.get(row.code)
+            if previous is None:
+                added.append(row.code)
+            elif (previous.name, previous.type, previous.status, str(_day(previous.out_date))) != \
+                    (row.name, row.type, row.status, str(_day(row.out_date))):
+                changed.append(row.code)
+                if previous.status == LISTED and row.status != LISTED:
+                    removed.append(row.code)
+        if added or changed:
+            self._write(merged)
+        return {'added': added, 'changed': changed, 'removed': removed}
@@ -0,0 +1,184 @@
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from get_data.rate_limit import RateLimiter
+
+NOT_LOGGED_IN = '10001001'  # baostock：用户未登录（会话过期后查询返回这个错误码）
+NETWORK_ERROR_PREFIX = '10002'  # baostock：100020xx 为网络错误（连接、发送、接收失败等）
+
+
+def is_transient(error_code):
+    # 只有网络错误和会话过期值得重试，参数错误、代码错误等重试也不会成功
+    return error_code == NOT_LOGGED_IN or str(error_code).startswith(NETWORK_ERROR_PREFIX)
+
+
+class BaostockError(Exception):
+    def __init__(self, method, error_code, error_msg):
+        super().__init__(f"{method}: {error_code} {error_msg}")
+        self.error_code = error_code
+        self.error_msg = error_msg
+
+
+# 所有拉取路径共用的 baostock 会话：
+# 1. 只登录一次，会话过期或网络断开时自动重新登录，进程退出时登出；
+# 2. 网络错误、会话过期或网络异常时按指数退避重试，其它错误码（参数错误等）直接抛出；
+# 3. 查询放进有界队列由工作线程执行，队列满时阻塞提交方。baostock 的连接是进程内全局唯一的，
+#    真实数据源只能用一个工作线程；client 换成 fake_baostock.FakeBaostock 时可以离线测试。
+class BaostockSession:
+    def __init__(self, client=None, retries=3, backoff=0.5, rate=None, workers=1, queue_size=64):
+        self._client = client
+        self.retries = retries
+        self.backoff = backoff
+        self.limiter = RateLimiter(rate) if rate else None
+        self.workers = workers
+        self.queue_size = queue_size
+        self.logins = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._queue = None
+        self._threads = []
+        self._logged_in = False
+
+    @property
+    def client(self):
+        if self._client is None:
+            import baostock
+            self._client = baostock
+        return self._client
+
+    def login(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork 出来的子进程不能复用父进程的连接和线程
+                self._reset()
+            if not self._logged_in:
+                lg = self.client.login()
+                if lg.error_code != '0':
+                    raise BaostockError('login', lg.error_code, lg.error_msg)
+                if self.logins == 0:
+                    atexit.register(self.close)
+                self._logged_in = True
+                self.logins += 1
+
+    def close(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            threads, work_queue = self._threads, self._queue
+            self._threads = []
+        # 等队列中已提交的任务执行完再登出
+        for _ in threads:
+            work_queue.put(None)
+        for thread in threads:
+            thread.join()
+        with self._lock:
+            logged_in = self._logged_in
+            self._reset()
+        if logged_in:
+            self.client.logout()
+
+    def _run_query(self, method, kwargs):
+        # pandas 和 baostock 都在第一次查询时才导入，只读本地证券主表等场景不需要加载
+        import pandas as pd
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                self.login()
+                if self.limiter is not None:
+                    self.limiter.wait()
+                rs = getattr(self.client, method)(**kwargs)
+                data_list = []
+                while (rs.error_code == '0') & rs.next():
+                    data_list.append(rs.get_row_data())
+                if rs.error_code == '0':
+                    return pd.DataFrame(data_list, columns=rs.fields)
+                error = BaostockError(method, rs.error_code, rs.error_msg)
+                if not is_transient(rs.error_code):
+                    raise error
+                if rs.error_code == NOT_LOGGED_IN:
+                    self._logged_in = False
+            except (OSError, EOFError) as e:
+                # 网络异常后连接状态未知，重新登录
+                error = e
+                self._logged_in = False
+        raise error
+
+    def _work(self):
+        self._local.worker = True
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, func, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, func, *args, **kwargs):
+        # 在会话的工作线程中执行 func，返回 Future；工作线程内部的嵌套提交直接执行
+        future = Future()
+        if getattr(self._local, 'worker', False):
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            if not self._threads:
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+                for thread in self._threads:
+                    thread.start()
+        self._queue.put((future, func, args, kwargs))
+        return future
+
+    def map(self, func, items):
+        # 批量提交，按输入顺序返回结果；某一项出错时在取到该项结果时抛出
+        futures = [self.submit(func, item) for item in items]
+        return [future.result() for future in futures]
+
+    def imap(self, func, items):
+        # 按输入顺序逐个产出结果，同时在途的任务不超过 queue_size 个，适合很长的批量任务
+        pending = deque()
+        for item in items:
+            pending.append(self.submit(func, item))
+            if len(pending) >= self.queue_size:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def query(self, method, **kwargs):
+        # 执行一次 baostock 查询（如 query_history_k_data），返回全部行组成的 DataFrame（字符串列）
+        return self.submit(self._run_query, method, kwargs).result()
+
+    def query_many(self, method, kwargs_list):
+        # 批量查询，按输入顺序逐个产出结果
+        return self.imap(lambda kwargs: self._run_query(method, kwargs), kwargs_list)
+
+
+_default_session = None
+
+
+def default_session():
+    global _default_session
+    if _default_session is None:
+        _default_session = BaostockSession()
+    return _default_session
@@ -0,0 +1,49 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+class SignalStats(NamedTuple):
+    signal: bool  # 最后一根 K 线是否满足信号条件
+    probability: float  # 收益为正的事件占比（%）
+    mean: float
+    median: float
+    max_gain: float
+    max_loss: float
+    count: int
+
+
+class TrendBreakStats(NamedTuple):
+    ma5: SignalStats
+    ma10: SignalStats
+
+    @property
+    def signal(self):
+        return self.ma5.signal or self.ma10.signal
+
+    @property
+    def probability(self):
+        return (self.ma10.probability + self.ma5.probability) / 2
+
+    @property
+    def mean(self):
+        return (self.ma10.mean + self.ma5.mean) / 2
+
+
+class FollowDecision(NamedTuple):
+    should_buy: str
+    expectation: float
+    interval: str
+    signals: dict
+
+
+def summarize(returns, signal):
+    # returns 为信号出现时对应的收益序列（可能包含 NaN）
+    values = np.asarray(returns, dtype=np.float64)
+    count = len(values)
+    valid = values[~np.isnan(values)]
+    probability = np.count_nonzero(valid > 0) / count * 100 if count != 0 else 0
+    if len(valid) == 0:
+        return SignalStats(bool(signal), probability, np.nan, np.nan, np.nan, np.nan, count)
+    return SignalStats(bool(signal), probability, valid.mean(), float(np.median(valid)),
+                       valid.max(), valid.min(), count)
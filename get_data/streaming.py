@@ -0,0 +1,360 @@
+import json
+import math
+from collections import deque
+
+from get_data.bar_store import BAR_FIELDS, ONE_DAY, to_day
+from get_data.indicators import DEFAULT_MACD, DEFAULT_STOCH
+
+# 增量指标：每来一根新 K 线 O(1) 更新，只保存 O(窗口) 的状态，可以序列化成 JSON 在重启后恢复。
+# 计算口径与批量计算一致：EMA 对应 pandas ewm(adjust=False)，MACD / STOCH 对应 talib（含 talib 的初始化方式），
+# MA 对应 rolling(window).mean()。还没攒够数据时返回 NaN。
+
+NAN = float('nan')
+
+
+class RollingSum:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+
+    def update(self, value):
+        self.values.append(value)
+        self.total += value
+        if len(self.values) > self.window:
+            self.total -= self.values.popleft()
+        return self.total if len(self.values) == self.window else NAN
+
+    @property
+    def value(self):
+        return self.total if len(self.values) == self.window else NAN
+
+    def state(self):
+        return {'window': self.window, 'values': list(self.values), 'total': self.total}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state['window'])
+        indicator.values = deque(state['values'])
+        indicator.total = state['total']
+        return indicator
+
+
+class RollingMean(RollingSum):
+    def update(self, value):
+        total = super().update(value)
+        return total / self.window
+
+    @property
+    def value(self):
+        return super().value / self.window
+
+
+class EMA:
+    # pandas ewm(span, adjust=False)：第一根 K 线的值作为初值
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self.value = NAN
+
+    def update(self, value):
+        self.value = value if math.isnan(self.value) else self.value + self.alpha * (value - self.value)
+        return self.value
+
+    def state(self):
+        return {'span': self.span, 'value': self.value}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state['span'])
+        indicator.value = state['value']
+        return indicator
+
+
+class SeededEMA:
+    # talib 的 EMA：先攒够 period 个值，用它们的均值作初值
+    def __init__(self, period):
+        self.period = period
+        self.k = 2 / (period + 1)
+        self.seed = []
+        self.value = NAN
+
+    def update(self, value):
+        if len(self.seed) < self.period:
+            self.seed.append(value)
+            if len(self.seed) == self.period:
+                self.value = sum(self.seed) / self.period
+            return self.value
+        self.value = (value - self.value) * self.k + self.value
+        return self.value
+
+    def state(self):
+        return {'period': self.period, 'seed': self.seed, 'value': self.value}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state['period'])
+        indicator.seed = list(state['seed'])
+        indicator.value = state['value']
+        return indicator
+
+
+class MACD:
+    # 与 talib.MACD 一致：快、慢线在第 slow 根 K 线同时开始，快线用最近 fast 根的均值作初值
+    def __init__(self, fast=DEFAULT_MACD[0], slow=DEFAULT_MACD[1], signal=DEFAULT_MACD[2]):
+        self.fast, self.slow, self.signal = fast, slow, signal
+        self.warmup = deque(maxlen=slow)
+        self.fast_ema = SeededEMA(fast)
+        self.slow_ema = SeededEMA(slow)
+        self.signal_ema = SeededEMA(signal)
+        self.macd = self.macdsignal = self.macdhist = NAN
+
+    def update(self, value):
+        if len(self.warmup) < self.slow:
+            self.warmup.append(value)
+            if len(self.warmup) < self.slow:
+                return NAN, NAN, NAN
+            for item in list(self.warmup)[-self.fast:]:
+                self.fast_ema.update(item)
+            for item in self.warmup:
+                self.slow_ema.update(item)
+            fast_value, slow_value = self.fast_ema.value, self.slow_ema.value
+        else:
+            fast_value, slow_value = self.fast_ema.update(value), self.slow_ema.update(value)
+        macd = fast_value - slow_value
+        signal = self.signal_ema.update(macd)
+        if math.isnan(signal):
+            return NAN, NAN, NAN
+        self.macd, self.macdsignal, self.macdhist = macd, signal, macd - signal
+        return self.macd, self.macdsignal, self.macdhist
+
+    def state(self):
+        return {'fast': self.fast, 'slow': self.slow, 'signal': self.signal, 'warmup': list(self.warmup),
+                'fast_ema': self.fast_ema.state(), 'slow_ema': self.slow_ema.state(),
+                'signal_ema': self.signal_ema.state(),
+                'last': [self.macd, self.macdsignal, self.macdhist]}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state['fast'], state['slow'], state['signal'])
+        indicator.warmup.extend(state['warmup'])
+        indicator.fast_ema = SeededEMA.from_state(state['fast_ema'])
+        indicator.slow_ema = SeededEMA.from_state(state['slow_ema'])
+        indicator.signal_ema = SeededEMA.from_state(state['signal_ema'])
+        indicator.macd, indicator.macdsignal, indicator.macdhist = state['last']
+        return indicator
+
+
+class RollingExtreme:
+    # 单调队列维护滑动窗口最大（最小）值，均摊 O(1)
+    def __init__(self, window, largest=True):
+        self.window = window
+        self.largest = largest
+        self.count = 0
+        self.items = deque()  # (序号, 值)
+
+    def update(self, value):
+        while self.items and (self.items[-1][1] <= value if self.largest else self.items[-1][1] >= value):
+            self.items.pop()
+        self.items.append((self.count, value))
+        if self.items[0][0] <= self.count - self.window:
+            self.items.popleft()
+        self.count += 1
+        return self.items[0][1] if self.count >= self.window else NAN
+
+    def state(self):
+        return {'window': self.window, 'largest': self.largest, 'count': self.count,
+                'items': [list(item) for item in self.items]}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state['window'], state['largest'])
+        indicator.count = state['count']
+        indicator.items = deque(tuple(item) for item in state['items'])
+        return indicator
+
+
+class Stochastic:
+    # 与 talib.STOCH（SMA 平滑）一致，另外给出 J = 3K - 2D
+    def __init__(self, fastk=DEFAULT_STOCH[0], slowk=DEFAULT_STOCH[1], slowd=DEFAULT_STOCH[2]):
+        self.fastk, self.slowk, self.slowd = fastk, slowk, slowd
+        self.highest = RollingExtreme(fastk, largest=True)
+        self.lowest = RollingExtreme(fastk, largest=False)
+        self.k_mean = RollingMean(slowk)
+        self.d_mean = RollingMean(slowd)
+        self.k = self.d = NAN
+
+    def update(self, high, low, close):
+        highest, lowest = self.highest.update(high), self.lowest.update(low)
+        if math.isnan(highest):
+            return NAN, NAN
+        spread = highest - lowest
+        fast_k = (close - lowest) / spread * 100 if spread != 0 else 0.0
+        k = self.k_mean.update(fast_k)
+        if math.isnan(k):
+            return NAN, NAN
+        d = self.d_mean.update(k)
+        if math.isnan(d):
+            return NAN, NAN
+        self.k, self.d = k, d
+        return k, d
+
+    @property
+    def j(self):
+        return 3 * self.k - 2 * self.d
+
+    def state(self):
+        return {'fastk': self.fastk, 'slowk': self.slowk, 'slowd': self.slowd,
+                'highest': self.highest.state(), 'lowest': self.lowest.state(),
+                'k_mean': self.k_mean.state(), 'd_mean': self.d_mean.state(), 'last': [self.k, self.d]}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state['fastk'], state['slowk'], state['slowd'])
+        indicator.highest = RollingExtreme.from_state(state['highest'])
+        indicator.lowest = RollingExtreme.from_state(state['lowest'])
+        indicator.k_mean = RollingMean.from_state(state['k_mean'])
+        indicator.d_mean = RollingMean.from_state(state['d_mean'])
+        indicator.k, indicator.d = state['last']
+        return indicator
+
+
+class SignalMonitor:
+    # 按 analyze_should_follow 的口径维护一个代码的“当前信号”，每根新 K 线 O(1) 更新。
+    # 收盘价缺失（停牌）的 K 线直接跳过
+    def __init__(self, x=5, macd=DEFAULT_MACD, stoch=DEFAULT_STOCH):
+        self.x = x
+        self.macd = MACD(*macd)
+        self.stoch = Stochastic(*stoch)
+        self.ema_fast = EMA(macd[0])
+        self.ema_slow = EMA(macd[1])
+        self.ma = {window: RollingMean(window) for window in sorted({5, 10, x})}
+        self.below_streak = {5: 0, 10: 0}
+        self.previous = {'macd': NAN, 'macdsignal': NAN, 'k': NAN, 'd': NAN}
+        self.macd_ewm = deque(maxlen=2)
+        self.last_date = None
+        self.last_close = None  # last_date 那根 K 线的收盘价，用来发现存储中的历史被重新复权
+        self.flags = {'golden_cross': False, 'trend_break_ma5': False, 'trend_break_ma10': False,
+                      'trend_start': False, 'divergence_top': False, 'divergence_bottom': False}
+
+    def update(self, high, low, close, date=None):
+        if math.isnan(close):
+            return self.flags
+        macd, macdsignal, _ = self.macd.update(close)
+        k, d = self.stoch.update(high, low, close)
+        previous = self.previous
+        self.flags['golden_cross'] = bool(
+            (macd > macdsignal and previous['macd'] < previous['macdsignal']) or
+            (k > d and previous['k'] < previous['d']))
+        self.previous = {'macd': macd, 'macdsignal': macdsignal, 'k': k, 'd': d}
+
+        averages = {window: average.update(close) for window, average in self.ma.items()}
+        for window in (5, 10):
+            # 收盘价连续 5 根 K 线低于均线才算跌破上升趋势
+            self.below_streak[window] = self.below_streak[window] + 1 if close < averages[window] else 0
+            self.flags[f'trend_break_ma{window}'] = self.below_streak[window] >= 5
+        self.flags['trend_start'] = bool(close > averages[self.x])
+
+        # 与分析方法的口径一致：出现过 MACD 背离就视为当前背离
+        macd_ewm = self.ema_fast.update(close) - self.ema_slow.update(close)
+        if len(self.macd_ewm) == 2:
+            before, last = self.macd_ewm
+            self.flags['divergence_top'] |= bool(last > macd_ewm and last > before)
+            self.flags['divergence_bottom'] |= bool(last < macd_ewm and last < before)
+        self.macd_ewm.append(macd_ewm)
+        if date is not None:
+            self.last_date = str(date)
+            self.last_close = float(close)
+        return self.flags
+
+    @property
+    def params(self):
+        return {'x': self.x, 'macd': (self.macd.fast, self.macd.slow, self.macd.signal),
+                'stoch': (self.stoch.fastk, self.stoch.slowk, self.stoch.slowd)}
+
+    @property
+    def trend_break(self):
+        return self.flags['trend_break_ma5'] or self.flags['trend_break_ma10']
+
+    @classmethod
+    def from_history(cls, stock_data, **params):
+        # 用历史 K 线预热一次（O(n)），之后只需逐根 update
+        monitor = cls(**params)
+        for date, high, low, close in zip(stock_data.index, stock_data['high'], stock_data['low'],
+                                          stock_data['close']):
+            monitor.update(float(high), float(low), float(close), date.date())
+        return monitor
+
+    def state(self):
+        return {
+            'x': self.x,
+            'macd': self.macd.state(),
+            'stoch': self.stoch.state(),
+            'ema_fast': self.ema_fast.state(),
+            'ema_slow': self.ema_slow.state(),
+            'ma': {str(window): average.state() for window, average in self.ma.items()},
+            'below_streak': {str(window): streak for window, streak in self.below_streak.items()},
+            'previous': self.previous,
+            'macd_ewm': list(self.macd_ewm),
+            'last_date': self.last_date,
+            'last_close': self.last_close,
+            'flags': self.flags,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        macd, stoch = state['macd'], state['stoch']
+        monitor = cls(state['x'], (macd['fast'], macd['slow'], macd['signal']),
+                      (stoch['fastk'], stoch['slowk'], stoch['slowd']))
+        monitor.macd = MACD.from_state(macd)
+        monitor.stoch = Stochastic.from_state(stoch)
+        monitor.ema_fast = EMA.from_state(state['ema_fast'])
+        monitor.ema_slow = EMA.from_state(state['ema_slow'])
+        monitor.ma = {int(window): RollingMean.from_state(average) for window, average in state['ma'].items()}
+        monitor.below_streak = {int(window): streak for window, streak in state['below_streak'].items()}
+        monitor.previous = state['previous']
+        monitor.macd_ewm.extend(state['macd_ewm'])
+        monitor.last_date = state['last_date']
+        monitor.last_close = state.get('last_close')
+        monitor.flags = state['flags']
+        return monitor
+
+
+def _history_changed(monitor, store, stock_code, interval):
+    # 除权除息后 append_tail 会重新下载整段前复权历史，已保存的指标状态还停留在旧的价格尺度上：
+    # 存储中 last_date 那根 K 线的收盘价和监控器记录的不一致（或这根 K 线不在了）时需要重新预热
+    if monitor.last_close is None:
+        return True
+    day = to_day(monitor.last_date)
+    _, bars = store.load_arrays(stock_code, interval, day, day)
+    return len(bars) == 0 or not math.isclose(bars[-1, BAR_FIELDS.index('close')], monitor.last_close,
+                                              rel_tol=1e-9, abs_tol=1e-9)
+
+
+def update_monitors(monitors, store, stock_codes, interval='daily', **params):
+    # 只把本地存储中比各自 last_date 更新的 K 线喂给监控器，没有监控器的代码用全部历史预热；
+    # 历史被重新复权过的代码按监控器原来的参数用全部历史重新预热
+    for stock_code in stock_codes:
+        monitor = monitors.get(stock_code)
+        if monitor is None or monitor.last_date is None:
+            monitors[stock_code] = SignalMonitor.from_history(store.load(stock_code, interval), **params)
+            continue
+        if _history_changed(monitor, store, stock_code, interval):
+            monitors[stock_code] = SignalMonitor.from_history(store.load(stock_code, interval), **monitor.params)
+            continue
+        dates, bars = store.load_arrays(stock_code, interval, to_day(monitor.last_date) + ONE_DAY)
+        for date, bar in zip(dates, bars):
+            monitor.update(bar[BAR_FIELDS.index('high')], bar[BAR_FIELDS.index('low')],
+                           bar[BAR_FIELDS.index('close')], date)
+    return monitors
+
+
+def save_monitors(monitors, path):
+    # NaN 按 JSON 扩展写出（Python 的 json 可以原样读回）
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({code: monitor.state() for code, monitor in monitors.items()}, f)
+
+
+def load_monitors(path):
+    with open(path, encoding='utf-8') as f:
+        return {code: SignalMonitor.from_state(state) for code, state in json.load(f).items()}
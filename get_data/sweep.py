@@ -0,0 +1,137 @@
+import itertools
+import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from get_data.indicators import DEFAULT_MACD, DEFAULT_STOCH, FeatureParts, build_features
+from get_data.predict_buy_revnue import StockStrategySimulator
+
+DEFAULT_PARAMS = {
+    'm': 5,
+    'x': 5,
+    'days': 10,
+    'macd_fast': 12,
+    'macd_slow': 26,
+    'macd_signal': 9,
+    'fastk': 9,
+    'slowk': 3,
+    'slowd': 3,
+}
+# 组装好的指标表只保留最近用到的几份：分量都缓存在 FeatureParts 里，重新组装一份不到一毫秒，
+# 全部保留的话一次上千组参数的搜索要占用上百 MB
+FEATURE_FRAMES = 8
+SIGNALS = ['golden_cross', 'trend_break', 'trend_start', 'divergence_top', 'divergence_bottom']
+
+
+def param_grid(**values):
+    # 网格搜索：每个参数给一个候选列表，没给的用默认值
+    names = list(DEFAULT_PARAMS)
+    choices = [list(values.get(name, [DEFAULT_PARAMS[name]])) for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*choices)]
+
+
+def random_params(n, seed=None, **values):
+    # 随机搜索：从每个参数的候选列表中独立抽样 n 组，去掉重复组合
+    rng = random.Random(seed)
+    grid = []
+    seen = set()
+    for _ in range(n):
+        params = {name: rng.choice(list(values[name])) if name in values else default
+                  for name, default in DEFAULT_PARAMS.items()}
+        key = tuple(params.values())
+        if key not in seen:
+            seen.add(key)
+            grid.append(params)
+    return grid
+
+
+class SeriesCache:
+    # 一个序列在整个参数搜索中共用的中间结果。指标表由 indicators.build_features 按 (MACD, KDJ) 参数组装，
+    # 但 EMA / MACD / STOCH / 均线分量、log_close 和未来收益都放在同一个 FeatureParts 里按各自的参数缓存；
+    # 统计直接调用 StockStrategySimulator 的分析方法，与 analyze_stock_frame 是同一套信号定义，
+    # 每个信号的统计只依赖部分参数，按这些参数缓存，参数组合再多也不会重复统计
+    def __init__(self, stock_data):
+        self.stock_data = stock_data
+        self.parts = FeatureParts(stock_data)
+        self._cache = {}
+        self._frames = OrderedDict()
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    def features(self, macd=DEFAULT_MACD, stoch=DEFAULT_STOCH):
+        key = (tuple(macd), tuple(stoch))
+        features = self._frames.get(key)
+        if features is None:
+            features = self._frames[key] = build_features(self.stock_data, macd=macd, stoch=stoch, parts=self.parts)
+            while len(self._frames) > FEATURE_FRAMES:
+                self._frames.popitem(last=False)
+        else:
+            self._frames.move_to_end(key)
+        return features
+
+    def evaluate(self, params):
+        m, x, days = params['m'], params['x'], params['days']
+        macd = (params['macd_fast'], params['macd_slow'], params['macd_signal'])
+        stoch = (params['fastk'], params['slowk'], params['slowd'])
+        stock_data = self.stock_data
+        analyzer = StockStrategySimulator
+        signals = {
+            'golden_cross': self._memo(('golden_cross', macd, stoch, m), lambda: analyzer.analyze_stock_data_macd_kdj(
+                stock_data, '', m=m, features=self.features(macd, stoch))),
+            'trend_break': self._memo(('trend_break', days), lambda: analyzer.analyze_trend_break(
+                stock_data, '', days=days, features=self.features())),
+            'trend_start': self._memo(('trend_start', x, m), lambda: analyzer.analyze_trend_start(
+                stock_data, x=x, m=m, features=self.features())),
+            # 背离只用到 ewm 版本 MACD 的快、慢线，信号线和 KDJ 取默认值，同一对快慢线只组装一份指标表
+            'divergence_top': self._memo(('divergence_top', macd[:2], m), lambda: analyzer.macd_divergence(
+                stock_data, m, features=self.features((*macd[:2], DEFAULT_MACD[2])), top=True)),
+            'divergence_bottom': self._memo(('divergence_bottom', macd[:2], m), lambda: analyzer.macd_divergence(
+                stock_data, m, features=self.features((*macd[:2], DEFAULT_MACD[2])), top=False)),
+        }
+
+        row = dict(params)
+        expectation = 0
+        for name in SIGNALS:
+            stats = signals[name]
+            row[f'{name}_signal'] = bool(stats.signal)
+            row[f'{name}_probability'] = stats.probability
+            row[f'{name}_mean'] = stats.mean
+            if stats.signal:
+                expectation += stats.probability * stats.mean
+        row['expectation'] = expectation / 100
+        row['should_buy'] = '否' if row['expectation'] < 0 else '是'
+        return row
+
+
+def sweep_frame(stock_data, grid):
+    cache = SeriesCache(stock_data)
+    return pd.DataFrame([cache.evaluate(params) for params in grid])
+
+
+def _sweep_code(task):
+    # 出错的代码返回一行错误信息，与 scan_universe 的 error 列一致
+    store, stock_code, interval, start_date, end_date, grid = task
+    try:
+        result = sweep_frame(store.load(stock_code, interval, start_date, end_date), grid)
+        result.insert(0, 'code', stock_code)
+        result['error'] = ''
+        return result
+    except Exception as e:
+        return pd.DataFrame([{'code': stock_code, 'error': str(e)}])
+
+
+def sweep(store, stock_codes, grid, interval='daily', start_date=None, end_date=None, max_workers=None):
+    # 按代码分发到进程池，每个进程内同一代码的所有参数组合共用 SeriesCache；数据需已拉取到本地
+    tasks = [(store, code, interval, start_date, end_date, grid) for code in stock_codes]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(_sweep_code, tasks))
+    if not results:
+        return pd.DataFrame()
+    result = pd.concat(results, ignore_index=True)
+    result.insert(1, 'interval', interval)
+    return result
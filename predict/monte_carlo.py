@@ -0,0 +1,127 @@
+import numbers
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from predict.profit_cal import calculate_profit, return_rates
+
+DEFAULT_PERCENTILES = (1, 5, 10, 25, 50, 75, 90, 95, 99)
+DEFAULT_SAMPLE_SIZE = 200_000
+
+
+class MarketModel(NamedTuple):
+    growth_mean: float = 3.0  # 房价年涨幅的中位数（%）
+    growth_vol: float = 8.0  # 房价年涨幅的波动率（对数收益率标准差，%）
+    rate_vol: float = 0.25  # 房贷利率每年重定价时的变动标准差（百分点）
+    rate_floor: float = 0.0
+    rent_growth_mean: float = 2.0  # 租金年涨幅的中位数（%）
+    rent_growth_vol: float = 3.0
+    vacancy_rate: float = 0.08  # 每个月空置的概率
+
+
+class MonteCarloResult(NamedTuple):
+    profit: np.ndarray  # 每条路径的收益（元），return_paths=False 时为 None
+    annual_return: np.ndarray  # 每条路径的年化收益率（%），return_paths=False 时为 None
+    percentiles: pd.DataFrame  # 各分位数的收益和年化收益率
+    probability_of_loss: float  # 收益为负的路径占比
+    mean_profit: float
+
+
+def _annual_factors(rng, median, vol, shape):
+    # 年增长倍数服从对数正态分布，中位数为 1 + median%，波动率为 0 时退化为确定的年涨幅
+    return np.exp(rng.normal(np.log1p(median / 100), vol / 100, shape))
+
+
+def _simulate_chunk(task):
+    # 一批路径：房价、利率、租金和空置按年抽样，再折算成 calculate_profit 的参数，
+    # 收益仍由 calculate_profit 计算，没有波动时与确定性结果一致
+    seed, n_paths, n_sample, return_paths, down_payment, first_pay_percentage, interest_rate, loan_term, \
+        years, zhuangxiu_cost, rent_yield, model = task
+    rng = np.random.default_rng(seed)
+    total_price = down_payment / first_pay_percentage
+
+    # 持有期内房价的累计涨幅（%）
+    expected_growth_rate = (np.prod(_annual_factors(rng, model.growth_mean, model.growth_vol, (n_paths, years)),
+                                    axis=1) - 1) * 100
+
+    # 利率第一年为签约利率，之后每年重定价一次；月供按持有期内的平均利率计算
+    shifts = rng.normal(0, model.rate_vol, (n_paths, years))
+    shifts[:, 0] = 0
+    rates = np.maximum(interest_rate + np.cumsum(shifts, axis=1), model.rate_floor)
+    effective_rate = rates.mean(axis=1)
+
+    # 租金每年调整，空置的月份没有租金；calculate_profit 需要的是持有期内的平均年租金
+    rent_level = _annual_factors(rng, model.rent_growth_mean, model.rent_growth_vol, (n_paths, years))
+    rent_level[:, 0] = 1
+    rent_level = np.cumprod(rent_level, axis=1)
+    occupancy = 1 - rng.binomial(12, model.vacancy_rate, (n_paths, years)) / 12
+    zujin_return = total_price * rent_yield * (rent_level * occupancy).mean(axis=1)
+
+    profit, _ = calculate_profit(down_payment, total_price, effective_rate, loan_term, years, zhuangxiu_cost,
+                                 zujin_return, expected_growth_rate)
+    _, annual_return = return_rates(profit, down_payment, years)
+    profit, annual_return = np.asarray(profit), np.asarray(annual_return)
+
+    # 只把汇总量和 n_sample 条路径的均匀抽样交回去，分位数由各批的抽样合起来计算
+    pick = rng.choice(n_paths, n_sample, replace=False) if n_sample < n_paths else slice(None)
+    paths = (profit, annual_return) if return_paths else None
+    return float(profit.sum()), int((profit < 0).sum()), profit[pick], annual_return[pick], paths
+
+
+def simulate_profit(down_payment, first_pay_percentage, interest_rate, loan_term, investment_years, zhuangxiu_cost,
+                    rent_yield, model=MarketModel(), n_paths=1_000_000, chunk_size=100_000, seed=None, processes=1,
+                    percentiles=DEFAULT_PERCENTILES, sample_size=DEFAULT_SAMPLE_SIZE, return_paths=False):
+    # 分批模拟 n_paths 条路径，中间数组的大小只和 chunk_size 有关；默认不保留每条路径的结果，
+    # 均值和亏损概率按批累加，分位数取自各批按路径数等比例抽出的共 sample_size 条路径（n_paths 不超过
+    # sample_size 时就是全部路径，结果是精确的），占用的内存与 n_paths 无关。
+    # 每批用 SeedSequence 派生的独立种子，同一个 seed 的结果与进程数、批的执行顺序无关
+    if isinstance(investment_years, bool) or not isinstance(investment_years, numbers.Integral) \
+            or investment_years < 1:
+        raise ValueError(f"investment_years must be a positive integer: {investment_years!r}")
+    n_chunks = -(-n_paths // chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_chunks)
+    # 第 index 批抽样的路径数：累计路径数按比例折算后取整再差分，总数正好是 min(sample_size, n_paths)
+    ends = np.minimum(np.arange(1, n_chunks + 1) * chunk_size, n_paths)
+    n_samples = np.diff(np.r_[0, ends * min(sample_size, n_paths) // n_paths])
+    tasks = [(seeds[index], min(chunk_size, n_paths - index * chunk_size), int(n_samples[index]), return_paths,
+              down_payment, first_pay_percentage, interest_rate, loan_term, int(investment_years), zhuangxiu_cost,
+              rent_yield, model)
+             for index in range(n_chunks)]
+
+    total = losses = 0
+    sample_profit, sample_return, paths = [], [], []
+    if processes > 1:
+        executor = ProcessPoolExecutor(max_workers=processes)
+        chunks = executor.map(_simulate_chunk, tasks)
+    else:
+        executor = None
+        chunks = map(_simulate_chunk, tasks)
+    try:
+        for chunk_total, chunk_losses, chunk_profit, chunk_return, chunk_paths in chunks:
+            total += chunk_total
+            losses += chunk_losses
+            sample_profit.append(chunk_profit)
+            sample_return.append(chunk_return)
+            if chunk_paths is not None:
+                paths.append(chunk_paths)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    table = pd.DataFrame({
+        'profit': np.percentile(np.concatenate(sample_profit), percentiles),
+        # 亏光首付的路径年化收益率按 -100% 计
+        'annual_return': np.percentile(np.nan_to_num(np.concatenate(sample_return), nan=-100.0), percentiles),
+    }, index=pd.Index(percentiles, name='percentile'))
+    profit = np.concatenate([chunk[0] for chunk in paths]) if return_paths else None
+    annual_return = np.concatenate([chunk[1] for chunk in paths]) if return_paths else None
+    return MonteCarloResult(profit, annual_return, table, losses / n_paths, total / n_paths)
+
+
+if __name__ == '__main__':
+    result = simulate_profit(down_payment=800000, first_pay_percentage=0.3, interest_rate=3.75, loan_term=30,
+                             investment_years=5, zhuangxiu_cost=5, rent_yield=0.014, seed=42, processes=4)
+    print(result.percentiles)
+    print(f"平均收益：{result.mean_profit / 10000:.2f}万元 亏损概率：{result.probability_of_loss * 100:.2f}%")
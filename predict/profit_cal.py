@@ -1,49 +1,147 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+class Scenario(NamedTuple):
+    profit: np.ndarray  # 收益（元）
+    total_give_bank: np.ndarray  # 投资期间交给银行的月供总额
+    total_return_rate: np.ndarray  # 总收益率（%，相对首付）
+    annual_return: np.ndarray  # 年化收益率（%），亏光首付时为 NaN
+
+
+class AmortizationSchedule(NamedTuple):
+    # 最后一维是月份（第 1 到第 months 个月）
+    payment: np.ndarray
+    principal: np.ndarray
+    interest: np.ndarray
+    balance: np.ndarray  # 当月还款后的剩余本金
+
+
+def monthly_payment(loan_amount, interest_rate, loan_term):
+    # 等额本息月供，利率为 0 时退化为本金平摊
+    loan_amount, interest_rate, loan_term = np.broadcast_arrays(
+        np.asarray(loan_amount, dtype=np.float64), np.asarray(interest_rate, dtype=np.float64),
+        np.asarray(loan_term, dtype=np.float64))
+    monthly_interest_rate = interest_rate / 12 / 100
+    number_of_payments = loan_term * 12  # 还的总月数
+    growth = (1 + monthly_interest_rate) ** number_of_payments
+    with np.errstate(invalid='ignore', divide='ignore'):
+        payment = loan_amount * monthly_interest_rate * growth / (growth - 1)
+    return np.where(monthly_interest_rate == 0, loan_amount / number_of_payments, payment)
+
+
 def calculate_profit(down_payment, total_price, interest_rate, loan_term, investment_years, zhuangxiu_cost, zujin_return, expected_growth_rate):
+    # 所有参数都可以是标量或可以互相广播的 NumPy 数组，一次算出整个网格
+    down_payment = np.asarray(down_payment, dtype=np.float64)
+    total_price = np.asarray(total_price, dtype=np.float64)
+    investment_years = np.asarray(investment_years, dtype=np.float64)
+    zhuangxiu_cost = np.asarray(zhuangxiu_cost, dtype=np.float64)
+
     # 计算贷款金额
     loan_amount = total_price - down_payment
 
     return_amount = loan_amount * investment_years / loan_term
 
     # 计算每月还款金额
-    monthly_interest_rate = interest_rate / 12 / 100
-    number_of_payments = loan_term * 12 # 还的总月数
-    monthly_payment = loan_amount * monthly_interest_rate * (1 + monthly_interest_rate) ** number_of_payments / \
-                      ((1 + monthly_interest_rate) ** number_of_payments - 1)
+    payment = monthly_payment(loan_amount, interest_rate, loan_term)
 
     money_time_value = down_payment * investment_years * 3 / 100
 
-    if investment_years <= 8:
-        zhejiu = zhuangxiu_cost * 0.1 * investment_years
-    else:
-        zhejiu = zhuangxiu_cost * 0.8
+    zhejiu = np.where(investment_years <= 8, zhuangxiu_cost * 0.1 * investment_years, zhuangxiu_cost * 0.8)
 
-    total_give_bank = monthly_payment * investment_years * 12 # 给银行交的月供
+    total_give_bank = payment * investment_years * 12  # 给银行交的月供
     # 计算贷款总利息
     total_interest = total_give_bank - return_amount
 
     # 计算房屋升值后的价值
-    future_value = total_price * (1 + expected_growth_rate / 100)
+    future_value = total_price * (1 + np.asarray(expected_growth_rate) / 100)
 
-    all_zujin_return = zujin_return * investment_years
+    all_zujin_return = np.asarray(zujin_return) * investment_years
 
     # 计算收益
-    return future_value + all_zujin_return - total_price - total_interest - zhejiu - money_time_value, total_give_bank
-
-# 示例用法
-down_payment = 800000 # 首付
-first_pay_percentage = 0.3 # 首付比例
-total_price =  down_payment / first_pay_percentage # 总价
-interest_rate = 3.75 # 房贷利率
-loan_term = 30  # 贷款年限
-investment_years = 2  # 收益年份
-expected_growth_rate = 40  # 预期涨幅
-zhuangxiu_cost = 5 # 装修花费
-zujin_return = total_price * 0.014 # 租售比
-
-for i in range(-30, 250, 5):
-    expected_growth_rate = i
-    profit, total_give_bank = calculate_profit(down_payment, total_price, interest_rate, loan_term, investment_years, zhuangxiu_cost, zujin_return, expected_growth_rate)
-    total_return_rate = float(profit) * 100.0 / down_payment
-    annual_return = ((1 + total_return_rate / 100) ** (1 / investment_years)) - 1
-
-    print(f"首付{down_payment/10000}万 投资{investment_years}年 期间交月供共{total_give_bank:.2f}元 每个月还{total_give_bank/(investment_years*12):.2f}元 期间涨幅{expected_growth_rate}%  收益：{int(profit/10000)}万元 收益率:{total_return_rate:.2f}% 年化收益率:{annual_return*100:.2f}%")
\ No newline at end of file
+    profit = future_value + all_zujin_return - total_price - total_interest - zhejiu - money_time_value
+    if profit.ndim == 0:
+        return float(profit), float(total_give_bank)
+    return profit, total_give_bank
+
+
+def return_rates(profit, down_payment, investment_years):
+    # 总收益率和年化收益率（%），亏光首付时年化收益率为 NaN
+    total_return_rate = np.asarray(profit) * 100.0 / down_payment
+    with np.errstate(invalid='ignore'):
+        annual_return = ((1 + total_return_rate / 100) ** (1 / np.asarray(investment_years, dtype=np.float64)) - 1) * 100
+    return total_return_rate, annual_return
+
+
+def scenario_grid(down_payment, first_pay_percentage, interest_rate, loan_term, investment_years,
+                  expected_growth_rate, rent_yield, zhuangxiu_cost):
+    # 以首付、首付比例、租售比（年租金 / 总价）描述一套房，参数可互相广播；返回的数组都是广播后的形状
+    inputs = [np.asarray(value, dtype=np.float64) for value in (
+        down_payment, first_pay_percentage, interest_rate, loan_term, investment_years,
+        expected_growth_rate, rent_yield, zhuangxiu_cost)]
+    shape = np.broadcast_shapes(*[value.shape for value in inputs])
+    down_payment, first_pay_percentage, interest_rate, loan_term, investment_years, \
+        expected_growth_rate, rent_yield, zhuangxiu_cost = inputs
+    total_price = down_payment / first_pay_percentage  # 总价
+    zujin_return = total_price * rent_yield  # 每年租金
+    profit, total_give_bank = calculate_profit(down_payment, total_price, interest_rate, loan_term,
+                                               investment_years, zhuangxiu_cost, zujin_return, expected_growth_rate)
+    profit, total_give_bank = np.broadcast_to(profit, shape), np.broadcast_to(total_give_bank, shape)
+    total_return_rate, annual_return = return_rates(profit, down_payment, investment_years)
+    return Scenario(profit, total_give_bank, total_return_rate, annual_return)
+
+
+def scenario_surface(**axes):
+    # 每个参数给一维取值，按参数顺序展开成网格（稀疏网格，不复制数据）再计算，
+    # 例如 scenario_surface(down_payment=[800000], first_pay_percentage=[0.3], interest_rate=np.linspace(3, 5, 201), ...)
+    names = ['down_payment', 'first_pay_percentage', 'interest_rate', 'loan_term', 'investment_years',
+             'expected_growth_rate', 'rent_yield', 'zhuangxiu_cost']
+    grids = np.meshgrid(*[np.atleast_1d(np.asarray(axes[name], dtype=np.float64)) for name in names],
+                        indexing='ij', sparse=True)
+    return scenario_grid(*grids)
+
+
+def amortization_schedule(loan_amount, interest_rate, loan_term, months=None):
+    # 等额本息的逐月还款计划，用闭式公式一次算出所有月份：第 k 个月还款后的剩余本金
+    # balance_k = L(1+r)^k - P((1+r)^k - 1)/r；参数可以是数组，月份在最后一维
+    loan_amount = np.asarray(loan_amount, dtype=np.float64)[..., None]
+    interest_rate = np.asarray(interest_rate, dtype=np.float64)[..., None]
+    loan_term = np.asarray(loan_term, dtype=np.float64)[..., None]
+    if months is None:
+        months = int(np.max(loan_term) * 12)
+    month = np.arange(months + 1, dtype=np.float64)
+    monthly_interest_rate = interest_rate / 12 / 100
+    payment = monthly_payment(loan_amount, interest_rate, loan_term)
+    growth = (1 + monthly_interest_rate) ** month
+    with np.errstate(invalid='ignore', divide='ignore'):
+        balance = loan_amount * growth - payment * (growth - 1) / monthly_interest_rate
+    balance = np.where(monthly_interest_rate == 0, loan_amount - payment * month, balance)
+    # 贷款年限较短的情况下，还清之后的月份记为 0
+    paid_off = month >= loan_term * 12
+    balance = np.where(paid_off, 0.0, balance)
+    interest = balance[..., :-1] * monthly_interest_rate
+    principal = balance[..., :-1] - balance[..., 1:]
+    # 第 loan_term * 12 个月是最后一期，照常还款，之后的月份才不再还款
+    payment = np.where(month[1:] > loan_term * 12, 0.0, np.broadcast_to(payment, principal.shape))
+    return AmortizationSchedule(payment, principal, interest, balance[..., 1:])
+
+
+if __name__ == '__main__':
+    # 示例用法
+    down_payment = 800000  # 首付
+    first_pay_percentage = 0.3  # 首付比例
+    interest_rate = 3.75  # 房贷利率
+    loan_term = 30  # 贷款年限
+    investment_years = 2  # 收益年份
+    zhuangxiu_cost = 5  # 装修花费
+    rent_yield = 0.014  # 租售比
+
+    # 预期涨幅的所有情景一次算完
+    expected_growth_rate = np.arange(-30, 250, 5)
+    scenario = scenario_grid(down_payment, first_pay_percentage, interest_rate, loan_term, investment_years,
+                             expected_growth_rate, rent_yield, zhuangxiu_cost)
+
+    for i, growth in enumerate(expected_growth_rate):
+        total_give_bank = scenario.total_give_bank[i]
+        print(f"首付{down_payment/10000}万 投资{investment_years}年 期间交月供共{total_give_bank:.2f}元 每个月还{total_give_bank/(investment_years*12):.2f}元 期间涨幅{growth}%  收益：{int(scenario.profit[i]/10000)}万元 收益率:{scenario.total_return_rate[i]:.2f}% 年化收益率:{scenario.annual_return[i]:.2f}%")
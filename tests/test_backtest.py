@@ -0,0 +1,117 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from get_data.backtest import CostModel, factor_matrix, load_adjust_factors, simulate
+from get_data.fake_baostock import FakeBaostock
+from get_data.session import BaostockSession
+
+NAN = np.nan
+CODE = 'sh.600000'
+
+
+def run(opens, entry=(), exit_=(), closes=None, cash=10_000, factors=None, cost_model=CostModel()):
+    # 单个代码的价格路径；entry / exit_ 为出现信号的 K 线序号（收盘后确认，下一根 K 线开盘成交）
+    opens = np.asarray(opens, dtype=np.float64)[:, None]
+    closes = opens if closes is None else np.asarray(closes, dtype=np.float64)[:, None]
+    dates = pd.bdate_range('2024-01-01', periods=len(opens)).to_numpy(dtype='datetime64[D]')
+    entry_mask = np.zeros(opens.shape, dtype=bool)
+    exit_mask = np.zeros(opens.shape, dtype=bool)
+    entry_mask[list(entry), 0] = True
+    exit_mask[list(exit_), 0] = True
+    if factors is not None:
+        factors = np.asarray(factors, dtype=np.float64)[:, None]
+    return simulate(dates, [CODE], opens, closes, entry_mask, exit_mask, cash, cost_model, factors)
+
+
+def trade_rows(result):
+    return [(result.positions.index.get_loc(row.date), row.shares, row.price) for row in result.trades.itertuples()]
+
+
+def test_round_trip_with_lots_and_costs():
+    result = run([10, 10, 11, 11], entry=[0], exit_=[1])
+    # 买入：10000 / (10 × 1.00026) = 999.7 股，按整手取 900 股；
+    # 佣金 9000 × 0.025% = 2.25 不足 5 元按 5 元收，过户费 0.09，不收印花税
+    # 卖出：佣金同样按 5 元收，过户费 0.099，印花税 9900 × 0.05% = 4.95
+    assert trade_rows(result) == [(1, 900, 10.0), (2, -900, 11.0)]
+    assert result.trades['cost'].tolist() == pytest.approx([5.09, 10.049])
+    assert result.equity.iloc[-1] == pytest.approx(10_000 - 9000 - 5.09 + 9900 - 10.049)
+    assert result.summary['costs'] == pytest.approx(15.139)
+    assert result.positions[CODE].tolist() == [0, 900, 0, 0]
+
+
+def test_commission_above_the_minimum():
+    result = run([10, 10, 10], entry=[0], cash=1_000_000)
+    # 1000000 / 10.0026 = 99974 股，取整到 99900 股；佣金 999000 × 0.025% = 249.75
+    assert trade_rows(result) == [(1, 99900, 10.0)]
+    assert result.trades['cost'].iloc[0] == pytest.approx(249.75 + 9.99)
+
+
+def test_sells_wait_until_the_bar_after_the_buy():
+    # 买入当根 K 线收盘就出现卖出信号，也只能在下一根 K 线卖出（T+1）
+    result = run([10, 10, 10, 10], entry=[0], exit_=[1])
+    assert [row[0] for row in trade_rows(result)] == [1, 2]
+    # 同一根 K 线同时出现买入和卖出信号时不买入
+    assert run([10, 10, 10], entry=[0], exit_=[0]).trades.empty
+
+
+def test_orders_carry_over_suspensions():
+    result = run([10, NAN, NAN, 12, 12, NAN, 13], entry=[0], exit_=[4],
+                 closes=[10, NAN, NAN, 12, 12, NAN, 13])
+    assert trade_rows(result) == [(3, 800, 12.0), (6, -800, 13.0)]
+    # 停牌期间按最近的收盘价估值
+    assert result.code_equity[CODE].iloc[5] == result.code_equity[CODE].iloc[4]
+
+
+def test_sell_then_buy_on_the_same_bar():
+    # 卖单因停牌顺延期间出现新的买入信号：复牌时先卖出，再用卖出后的全部现金买入
+    result = run([10, 10, 10, NAN, 12], entry=[0, 3], exit_=[2], closes=[10, 10, 10, NAN, 12])
+    assert trade_rows(result) == [(1, 900, 10.0), (4, -900, 12.0), (4, 900, 12.0)]
+    sell_cash = 10_000 - 9000 - 5.09 + 10800 - (5 + 0.108 + 5.4)
+    assert result.equity.iloc[-1] == pytest.approx(sell_cash - 10800 - 5.108 + 900 * 12)
+
+
+def test_unaffordable_buy_is_dropped():
+    result = run([10, 200, 10], entry=[0], cash=10_000)
+    # 一手 20000 元买不起，委托作废，不会在之后的 K 线成交
+    assert result.trades.empty
+    assert result.equity.iloc[-1] == 10_000
+
+
+def test_ex_dividend_credits_cash():
+    # 第 3 根 K 线除权除息，后复权因子从 1 变为 1 / 0.95，不复权价格从 10 降到 9.5
+    factors = [1, 1, 1, 1 / 0.95, 1 / 0.95]
+    result = run([10, 10, 10, 9.5, 9.5], entry=[0], factors=factors)
+    assert result.summary['corporate_actions'] == pytest.approx(900 * 9.5 * (1 / 0.95 - 1))
+    # 分红折算成现金后净值不因除权除息变化
+    assert result.code_equity[CODE].iloc[3] == pytest.approx(result.code_equity[CODE].iloc[2])
+
+
+def test_ex_dividend_on_a_suspended_bar_is_deferred():
+    factors = [1, 1, 1, 1 / 0.95, 1 / 0.95]
+    result = run([10, 10, 10, NAN, 9.5], entry=[0], factors=factors, closes=[10, 10, 10, NAN, 9.5])
+    assert result.code_equity[CODE].iloc[3] == pytest.approx(result.code_equity[CODE].iloc[2])
+    assert result.code_equity[CODE].iloc[4] == pytest.approx(result.code_equity[CODE].iloc[2])
+
+
+def test_factors_from_the_fake_source():
+    fake = FakeBaostock(codes=[CODE])
+    fake.ex_dividend(CODE, '2024-01-04', 0.95)
+    fake.ex_dividend(CODE, '2024-01-08', 0.9)
+    session = BaostockSession(client=fake, backoff=0)
+    factors = load_adjust_factors([CODE], session)
+    session.close()
+
+    dates = pd.bdate_range('2024-01-02', '2024-01-09').to_numpy(dtype='datetime64[D]')
+    matrix = factor_matrix(dates, [CODE], factors)[:, 0]
+    assert matrix == pytest.approx([1, 1, 1 / 0.95, 1 / 0.95, 1 / 0.95 / 0.9, 1 / 0.95 / 0.9], rel=1e-5)
+
+    # 不复权价格从除权日起下跌，持仓按除权日开盘价和因子的变化收到现金，净值 = 股票市值 + 现金
+    unadjusted = fake.series(CODE).loc['2024-01-02':'2024-01-09', 'open'].to_numpy() / matrix
+    free = CostModel(commission=0, min_commission=0, stamp_duty=0, transfer_fee=0)
+    result = run(unadjusted, entry=[0], factors=matrix, cost_model=free, cash=1_000_000)
+    held = result.positions[CODE].iloc[-1]
+    credits = held * (unadjusted[2] * (matrix[2] / matrix[1] - 1) + unadjusted[4] * (matrix[4] / matrix[3] - 1))
+    assert result.summary['corporate_actions'] == pytest.approx(credits)
+    gain = result.code_equity[CODE].iloc[-1] - result.code_equity[CODE].iloc[1]
+    assert gain == pytest.approx(held * (unadjusted[-1] - unadjusted[1]) + credits)
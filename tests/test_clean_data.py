@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+
+from get_data.bar_store import BAR_FIELDS, BarStore
+from get_data.clean_data import compact_csv_cache
+from get_data.fake_baostock import FakeBaostock
+
+CODE = 'sh.600000'
+
+
+@pytest.fixture
+def series():
+    return FakeBaostock(codes=[CODE]).series(CODE)[BAR_FIELDS].loc['2020-01-01':'2020-12-31']
+
+
+@pytest.fixture
+def directory(tmp_path):
+    path = tmp_path / 'stock'
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BarStore(str(tmp_path / 'bars'))
+
+
+def write_csv(directory, series, start, end, scale=1.0):
+    # 旧版缓存：文件名里的区间和下载当时的前复权价格（scale 模拟之后发生的除权除息）
+    name = f"{CODE}_daily_{start}_{end}.csv"
+    (series.loc[start:end] * scale).to_csv(directory / name, index_label='date')
+    return name
+
+
+def stored(store):
+    dates, bars = store.load_arrays(CODE, 'daily')
+    return [str(day) for day in store.coverage(CODE, 'daily')], dates, bars
+
+
+def test_overlapping_files_of_the_same_vintage_are_merged(directory, store, series):
+    write_csv(directory, series, '2020-01-01', '2020-06-30')
+    write_csv(directory, series, '2020-06-01', '2020-12-31')
+    assert compact_csv_cache(str(directory), store) == {'merged': 2, 'kept': 0, 'objects': 1}
+    assert os.listdir(directory) == []
+    coverage, dates, bars = stored(store)
+    assert coverage == ['2020-01-01', '2020-12-31']
+    assert np.allclose(bars, series.to_numpy())
+
+
+def test_older_vintage_is_kept_on_disk(directory, store, series):
+    # 旧文件下载之后发生过除权除息：重叠日期上的价格对不上，不能拼在新文件前面
+    old = write_csv(directory, series, '2020-01-01', '2020-06-30', scale=1.1)
+    write_csv(directory, series, '2020-06-01', '2020-12-31')
+    assert compact_csv_cache(str(directory), store) == {'merged': 1, 'kept': 1, 'objects': 1}
+    assert os.listdir(directory) == [old]
+    coverage, dates, bars = stored(store)
+    assert coverage == ['2020-06-01', '2020-12-31']
+    assert np.allclose(bars, series.loc['2020-06-01':].to_numpy())
+
+
+def test_files_meeting_the_store_are_checked(directory, store, series):
+    part = series.loc['2020-06-01':]
+    store.write(CODE, 'daily', part.index.to_numpy(dtype='datetime64[D]'), part.to_numpy(), '2020-06-01', '2020-12-31')
+    stale = write_csv(directory, series, '2020-01-01', '2020-06-30', scale=0.9)
+    assert compact_csv_cache(str(directory), store) == {'merged': 0, 'kept': 1, 'objects': 0}
+    assert os.listdir(directory) == [stale]
+    assert stored(store)[0] == ['2020-06-01', '2020-12-31']
+
+    os.remove(directory / stale)
+    write_csv(directory, series, '2020-01-01', '2020-06-30')
+    assert compact_csv_cache(str(directory), store) == {'merged': 1, 'kept': 0, 'objects': 1}
+    coverage, dates, bars = stored(store)
+    assert coverage == ['2020-01-01', '2020-12-31']
+    assert np.allclose(bars, series.to_numpy())
+
+
+def test_files_without_a_common_bar_are_kept(directory, store, series):
+    # 首尾相接但没有共同的 K 线，无法校验复权价格
+    adjacent = write_csv(directory, series, '2020-01-01', '2020-05-31')
+    write_csv(directory, series, '2020-06-01', '2020-12-31')
+    assert compact_csv_cache(str(directory), store) == {'merged': 1, 'kept': 1, 'objects': 1}
+    assert os.listdir(directory) == [adjacent]
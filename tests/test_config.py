@@ -0,0 +1,20 @@
+import os
+
+from get_data import config
+
+
+def test_source_checkout_uses_the_repository_data_directory():
+    assert config.DEFAULT_DATA_DIR == os.path.join(config.PACKAGE_ROOT, 'data')
+
+
+def test_installed_package_uses_the_user_data_directory(tmp_path):
+    # 普通安装时包的上一级是 site-packages，没有 pyproject.toml
+    site_packages = tmp_path / 'site-packages'
+    (site_packages / 'get_data').mkdir(parents=True)
+    assert config.default_data_dir(str(site_packages)) == config.USER_DATA_DIR
+    assert not config.USER_DATA_DIR.startswith(str(site_packages))
+
+
+def test_environment_overrides_the_default(tmp_path, monkeypatch):
+    monkeypatch.setenv(config.DATA_DIR_ENV, str(tmp_path))
+    assert config.data_path('bars') == os.path.join(str(tmp_path), 'bars')
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from get_data.bar_store import BAR_FIELDS
+from get_data.fake_baostock import FakeBaostock
+from get_data.predict_buy_revnue import StockStrategySimulator
+from get_data.result_cache import ResultCache
+
+CODE = 'sh.600000'
+KEY = (CODE, 'daily')
+
+
+@pytest.fixture(scope='module')
+def stock_data():
+    return FakeBaostock(codes=[CODE]).series(CODE)[BAR_FIELDS].iloc[-1500:]
+
+
+def re_adjusted(stock_data):
+    # 除权除息后重新下载的前复权历史：长度、首尾日期和最后的收盘价都不变，更早的价格整体缩放
+    result = stock_data.copy()
+    result.iloc[:-50] *= 0.7
+    return result
+
+
+def means(decision):
+    return {name: stats.mean for name, stats in decision.signals.items()}
+
+
+@pytest.mark.parametrize('use_result_cache', [False, True])
+def test_re_adjusted_history_is_recomputed(stock_data, tmp_path, monkeypatch, use_result_cache):
+    cache = ResultCache(str(tmp_path / 'results.sqlite')) if use_result_cache else None
+    monkeypatch.setattr(StockStrategySimulator, 'result_cache', cache)
+    before = StockStrategySimulator.analyze_stock_frame(stock_data, cache_key=KEY)
+
+    adjusted = re_adjusted(stock_data)
+    after = StockStrategySimulator.analyze_stock_frame(adjusted, cache_key=KEY)
+    expected = StockStrategySimulator.analyze_stock_frame(adjusted)
+    assert means(after) == pytest.approx(means(expected), nan_ok=True)
+    assert means(after) != pytest.approx(means(before), nan_ok=True)
+    if cache is not None:
+        # 磁盘缓存里存下的也是按新历史计算的结果
+        cached = StockStrategySimulator.analyze_stock_frame(adjusted, cache_key=KEY)
+        assert means(cached) == pytest.approx(means(expected), nan_ok=True)
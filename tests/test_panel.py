@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from get_data.bar_store import BAR_FIELDS, BarStore
+from get_data.fake_baostock import FakeBaostock
+from get_data.panel import analyze_panel, load_panel
+from get_data.predict_buy_revnue import StockStrategySimulator
+
+CODES = ['sh.600000', 'sh.600001', 'sh.600002', 'sz.000001', 'sz.000002', 'sz.000003']
+START, END = '2015-01-01', '2020-12-31'
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    # 各代码上市日期不同；其中一只股票随机停牌若干天，检验停牌时的对齐
+    store = BarStore(str(tmp_path_factory.mktemp('bars')))
+    fake = FakeBaostock(codes=CODES)
+    rng = np.random.default_rng(0)
+    for index, code in enumerate(CODES):
+        series = fake.series(code).loc[START:END]
+        if index == 1:
+            series = series[rng.random(len(series)) > 0.1]
+        dates = series.index.to_numpy(dtype='datetime64[D]')
+        store.write(code, 'daily', dates, series[BAR_FIELDS].to_numpy(), START, END)
+    return store
+
+
+@pytest.fixture
+def simulator(store, monkeypatch):
+    monkeypatch.setattr(StockStrategySimulator, 'bar_store', store)
+    monkeypatch.setattr(StockStrategySimulator, 'result_cache', None)
+    return StockStrategySimulator
+
+
+@pytest.mark.parametrize('m', [5, 10])
+def test_panel_matches_analyze_should_follow(store, simulator, m):
+    result = analyze_panel(load_panel(store, CODES, 'daily', START, END), m=m)
+    for code in CODES:
+        decision = simulator.analyze_should_follow(code, m, code, 'daily', START, END)
+        row = result.loc[code]
+        assert row['should_buy'] == decision.should_buy
+        assert row['expectation'] == pytest.approx(decision.expectation, nan_ok=True)
+        for name, stats in decision.signals.items():
+            assert bool(row[f'{name}_signal']) == stats.signal
+            assert row[f'{name}_probability'] == pytest.approx(stats.probability)
+            assert row[f'{name}_mean'] == pytest.approx(stats.mean, nan_ok=True)
+
+
+def test_missing_code_does_not_fail_the_chunk(store):
+    codes = CODES[:2] + ['sh.688999'] + CODES[2:]
+    panel = load_panel(store, codes, 'daily', START, END)
+    assert list(panel.errors) == ['sh.688999']
+    assert not panel.present[:, 2].any()
+
+    result = analyze_panel(panel, m=5)
+    expected = analyze_panel(load_panel(store, CODES, 'daily', START, END), m=5)
+    assert result.drop(index='sh.688999').equals(expected)
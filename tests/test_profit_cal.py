@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from predict.profit_cal import amortization_schedule, monthly_payment
+
+
+@pytest.mark.parametrize('interest_rate', [3.6, 0.0])
+def test_payments_equal_principal_plus_interest(interest_rate):
+    schedule = amortization_schedule(120000, interest_rate, 1)
+    assert np.allclose(schedule.payment, schedule.principal + schedule.interest)
+    assert schedule.payment.sum() == pytest.approx(monthly_payment(120000, interest_rate, 1) * 12)
+    assert schedule.principal.sum() == pytest.approx(120000)
+    assert schedule.balance[-1] == 0
+
+
+def test_shorter_terms_stop_after_the_last_payment():
+    # 30 年的计划里，10 年期贷款第 120 个月还最后一期，之后都是 0
+    terms = np.array([10, 30])
+    schedule = amortization_schedule(1_000_000, 4.1, terms)
+    assert np.allclose(schedule.payment, schedule.principal + schedule.interest)
+    assert np.allclose(schedule.payment.sum(axis=-1), monthly_payment(1_000_000, 4.1, terms) * terms * 12)
+    assert schedule.payment[0, 119] > 0
+    assert not schedule.payment[0, 120:].any()
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+
+from get_data.bar_store import BAR_FIELDS, BarStore
+from get_data.clean_data import compact_csv_cache
+from get_data.fake_baostock import FakeBaostock
+from get_data.resample import DerivedBarStore, resample_bars
+
+CODE = 'sh.600000'
+
+
+def daily(start, end):
+    series = FakeBaostock(codes=[CODE]).series(CODE).loc[start:end]
+    return series, series.index.to_numpy(dtype='datetime64[D]'), series[BAR_FIELDS].to_numpy()
+
+
+def test_trailing_partial_period_is_dropped():
+    # 2020-06-17 是周三：当周和当月都还没走完
+    _, dates, bars = daily('2020-01-01', '2020-06-17')
+    weeks, _ = resample_bars(dates, bars, 'weekly', complete_through='2020-06-17')
+    months, _ = resample_bars(dates, bars, 'monthly', complete_through='2020-06-17')
+    assert str(weeks[-1]) == '2020-06-12'
+    assert str(months[-1]) == '2020-05-29'
+    # 覆盖到周五后这一周就完整了
+    weeks, _ = resample_bars(dates, bars, 'weekly', complete_through='2020-06-19')
+    assert str(weeks[-1]) == '2020-06-17'
+
+
+def test_derived_store_uses_daily_coverage(tmp_path):
+    _, dates, bars = daily('2020-01-01', '2020-06-17')
+    store = DerivedBarStore(str(tmp_path))
+    store.write(CODE, 'daily', dates, bars, '2020-01-01', '2020-06-17')
+    assert str(store.last_bar(CODE, 'weekly')[0]) == '2020-06-12'
+    store.write(CODE, 'daily', dates, bars, '2020-01-01', '2020-06-30')
+    assert str(store.last_bar(CODE, 'weekly')[0]) == '2020-06-17'
+    assert str(store.last_bar(CODE, 'monthly')[0]) == '2020-06-17'
+
+
+def test_compact_leaves_weekly_and_monthly_csvs(tmp_path):
+    series, _, _ = daily('2020-01-01', '2020-03-31')
+    directory = tmp_path / 'stock'
+    directory.mkdir()
+    names = [f"{CODE}_{interval}_2020-01-01_2020-03-31.csv" for interval in ('daily', 'weekly', 'monthly')]
+    for name in names:
+        series.to_csv(directory / name, index_label='date')
+    store = BarStore(str(tmp_path / 'bars'))
+    assert compact_csv_cache(str(directory), store) == {'merged': 1, 'kept': 2, 'objects': 1}
+    assert sorted(os.listdir(directory)) == sorted(names[1:])
+    assert store.coverage(CODE, 'weekly') is None
+    assert np.allclose(store.load_arrays(CODE, 'daily')[1], series[BAR_FIELDS].to_numpy())
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+
+from get_data.fake_baostock import BAD_CODE, NETWORK_ERROR, FakeBaostock
+from get_data.session import BaostockError, BaostockSession
+
+FIELDS = "date,code,open,high,low,close"
+
+
+@pytest.fixture
+def fake():
+    return FakeBaostock(n_codes=4)
+
+
+@pytest.fixture
+def session(fake):
+    session = BaostockSession(client=fake, retries=3, backoff=0)
+    yield session
+    session.close()
+
+
+def query(session, code='sh.600000'):
+    return session.query('query_history_k_data', code=code, fields=FIELDS, start_date='2024-01-01',
+                         end_date='2024-01-31', frequency='d', adjustflag='2')
+
+
+def test_network_errors_are_retried(session, fake):
+    fake.fail_next(2)
+    result = query(session)
+    assert len(result) > 0
+    assert len(fake.calls) == 3
+
+
+def test_gives_up_after_retries(session, fake):
+    fake.fail_next(10)
+    with pytest.raises(BaostockError) as error:
+        query(session)
+    assert error.value.error_code == NETWORK_ERROR
+    assert len(fake.calls) == 4
+
+
+def test_permanent_errors_are_not_retried(fake):
+    session = BaostockSession(client=fake, retries=3, backoff=10)
+    start = time.monotonic()
+    with pytest.raises(BaostockError) as error:
+        query(session, code='hk.0700')
+    session.close()
+    assert error.value.error_code == BAD_CODE
+    assert len(fake.calls) == 1
+    assert time.monotonic() - start < 1
+
+
+def test_expired_session_logs_in_again(session, fake):
+    query(session)
+    assert fake.logins == 1
+    fake.expire()
+    result = query(session)
+    assert len(result) > 0
+    assert fake.logins == 2
+    assert len(fake.calls) == 3
+
+
+def test_connection_errors_log_in_again(session, fake):
+    original = fake.query_history_k_data
+    failures = [ConnectionResetError('reset'), EOFError()]
+
+    def flaky(**kwargs):
+        if failures:
+            raise failures.pop(0)
+        return original(**kwargs)
+
+    fake.query_history_k_data = flaky
+    result = query(session)
+    assert len(result) > 0
+    assert fake.logins == 3
+
+
+def test_close_logs_out(fake):
+    session = BaostockSession(client=fake)
+    query(session)
+    assert fake.logged_in
+    session.close()
+    assert not fake.logged_in
+
+
+def test_map_keeps_input_order():
+    session = BaostockSession(client=FakeBaostock(n_codes=4), workers=4)
+
+    def work(item):
+        time.sleep(0.001 * (item % 5))
+        return item, threading.current_thread().name
+
+    results = session.map(work, range(40))
+    session.close()
+    assert [item for item, _ in results] == list(range(40))
+    assert len({thread for _, thread in results}) > 1
+
+
+def test_imap_keeps_input_order_with_a_small_queue():
+    session = BaostockSession(client=FakeBaostock(n_codes=4), workers=3, queue_size=2)
+    assert list(session.imap(lambda item: item * 2, range(25))) == [item * 2 for item in range(25)]
+    session.close()
+
+
+def test_map_raises_the_failing_item(session):
+    done = []
+
+    def work(item):
+        if item == 3:
+            raise ValueError(item)
+        done.append(item)
+        return item
+
+    with pytest.raises(ValueError):
+        session.map(work, range(6))
+    # 其它任务照常执行完
+    assert sorted(done) == [0, 1, 2, 4, 5]
+
+
+def test_imap_yields_results_before_the_failing_item(session):
+    def work(item):
+        if item == 3:
+            raise ValueError(item)
+        return item
+
+    results = session.imap(work, range(6))
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ValueError):
+        next(results)
+
+
+def test_query_many_with_a_bad_code(session, fake):
+    results = session.query_many('query_history_k_data', [
+        dict(code=code, fields=FIELDS, start_date='2024-01-01', end_date='2024-01-31', frequency='d',
+             adjustflag='2') for code in ('sh.600000', 'hk.0700')])
+    assert len(next(results)) > 0
+    with pytest.raises(BaostockError):
+        next(results)
+
+
+def test_nested_submit_runs_on_the_worker(session):
+    assert session.submit(lambda: session.submit(lambda: 42).result()).result(timeout=5) == 42
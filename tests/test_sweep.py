@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from get_data.bar_store import BarStore
+from get_data.indicators import build_features, future_returns
+from get_data.fake_baostock import FakeBaostock
+from get_data.predict_buy_revnue import StockStrategySimulator
+from get_data.sweep import SeriesCache, _sweep_code, param_grid, sweep_frame
+
+
+@pytest.fixture(scope='module')
+def stock_data():
+    return FakeBaostock(codes=['sh.600000']).series('sh.600000')[['open', 'high', 'low', 'close']].iloc[-1500:]
+
+
+@pytest.mark.parametrize('m', [3, 5, 20])
+def test_sweep_matches_analyze_stock_frame(stock_data, m):
+    row = sweep_frame(stock_data, param_grid(m=[m])).iloc[0]
+    decision = StockStrategySimulator.analyze_stock_frame(stock_data, m=m)
+    assert row['expectation'] == pytest.approx(decision.expectation, nan_ok=True)
+    assert row['should_buy'] == decision.should_buy
+    for name, stats in decision.signals.items():
+        assert row[f'{name}_signal'] == stats.signal
+        assert row[f'{name}_probability'] == pytest.approx(stats.probability)
+        assert row[f'{name}_mean'] == pytest.approx(stats.mean, nan_ok=True)
+
+
+def test_sweep_varies_indicator_parameters(stock_data):
+    result = sweep_frame(stock_data, param_grid(macd_fast=[8, 12], fastk=[5, 9]))
+    assert len(result) == 4
+    assert result['golden_cross_probability'].nunique() > 1
+    assert np.isfinite(result['expectation']).all()
+
+
+def test_feature_sets_share_components(stock_data):
+    cache = SeriesCache(stock_data)
+    cache.evaluate(param_grid(fastk=[5], m=[7])[0])
+    cache.evaluate(param_grid(fastk=[14], m=[7])[0])
+    cache.evaluate(param_grid(macd_signal=[5], m=[7])[0])
+    # 只改 KDJ 参数不重算 MACD，只改 MACD 信号线不重算 STOCH 和 EMA
+    kinds = [key[0] for key in cache.parts._cache]
+    assert kinds.count('macd') == 2
+    assert kinds.count('stoch') == 3
+    assert kinds.count('ema') == 2
+    # 不同参数的指标表共用同一份未来收益
+    first, second = cache.features(stoch=(5, 3, 3)), cache.features(stoch=(14, 3, 3))
+    assert future_returns(first, 7) is future_returns(second, 7)
+    expected = build_features(stock_data, stoch=(14, 3, 3))
+    assert second.equals(expected)
+
+
+def test_failed_code_returns_an_error_row(tmp_path):
+    result = _sweep_code((BarStore(str(tmp_path)), 'sh.600000', 'daily', None, None, param_grid()))
+    assert list(result['code']) == ['sh.600000']
+    assert result['error'].iloc[0] != ''
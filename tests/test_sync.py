@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from get_data.bar_store import BarStore
+from get_data.fake_baostock import FakeBaostock
+from get_data.predict_buy_revnue import StockStrategySimulator
+from get_data.session import BaostockSession
+
+CODE = 'sh.600000'
+
+
+@pytest.fixture
+def fake():
+    return FakeBaostock(codes=[CODE])
+
+
+@pytest.fixture
+def simulator(fake, tmp_path, monkeypatch):
+    session = BaostockSession(client=fake, backoff=0)
+    monkeypatch.setattr(StockStrategySimulator, 'session', session)
+    monkeypatch.setattr(StockStrategySimulator, 'bar_store', BarStore(str(tmp_path)))
+    yield StockStrategySimulator
+    session.close()
+
+
+def fresh(simulator, start, end):
+    return simulator.query_k_data(CODE, 'd', start, end)
+
+
+def test_head_range_is_prepended(simulator, fake):
+    simulator.sync_stock_data(CODE, 'daily', '2019-01-01', '2020-12-31')
+    calls = len(fake.calls)
+    simulator.sync_stock_data(CODE, 'daily', '2017-01-01', '2020-12-31')
+    # 只请求缺的一段（多一根重叠 K 线），不重新下载
+    assert len(fake.calls) == calls + 1
+    dates, bars = simulator.bar_store.load_arrays(CODE, 'daily')
+    expected_dates, expected_bars = fresh(simulator, '2017-01-01', '2020-12-31')
+    assert np.array_equal(dates, expected_dates)
+    assert np.allclose(bars, expected_bars)
+
+
+def test_head_range_detects_re_adjusted_history(simulator, fake):
+    simulator.sync_stock_data(CODE, 'daily', '2019-01-01', '2020-12-31')
+    # 覆盖区间之后的除权除息改变了全部前复权价格
+    fake.ex_dividend(CODE, '2021-06-01', 0.9)
+    simulator.sync_stock_data(CODE, 'daily', '2017-01-01', '2020-12-31')
+    dates, bars = simulator.bar_store.load_arrays(CODE, 'daily')
+    expected_dates, expected_bars = fresh(simulator, '2017-01-01', '2020-12-31')
+    assert np.array_equal(dates, expected_dates)
+    assert np.allclose(bars, expected_bars)
+    assert [str(day) for day in simulator.bar_store.coverage(CODE, 'daily')] == ['2017-01-01', '2020-12-31']